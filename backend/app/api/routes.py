@@ -3,42 +3,101 @@ API 路由
 """
 import os
 import shutil
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException, Depends, Request, Response, status
+from fastapi.responses import FileResponse, JSONResponse
 
 from ..models.schemas import (
     FileUploadResponse, SearchRequest, SearchResponse,
     ConfigUpdateRequest, ConfigResponse, HealthResponse,
     StatisticsResponse, ErrorResponse, FileType, ProcessingStatus,
-    AvailableModelsResponse, ModelInfo, AvailableVectorDBsResponse, VectorDBInfo
+    AvailableModelsResponse, ModelInfo, AvailableVectorDBsResponse, VectorDBInfo,
+    ReindexRequest, ReindexStatusResponse
 )
 from ..core.config import Settings, get_settings
 from ..services.knowledge_service import KnowledgeRetrievalService
 from ..services.embeddings.factory import EmbedderFactory
 from ..services.storage.factory import VectorDBFactory
+from ..services.storage.thumbnail_store import ThumbnailStore
 
 # 创建路由器
 router = APIRouter()
 
 # 全局服务实例
 _service: Optional[KnowledgeRetrievalService] = None
+_service_lock = threading.Lock()
+_startup_thread: Optional[threading.Thread] = None
+_startup_error: Optional[str] = None
+_process_start = time.time()
 
 
-def get_service(settings: Settings = Depends(get_settings)) -> KnowledgeRetrievalService:
-    """获取服务实例"""
+def initialize_service(settings: Settings) -> KnowledgeRetrievalService:
+    """构建服务实例并预热模型（启动阶段在后台线程中调用）"""
+    global _service, _startup_error
+    with _service_lock:
+        if _service is None:
+            try:
+                service = KnowledgeRetrievalService(settings)
+                service.warm_up()
+            except Exception as e:
+                _startup_error = str(e)
+                raise
+            _service = service
+            _startup_error = None
+        return _service
+
+
+def start_service(settings: Settings) -> threading.Thread:
+    """在后台线程中初始化服务，不阻塞应用启动"""
+    global _startup_thread
+    
+    def run():
+        try:
+            initialize_service(settings)
+            print(f"Service ready in {time.time() - _process_start:.2f}s")
+        except Exception as e:
+            print(f"Service initialization failed: {e}")
+    
+    _startup_thread = threading.Thread(target=run, name="service-warmup", daemon=True)
+    _startup_thread.start()
+    return _startup_thread
+
+
+def shutdown_service() -> None:
+    """关闭服务实例"""
     global _service
-    if _service is None:
-        _service = KnowledgeRetrievalService(settings)
-    return _service
+    with _service_lock:
+        if _service is not None:
+            _service.close()
+            _service = None
+
+
+def get_service(settings: Settings = Depends(get_settings)) -> KnowledgeRetrievalService:
+    """
+    获取服务实例
+    
+    启动预热完成前返回 503；未经 lifespan 启动（例如直接挂载路由）时同步初始化。
+    """
+    if _service is not None:
+        return _service
+    if _startup_thread is not None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=_startup_error or "Service is warming up",
+            headers={"Retry-After": "5"}
+        )
+    return initialize_service(settings)
 
 
 @router.post("/files/upload", response_model=FileUploadResponse, tags=["文件管理"])
 async def upload_file(
     file: UploadFile = File(...),
+    tags: Optional[str] = Form(None, description="自定义标签，逗号分隔"),
     service: KnowledgeRetrievalService = Depends(get_service),
     settings: Settings = Depends(get_settings)
 ):
@@ -50,6 +109,8 @@ async def upload_file(
     - 文档: PDF, DOCX, TXT, MD
     - 视频: MP4, AVI, MOV, MKV (待实现)
     - 音频: MP3, WAV, AAC (待实现)
+    
+    可通过 tags 指定自定义标签，检索时使用 filter={"tags": {"$contains": "标签"}} 过滤
     """
     try:
         # 检查文件大小
@@ -87,7 +148,8 @@ async def upload_file(
         # 处理文件
         result = await service.upload_file(
             file_path=str(file_path),
-            filename=file.filename
+            filename=file.filename,
+            tags=tags.split(",") if tags else None
         )
         
         return FileUploadResponse(
@@ -138,7 +200,8 @@ async def search(
             query_vector=request.query_vector,
             top_k=request.top_k,
             threshold=request.threshold,
-            filter=request.filter
+            filter=request.filter,
+            debug_timing=request.debug_timing
         )
         
         return SearchResponse(**result)
@@ -173,7 +236,7 @@ async def update_config(
     更新配置
     
     支持动态更新:
-    - embedding_model: 嵌入模型
+    - embedding_model: 嵌入模型（后台重建索引，完成后切换，进度见 /index/reindex）
     - embedding_provider: 嵌入提供商
     - vector_db_provider: 向量数据库提供商
     - default_top_k: 默认返回结果数
@@ -196,27 +259,94 @@ async def update_config(
         )
 
 
-@router.get("/health", response_model=HealthResponse, tags=["系统"])
-async def health_check(
-    service: KnowledgeRetrievalService = Depends(get_service),
-    settings: Settings = Depends(get_settings)
+@router.post("/index/reindex", response_model=ReindexStatusResponse,
+             status_code=status.HTTP_202_ACCEPTED, tags=["配置管理"])
+async def start_reindex(
+    request: ReindexRequest,
+    service: KnowledgeRetrievalService = Depends(get_service)
 ):
-    """健康检查"""
-    components = {
-        "embedder": "healthy" if service.embedder else "unavailable",
-        "vector_db": "healthy" if service.vector_db else "unavailable",
-    }
+    """
+    蓝绿重建索引
+    
+    在后台用新模型（为空时沿用当前模型）从已保存的分块内容构建新集合，
+    构建期间旧索引继续服务查询，完成后原子切换。
+    """
+    try:
+        job = service.start_reindex(
+            model_name=request.embedding_model,
+            provider=request.embedding_provider,
+            batch_size=request.batch_size
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return ReindexStatusResponse(**job.status())
+
+
+@router.get("/index/reindex", response_model=ReindexStatusResponse, tags=["配置管理"])
+async def get_reindex_status(service: KnowledgeRetrievalService = Depends(get_service)):
+    """获取重建索引进度"""
+    if service.reindex_job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No re-index job")
+    return ReindexStatusResponse(**service.reindex_job.status())
+
+
+@router.delete("/index/reindex", response_model=ReindexStatusResponse, tags=["配置管理"])
+async def cancel_reindex(service: KnowledgeRetrievalService = Depends(get_service)):
+    """取消正在运行的重建索引"""
+    job = service.reindex_job
+    if job is None or not job.cancel():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="No running re-index job")
+    return ReindexStatusResponse(**job.status())
+
+
+def _readiness() -> HealthResponse:
+    settings = get_settings()
+    service = _service
     
-    status = "healthy" if all(v == "healthy" for v in components.values()) else "degraded"
+    if service is None:
+        state = "failed" if _startup_error else "starting"
+        components = {"embedder": state, "vector_db": state}
+        health_status = "unhealthy" if _startup_error else "starting"
+    else:
+        components = {
+            "embedder": "healthy" if service.embedder else "unavailable",
+            "vector_db": "healthy" if service.vector_db else "unavailable",
+        }
+        health_status = "healthy" if all(v == "healthy" for v in components.values()) else "degraded"
     
     return HealthResponse(
-        status=status,
+        status=health_status,
         version=settings.service.version,
         timestamp=datetime.now(),
+        ready=health_status == "healthy",
         components=components
     )
 
 
+@router.get("/health", response_model=HealthResponse, tags=["系统"])
+async def health_check():
+    """健康检查（不触发服务初始化，预热期间 status 为 starting）"""
+    return _readiness()
+
+
+@router.get("/health/live", tags=["系统"])
+async def liveness_check():
+    """存活探针：进程可以响应请求即返回 200"""
+    return {"status": "alive", "uptime": time.time() - _process_start}
+
+
+@router.get("/health/ready", response_model=HealthResponse, tags=["系统"])
+async def readiness_check():
+    """就绪探针：模型加载、预热完成后返回 200，否则返回 503"""
+    health = _readiness()
+    if not health.ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content=health.model_dump(mode="json")
+        )
+    return health
+
+
 @router.get("/statistics", response_model=StatisticsResponse, tags=["系统"])
 async def get_statistics(service: KnowledgeRetrievalService = Depends(get_service)):
     """获取统计信息"""
@@ -230,6 +360,33 @@ async def get_statistics(service: KnowledgeRetrievalService = Depends(get_servic
     )
 
 
+@router.get("/thumbnails/{key}.webp", tags=["文件管理"])
+async def get_thumbnail(
+    key: str,
+    request: Request,
+    settings: Settings = Depends(get_settings)
+):
+    """
+    获取缩略图
+    
+    缩略图按内容寻址、生成后不再变化，响应可被浏览器和 CDN 永久缓存；
+    不依赖服务实例，模型预热期间也可访问。
+    """
+    thumbnail_dir = settings.file_processing.thumbnail_dir
+    path = ThumbnailStore(thumbnail_dir).path(key) if thumbnail_dir else None
+    if path is None or not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thumbnail not found")
+    
+    etag = f'"{key}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+    if request.headers.get("if-none-match") in (etag, f"W/{etag}"):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type="image/webp", headers=headers)
+
+
 @router.delete("/files/{file_id}", tags=["文件管理"])
 async def delete_file(
     file_id: str,
@@ -268,6 +425,20 @@ async def get_available_models():
             description="CLIP model for image and text",
             supported_types=[FileType.IMAGE, FileType.DOCUMENT]
         ),
+        ModelInfo(
+            name="sentence-transformers/all-MiniLM-L6-v2",
+            provider="onnx",
+            dimension=384,
+            description="ONNX Runtime CPU inference with int8 dynamic quantization",
+            supported_types=[FileType.DOCUMENT]
+        ),
+        ModelInfo(
+            name="openai/clip-vit-base-patch32",
+            provider="onnx",
+            dimension=512,
+            description="CLIP exported to ONNX, int8 quantized for CPU",
+            supported_types=[FileType.IMAGE, FileType.DOCUMENT]
+        ),
     ]
     
     return AvailableModelsResponse(models=models)
@@ -282,6 +453,16 @@ async def get_available_databases():
             description="Lightweight vector database",
             features=["Easy to use", "No setup required", "Persistent storage"]
         ),
+        VectorDBInfo(
+            name="sharded",
+            description="Sharded collections with parallel scatter-gather search",
+            features=["Hash or file-type partitioning", "Concurrent shard search", "Heap-merged top-k"]
+        ),
+        VectorDBInfo(
+            name="segment",
+            description="Immutable memory-mapped segments shared by all workers",
+            features=["Single writer, many readers", "Zero-copy mmap reads", "Hot reload on version bump"]
+        ),
         VectorDBInfo(
             name="milvus",
             description="High-performance vector database",
@@ -310,6 +491,9 @@ async def get_retrieval_status(service: KnowledgeRetrievalService = Depends(get_
         "multi_path_retriever_enabled": service.multi_path_retriever is not None,
         "hybrid_indexed": service._hybrid_indexed,
         "total_files": len(service.file_metadata),
+        "embedding_spaces": {
+            space: service.embedders.model_info(space) for space in service.embedders.spaces
+        },
         "retrieval_config": {
             "enable_hybrid": getattr(service.settings.retrieval, 'enable_hybrid', False),
             "enable_multi_path": getattr(service.settings.retrieval, 'enable_multi_path', False),
@@ -26,7 +26,11 @@ class EmbeddingConfig(BaseModel):
     dimension: int = 384
     batch_size: int = 32
     device: str = "cpu"
+    # 开启后按模态使用 models 中的模型，每个模型一个独立集合
+    multi_model: bool = False
     models: Optional[Dict[str, Any]] = None
+    onnx: Optional[Dict[str, Any]] = None
+    pool: Optional[Dict[str, Any]] = None
 
 
 class VectorDBConfig(BaseModel):
@@ -36,6 +40,8 @@ class VectorDBConfig(BaseModel):
     milvus: Optional[Dict[str, Any]] = None
     qdrant: Optional[Dict[str, Any]] = None
     faiss: Optional[Dict[str, Any]] = None
+    sharded: Optional[Dict[str, Any]] = None
+    segment: Optional[Dict[str, Any]] = None
 
 
 class RetrievalConfig(BaseModel):
@@ -48,12 +54,24 @@ class RetrievalConfig(BaseModel):
     enable_hybrid: bool = False  # 启用混合检索
     hybrid_alpha: float = 0.5  # 向量检索权重
     enable_multi_path: bool = False  # 启用多路召回
+    prefilter_selectivity: float = 0.1  # 选择率低于该值时对候选集精确扫描
+    exact_scan_max_candidates: int = 2000  # 候选向量数不超过该值时直接精确扫描
+    fusion_depth_factor: float = 3.0  # 混合检索初始候选深度 = top_k * 该系数
+    fusion_min_depth: int = 20  # 初始候选深度下限
+    fusion_max_depth: int = 400  # top-k 未稳定时加倍深度的上限
+    # BM25 分词器: type = char / bigram / dictionary，其余为分词器参数
+    tokenizer: Dict[str, Any] = {"type": "bigram"}
+    # 多路召回查询扩展: dictionaries / builtin / max_expansions / max_synonyms_per_term / reload_interval
+    query_expansion: Dict[str, Any] = {}
 
 
 class FileProcessingConfig(BaseModel):
     """文件处理配置"""
     upload_dir: str = "./data/uploads"
     max_file_size: int = 104857600  # 100MB
+    cache_dir: Optional[str] = "./data/cache/processors"  # 处理结果缓存目录，为空时不缓存
+    thumbnail_dir: Optional[str] = "./data/thumbnails"  # WebP 缩略图目录，为空时不生成
+    thumbnail_quality: int = 80
     allowed_extensions: Dict[str, List[str]] = {
         "image": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"],
         "document": [".pdf", ".docx", ".doc", ".txt", ".md"],
@@ -109,6 +127,8 @@ class PerformanceConfig(BaseModel):
     max_connections: int = 100
     timeout: int = 30
     keepalive: int = 5
+    # 启动时在后台预热的组件: embedder, ocr, audio
+    warmup: List[str] = ["embedder", "ocr"]
 
 
 class MonitoringConfig(BaseModel):
@@ -116,6 +136,8 @@ class MonitoringConfig(BaseModel):
     enabled: bool = True
     prometheus: Optional[Dict[str, Any]] = None
     health_check: Optional[Dict[str, Any]] = {"enabled": True, "interval": 60}
+    # 慢查询日志: enabled / threshold（秒）
+    slow_query: Optional[Dict[str, Any]] = {"enabled": True, "threshold": 1.0}
 
 
 class Settings(BaseSettings):
@@ -0,0 +1,246 @@
+"""
+Prometheus 指标 - 检索/入库各阶段耗时直方图、索引规模、缓存命中率、推理队列深度
+
+未安装 prometheus_client 或未开启 monitoring.prometheus 时所有记录函数为空操作。
+多个 uvicorn worker 时设置 monitoring.prometheus.multiproc_dir（或环境变量
+PROMETHEUS_MULTIPROC_DIR），各进程把指标写入该目录下的 mmap 文件，任意一个进程
+导出时聚合所有进程；该目录需在启动前清空。
+索引规模仪表盘在写入（上传、删除、切换索引）和每次导出前按共享的元数据目录刷新，
+多进程时取存活进程中最近一次写入的值。
+"""
+import importlib.util
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import tracing
+
+# Prometheus 支持检测（只检查是否安装，多进程目录必须在导入前设置）
+HAS_PROMETHEUS = importlib.util.find_spec("prometheus_client") is not None
+
+
+# 秒级耗时分桶：覆盖亚毫秒的 BM25 到分钟级的音频转写
+_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+            1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# 指标名 -> (类型, 说明, 标签, 多进程聚合方式)
+_DEFINITIONS: Dict[str, Tuple[str, str, List[str], Optional[str]]] = {
+    "search_seconds": ("histogram", "End-to-end search latency", ["method"], None),
+    "search_stage_seconds": (
+        "histogram",
+        "Search stage latency (embed_query, vector_search, bm25, fusion, expansion)",
+        ["stage"], None
+    ),
+    "ingest_seconds": ("histogram", "End-to-end file ingestion latency", ["file_type"], None),
+    "ingest_stage_seconds": (
+        "histogram",
+        "Ingestion stage latency (extract, ocr, transcribe, chunk, embed, insert)",
+        ["stage"], None
+    ),
+    "ingest_files_total": ("counter", "Ingested files", ["file_type", "status"], None),
+    "index_files": ("gauge", "Indexed files", ["file_type"], "livemostrecent"),
+    "index_vectors": ("gauge", "Indexed vectors", [], "livemostrecent"),
+    "cache_requests_total": ("counter", "Cache lookups", ["cache", "result"], None),
+    "cache_hit_ratio": ("gauge", "Cache hit ratio of this process", ["cache"], "liveall"),
+    "inference_queue_depth": ("gauge", "Requests waiting for model inference", ["pool"], "livesum"),
+}
+
+_PREFIX = "krs_"
+
+_metrics: Dict[str, Any] = {}
+_registry = None
+_multiprocess = False
+_refresh_callbacks: Dict[str, Callable[[], None]] = {}
+_cache_counts: Dict[str, List[int]] = {}  # cache -> [命中, 未命中]
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    """指标是否已初始化"""
+    return bool(_metrics)
+
+
+def init_metrics(monitoring_config) -> bool:
+    """
+    按 monitoring 配置初始化指标（每个进程调用一次）
+    
+    Args:
+        monitoring_config: MonitoringConfig
+    
+    Returns:
+        是否已开启
+    """
+    global _registry, _multiprocess
+    prometheus = (monitoring_config.prometheus or {}) if monitoring_config.enabled else {}
+    if not prometheus.get("enabled") or _metrics:
+        return bool(_metrics)
+    if not HAS_PROMETHEUS:
+        print("Warning: prometheus_client not installed, metrics disabled. "
+              "Please install: pip install prometheus-client")
+        return False
+    
+    multiproc_dir = prometheus.get("multiproc_dir")
+    if multiproc_dir and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        os.makedirs(multiproc_dir, exist_ok=True)
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = multiproc_dir
+    _multiprocess = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+    
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+    
+    for name, (kind, doc, labels, mode) in _DEFINITIONS.items():
+        full_name = _PREFIX + name
+        if kind == "histogram":
+            _metrics[name] = Histogram(full_name, doc, labels, buckets=_BUCKETS)
+        elif kind == "counter":
+            _metrics[name] = Counter(full_name, doc, labels)
+        elif _multiprocess:
+            _metrics[name] = Gauge(full_name, doc, labels, multiprocess_mode=mode)
+        else:
+            _metrics[name] = Gauge(full_name, doc, labels)
+    
+    if _multiprocess:
+        from prometheus_client import multiprocess
+        _registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(_registry)
+    else:
+        _registry = prometheus_client.REGISTRY
+    
+    # 独立导出端口：多 worker 时只有第一个绑定成功的进程导出（多进程模式下已聚合），
+    # 导出前同样运行刷新回调
+    port = prometheus.get("port")
+    if port:
+        exporter = CollectorRegistry(auto_describe=False)
+        exporter.register(_RefreshingCollector())
+        try:
+            prometheus_client.start_http_server(int(port), registry=exporter)
+            print(f"Prometheus exporter listening on :{port}")
+        except OSError as e:
+            hint = " (another worker may already export on it)" if _multiprocess else ""
+            print(f"Warning: Prometheus exporter failed to bind :{port}: {e}{hint}")
+    
+    print(f"Prometheus metrics enabled ({'multiprocess' if _multiprocess else 'single process'})")
+    return True
+
+
+def _metric(name: str, labels: Dict[str, Any]):
+    metric = _metrics.get(name)
+    if metric is None:
+        return None
+    return metric.labels(**{k: str(v) for k, v in labels.items()}) if labels else metric
+
+
+def observe(name: str, seconds: float, **labels: Any) -> None:
+    """记录一次耗时"""
+    metric = _metric(name, labels)
+    if metric is not None:
+        metric.observe(seconds)
+
+
+@contextmanager
+def timer(name: str, **labels: Any) -> Iterator[None]:
+    """
+    计时上下文
+    
+    Example:
+        with metrics.timer("search_stage_seconds", stage="bm25"):
+            ...
+    """
+    if name not in _metrics:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+@contextmanager
+def search_stage(stage: str) -> Iterator[None]:
+    """检索阶段计时（同时记入当前请求的耗时分解）"""
+    trace = tracing.current_trace()
+    if trace is None:
+        with timer("search_stage_seconds", stage=stage):
+            yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("search_stage_seconds", elapsed, stage=stage)
+        trace.add_time(stage, elapsed)
+
+
+def ingest_stage(stage: str):
+    """入库阶段计时"""
+    return timer("ingest_stage_seconds", stage=stage)
+
+
+def inc(name: str, amount: float = 1, **labels: Any) -> None:
+    """计数器/仪表盘增加"""
+    metric = _metric(name, labels)
+    if metric is not None:
+        metric.inc(amount)
+
+
+def set_gauge(name: str, value: float, **labels: Any) -> None:
+    """设置仪表盘"""
+    metric = _metric(name, labels)
+    if metric is not None:
+        metric.set(value)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """记录一次缓存查找，同时更新本进程的命中率"""
+    if not _metrics:
+        return
+    inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+    with _lock:
+        counts = _cache_counts.setdefault(cache, [0, 0])
+        counts[0 if hit else 1] += 1
+        ratio = counts[0] / (counts[0] + counts[1])
+    set_gauge("cache_hit_ratio", ratio, cache=cache)
+
+
+def register_refresh(name: str, callback: Callable[[], None]) -> None:
+    """注册（同名替换）导出前调用的回调，刷新索引规模等按需计算的仪表盘"""
+    _refresh_callbacks[name] = callback
+
+
+def _run_refresh_callbacks() -> None:
+    for callback in list(_refresh_callbacks.values()):
+        try:
+            callback()
+        except Exception as e:
+            print(f"Metrics refresh failed: {e}")
+
+
+class _RefreshingCollector:
+    """独立导出端口使用的收集器：先运行刷新回调，再导出 _registry 中的指标"""
+    
+    def collect(self):
+        _run_refresh_callbacks()
+        return _registry.collect()
+
+
+def render() -> Tuple[bytes, str]:
+    """
+    导出指标（Prometheus 文本格式）
+    
+    Returns:
+        (内容, Content-Type)
+    """
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+    _run_refresh_callbacks()
+    return generate_latest(_registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """进程退出时清理多进程模式下的 live 仪表盘"""
+    if _multiprocess:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,89 @@
+"""
+检索耗时分解 - 记录单次检索各阶段耗时与候选数量，用于 debug_timing 响应和慢查询日志
+
+阶段耗时由 metrics.search_stage 同时写入当前请求的 SearchTrace；当前请求通过
+contextvars 传递，提交到线程池的任务需用 contextvars.copy_context().run 执行。
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+class SearchTrace:
+    """
+    单次检索的耗时与计数
+    
+    向量检索与 BM25 在不同线程并发执行，累加时加锁，两者耗时有重叠；
+    同一阶段多次执行（如融合加深的多轮）耗时累加。
+    """
+    
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def add_time(self, stage: str, seconds: float) -> None:
+        """累加阶段耗时（秒）"""
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+    
+    def count(self, name: str, amount: int = 1) -> None:
+        """累加计数"""
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + int(amount)
+    
+    def elapsed(self) -> float:
+        """开始至今的耗时（秒）"""
+        return time.perf_counter() - self.start
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        导出耗时分解
+        
+        Returns:
+            {"total": 总耗时, "stages": {阶段: 秒}, "counts": {计数名: 数量}}
+        """
+        with self._lock:
+            return {
+                "total": round(self.elapsed(), 6),
+                "stages": {stage: round(seconds, 6) for stage, seconds in self.stages.items()},
+                "counts": dict(self.counts),
+            }
+
+
+_current: contextvars.ContextVar[Optional[SearchTrace]] = contextvars.ContextVar(
+    "search_trace", default=None
+)
+
+
+@contextmanager
+def trace_search() -> Iterator[SearchTrace]:
+    """
+    在当前上下文中记录一次检索
+    
+    Example:
+        with tracing.trace_search() as trace:
+            ...
+        timing = trace.to_dict()
+    """
+    trace = SearchTrace()
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def current_trace() -> Optional[SearchTrace]:
+    """当前上下文中的检索记录，不在检索中时为 None"""
+    return _current.get()
+
+
+def count(name: str, amount: int = 1) -> None:
+    """为当前检索累加计数（不在检索中时为空操作）"""
+    trace = _current.get()
+    if trace is not None:
+        trace.count(name, amount)
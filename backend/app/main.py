@@ -8,10 +8,11 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 
+from .core import metrics
 from .core.config import get_settings
-from .api.routes import router
+from .api.routes import router, start_service, shutdown_service
 
 
 # 配置日志
@@ -48,10 +49,15 @@ async def lifespan(app: FastAPI):
     # 创建必要的目录
     Path(settings.file_processing.upload_dir).mkdir(parents=True, exist_ok=True)
     
+    # 后台加载模型并预热，应用立即开始接受请求（就绪前 /health/ready 返回 503）
+    start_service(settings)
+    
     yield
     
     # 关闭时
     logger.info("Shutting down service")
+    shutdown_service()
+    metrics.mark_process_dead()
 
 
 # 创建应用
@@ -62,6 +68,9 @@ def create_app() -> FastAPI:
     # 设置日志
     setup_logging()
     
+    # Prometheus 指标（每个 worker 进程各自初始化）
+    metrics.init_metrics(settings.monitoring)
+    
     # 创建应用实例
     app = FastAPI(
         title=settings.service.name,
@@ -98,6 +107,14 @@ def create_app() -> FastAPI:
             "api": "/api/v1"
         }
     
+    # Prometheus 指标导出
+    if metrics.enabled():
+        @app.get("/metrics", tags=["系统"], include_in_schema=False)
+        async def prometheus_metrics():
+            """Prometheus 指标"""
+            content, content_type = metrics.render()
+            return Response(content=content, media_type=content_type)
+    
     # 全局异常处理
     @app.exception_handler(Exception)
     async def global_exception_handler(request, exc):
@@ -57,7 +57,11 @@ class SearchRequest(BaseModel):
     query_vector: Optional[List[float]] = Field(None, description="直接提供查询向量")
     top_k: int = Field(10, ge=1, le=100, description="返回结果数量")
     threshold: float = Field(0.0, ge=0.0, le=1.0, description="相似度阈值")
-    filter: Optional[Dict[str, Any]] = Field(None, description="过滤条件")
+    filter: Optional[Dict[str, Any]] = Field(
+        None,
+        description="过滤条件（where 语法，file_type/filename/upload_time/tags 走元数据索引）"
+    )
+    debug_timing: bool = Field(False, description="返回各阶段耗时与候选数量")
     
     # Pydantic V2: 验证器已通过 Field 的 ge/le 参数实现，无需额外验证
     
@@ -84,6 +88,10 @@ class SearchResponse(BaseModel):
     results: List[SearchResult] = Field(..., description="搜索结果列表")
     total: int = Field(..., description="总结果数")
     query_time: float = Field(..., description="查询时间（秒）")
+    timing: Optional[Dict[str, Any]] = Field(
+        None,
+        description="耗时分解（debug_timing 时返回）: path / total / stages（秒）/ counts"
+    )
 
 
 class ConfigUpdateRequest(BaseModel):
@@ -95,6 +103,29 @@ class ConfigUpdateRequest(BaseModel):
     similarity_threshold: Optional[float] = Field(None, ge=0.0, le=1.0, description="相似度阈值")
 
 
+class ReindexRequest(BaseModel):
+    """重建索引请求"""
+    embedding_model: Optional[str] = Field(None, description="新的嵌入模型名称，为空时沿用当前模型")
+    embedding_provider: Optional[str] = Field(None, description="新的嵌入提供商")
+    batch_size: Optional[int] = Field(None, ge=1, le=1000, description="每批迁移的文件数")
+
+
+class ReindexStatusResponse(BaseModel):
+    """重建索引进度"""
+    state: str = Field(..., description="状态: pending/running/completed/failed/cancelled")
+    generation: int = Field(..., description="新索引代数")
+    model_name: str = Field(..., description="目标嵌入模型")
+    models: Optional[Dict[str, Any]] = Field(None, description="多模型模式下各模态的模型")
+    total_files: int = Field(..., description="需要迁移的文件数")
+    processed_files: int = Field(..., description="已处理文件数")
+    failed_files: int = Field(..., description="失败文件数")
+    embedded_vectors: int = Field(..., description="已生成的向量数")
+    elapsed: float = Field(..., description="已用时间（秒）")
+    throughput: float = Field(..., description="嵌入吞吐（向量/秒）")
+    errors: List[str] = Field(default_factory=list, description="失败文件的错误信息")
+    error: Optional[str] = Field(None, description="任务失败原因")
+
+
 class ConfigResponse(BaseModel):
     """配置响应"""
     service: Dict[str, Any]
@@ -109,6 +140,7 @@ class HealthResponse(BaseModel):
     status: str = Field(..., description="服务状态")
     version: str = Field(..., description="版本号")
     timestamp: datetime = Field(default_factory=datetime.now, description="时间戳")
+    ready: bool = Field(True, description="是否就绪（模型加载、预热完成）")
     components: Dict[str, str] = Field(default_factory=dict, description="组件状态")
 
 
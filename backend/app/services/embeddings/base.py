@@ -4,6 +4,7 @@
 from abc import ABC, abstractmethod
 from typing import Any, List, Union
 import numpy as np
+from PIL import Image
 
 
 class BaseEmbedder(ABC):
@@ -42,18 +43,40 @@ class BaseEmbedder(ABC):
         pass
     
     @abstractmethod
-    def embed_image(self, images: Union[str, List[str]]) -> np.ndarray:
+    def embed_image(self, images: Union[str, Image.Image, List[Union[str, Image.Image]]]) -> np.ndarray:
         """
         图片嵌入
         
         Args:
-            images: 图片路径或图片路径列表
+            images: 图片路径或已解码的 PIL 图片（或它们的列表）
             
         Returns:
             嵌入向量数组
         """
         pass
     
+    @staticmethod
+    def load_images(images: Union[str, Image.Image, List[Union[str, Image.Image]]]) -> List[Image.Image]:
+        """将图片路径或内存中的图片统一为 RGB 图片列表（已解码的图片不再读盘）"""
+        if isinstance(images, (str, Image.Image)):
+            images = [images]
+        
+        pil_images = []
+        for image in images:
+            if isinstance(image, Image.Image):
+                pil_images.append(image if image.mode == "RGB" else image.convert("RGB"))
+                continue
+            try:
+                pil_images.append(Image.open(image).convert("RGB"))
+            except Exception as e:
+                print(f"Error loading image {image}: {e}")
+                raise
+        return pil_images
+    
+    def close(self) -> None:
+        """释放资源（模型常驻在其他进程时需要）"""
+        pass
+    
     def get_dimension(self) -> int:
         """获取向量维度"""
         return self.dimension
@@ -5,6 +5,8 @@ from typing import Dict, Any
 
 from .base import BaseEmbedder
 from .huggingface_embedder import HuggingFaceEmbedder
+from .onnx_embedder import OnnxEmbedder
+from .worker_pool import WorkerPoolEmbedder
 
 
 class EmbedderFactory:
@@ -12,6 +14,8 @@ class EmbedderFactory:
     
     _embedders: Dict[str, type] = {
         "huggingface": HuggingFaceEmbedder,
+        "onnx": OnnxEmbedder,
+        "pool": WorkerPoolEmbedder,
     }
     
     @classmethod
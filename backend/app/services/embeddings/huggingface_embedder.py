@@ -59,6 +59,7 @@ class HuggingFaceEmbedder(BaseEmbedder):
                 truncation=True
             ).to(self.device)
             
+            import torch
             with torch.no_grad():
                 text_features = self.model.get_text_features(**inputs)
                 embeddings = text_features.cpu().numpy()
@@ -71,23 +72,13 @@ class HuggingFaceEmbedder(BaseEmbedder):
         
         return self.normalize_vector(embeddings)
     
-    def embed_image(self, images: Union[str, List[str]]) -> np.ndarray:
-        """图片嵌入"""
-        if isinstance(images, str):
-            images = [images]
-        
+    def embed_image(self, images: Union[str, Image.Image, List[Union[str, Image.Image]]]) -> np.ndarray:
+        """图片嵌入（路径或已解码的图片）"""
         if self.model_type != "clip":
             raise ValueError(f"Model {self.model_name} does not support image embedding")
         
         # 加载图片
-        pil_images = []
-        for img_path in images:
-            try:
-                img = Image.open(img_path).convert("RGB")
-                pil_images.append(img)
-            except Exception as e:
-                print(f"Error loading image {img_path}: {e}")
-                raise
+        pil_images = self.load_images(images)
         
         inputs = self.processor(
             images=pil_images,
@@ -120,6 +111,3 @@ class HuggingFaceEmbedder(BaseEmbedder):
             all_embeddings.append(embeddings)
         
         return np.vstack(all_embeddings)
-
-
-import torch  # Import at the top level for the module
@@ -0,0 +1,283 @@
+"""
+ONNX Runtime 嵌入实现 - CPU 上使用导出的 ONNX 图（可选 int8 动态量化）
+"""
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Union
+import numpy as np
+from PIL import Image
+
+from .base import BaseEmbedder
+
+# ONNX Runtime 支持检测
+try:
+    import onnxruntime as ort
+    HAS_ONNXRUNTIME = True
+except ImportError:
+    HAS_ONNXRUNTIME = False
+
+
+class OnnxEmbedder(BaseEmbedder):
+    """ONNX Runtime 嵌入器实现（sentence-transformers / CLIP，支持 int8 量化）"""
+    
+    def __init__(self, model_name: str, device: str = "cpu", **kwargs):
+        """
+        Args:
+            model_name: HuggingFace 模型名称
+            device: 设备（ONNX 后端仅使用 CPU）
+            cache_dir: 导出的 ONNX 文件缓存目录
+            quantize: 是否使用 int8 动态量化模型
+            intra_op_threads: 单个算子内的线程数，0 表示由 ONNX Runtime 决定
+            inter_op_threads: 算子间并行线程数
+            io_binding: 是否使用 IO binding 运行（减少输入输出拷贝）
+            max_length: 文本最大 token 数（不超过模型位置编码长度，CLIP 为 77）
+            pooling: 导出图未包含池化层时的池化方式 mean / cls
+        """
+        super().__init__(model_name, device, **kwargs)
+        if not HAS_ONNXRUNTIME:
+            raise RuntimeError(
+                "onnxruntime not installed. Please install: pip install onnxruntime onnx"
+            )
+        if device != "cpu":
+            print(f"Warning: ONNX embedder runs on CPU, ignoring device '{device}'")
+        
+        self.cache_dir = Path(kwargs.get("cache_dir", "./data/onnx"))
+        self.quantize = kwargs.get("quantize", True)
+        self.intra_op_threads = int(kwargs.get("intra_op_threads", 0))
+        self.inter_op_threads = int(kwargs.get("inter_op_threads", 1))
+        self.io_binding = kwargs.get("io_binding", True)
+        self.max_length = int(kwargs.get("max_length", 256))
+        self.pooling = kwargs.get("pooling", "mean")
+        self.sessions: Dict[str, "ort.InferenceSession"] = {}
+        self.load_model()
+    
+    @property
+    def model_dir(self) -> Path:
+        return self.cache_dir / re.sub(r"[^A-Za-z0-9._-]", "_", self.model_name)
+    
+    def load_model(self) -> None:
+        """加载（必要时导出并量化）ONNX 模型"""
+        try:
+            if "clip" in self.model_name.lower():
+                self._load_clip_model()
+            else:
+                self._load_sentence_transformer()
+            print(f"ONNX embedder loaded: {self.model_name} "
+                  f"(quantized={self.quantize}, threads={self.intra_op_threads or 'auto'})")
+        except Exception as e:
+            print(f"Error loading model {self.model_name}: {e}")
+            raise
+    
+    def _load_sentence_transformer(self) -> None:
+        from transformers import AutoTokenizer
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.text_max_length = min(self.max_length, self.tokenizer.model_max_length)
+        self.model_type = "sentence_transformer"
+        self.sessions["text"] = self._session("text")
+        # 带投影 / Dense 头的模型输出维度不等于 hidden_size，以实际输出为准
+        self.dimension = int(self.embed_text(["dimension probe"]).shape[-1])
+    
+    def _load_clip_model(self) -> None:
+        from transformers import CLIPConfig, CLIPProcessor
+        
+        self.processor = CLIPProcessor.from_pretrained(self.model_name)
+        self.tokenizer = self.processor.tokenizer
+        # CLIP 文本编码器只有 77 个位置编码，超出会越界
+        self.text_max_length = min(self.max_length, self.tokenizer.model_max_length)
+        self.dimension = CLIPConfig.from_pretrained(self.model_name).projection_dim
+        self.model_type = "clip"
+        self.sessions["text"] = self._session("text")
+        self.sessions["image"] = self._session("image")
+    
+    # ---- 导出 / 量化 ----
+    
+    def _session(self, graph: str) -> "ort.InferenceSession":
+        """创建推理会话，缺少 ONNX 文件时先导出"""
+        path = self.model_dir / f"{graph}.onnx"
+        if not path.exists():
+            self._export(graph, path)
+        
+        if self.quantize:
+            quantized_path = self.model_dir / f"{graph}.int8.onnx"
+            if not quantized_path.exists():
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                print(f"Quantizing {path.name} to int8...")
+                tmp_path = quantized_path.with_suffix(f".tmp.{os.getpid()}")
+                quantize_dynamic(str(path), str(tmp_path), weight_type=QuantType.QInt8)
+                os.replace(tmp_path, quantized_path)
+            path = quantized_path
+        
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = self.inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        
+        return ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+    
+    def _export(self, graph: str, path: Path) -> None:
+        """使用 PyTorch 导出 ONNX 图（仅首次运行需要 torch）"""
+        import torch
+        
+        print(f"Exporting {self.model_name} ({graph}) to ONNX...")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        
+        pooled = False
+        if self.model_type == "clip":
+            from transformers import CLIPModel
+            model = CLIPModel.from_pretrained(self.model_name).eval()
+            
+            if graph == "text":
+                class Wrapper(torch.nn.Module):
+                    def __init__(self, model):
+                        super().__init__()
+                        self.model = model
+                    
+                    def forward(self, input_ids, attention_mask):
+                        return self.model.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+                
+                sample = self.tokenizer(["a photo"], return_tensors="pt", padding=True)
+                input_names = ["input_ids", "attention_mask"]
+            else:
+                class Wrapper(torch.nn.Module):
+                    def __init__(self, model):
+                        super().__init__()
+                        self.model = model
+                    
+                    def forward(self, pixel_values):
+                        return self.model.get_image_features(pixel_values=pixel_values)
+                
+                size = model.config.vision_config.image_size
+                sample = {"pixel_values": torch.zeros(1, 3, size, size)}
+                input_names = ["pixel_values"]
+        else:
+            sample = self.tokenizer(["hello world"], return_tensors="pt", padding=True)
+            input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+            
+            try:
+                # 导出完整的 sentence-transformers 流水线（池化、Dense 投影、归一化都在图内）
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(self.model_name, device="cpu").eval()
+                
+                class Wrapper(torch.nn.Module):
+                    def __init__(self, model):
+                        super().__init__()
+                        self.model = model
+                    
+                    def forward(self, *args):
+                        return self.model(dict(zip(input_names, args)))["sentence_embedding"]
+                
+                pooled = True
+            except ImportError:
+                # 未安装 sentence-transformers 时只导出编码器，推理时按 pooling 池化
+                from transformers import AutoModel
+                model = AutoModel.from_pretrained(self.model_name).eval()
+                
+                class Wrapper(torch.nn.Module):
+                    def __init__(self, model):
+                        super().__init__()
+                        self.model = model
+                    
+                    def forward(self, *args):
+                        inputs = dict(zip(input_names, args))
+                        return self.model(**inputs).last_hidden_state
+        
+        module = Wrapper(model)
+        inputs = tuple(sample[name] for name in input_names)
+        dynamic_axes = {
+            name: {0: "batch"} if name == "pixel_values" else {0: "batch", 1: "sequence"}
+            for name in input_names
+        }
+        if self.model_type != "clip" and not pooled:
+            dynamic_axes["output"] = {0: "batch", 1: "sequence"}
+        
+        dynamic_axes.setdefault("output", {0: "batch"})
+        tmp_path = path.with_suffix(f".tmp.{os.getpid()}")
+        with torch.no_grad():
+            torch.onnx.export(
+                module, inputs, str(tmp_path),
+                input_names=input_names,
+                output_names=["output"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+        os.replace(tmp_path, path)
+    
+    # ---- 推理 ----
+    
+    def _run(self, graph: str, feeds: Dict[str, np.ndarray]) -> np.ndarray:
+        session = self.sessions[graph]
+        expected = {i.name for i in session.get_inputs()}
+        feeds = {name: np.ascontiguousarray(value) for name, value in feeds.items() if name in expected}
+        
+        if not self.io_binding:
+            return session.run(None, feeds)[0]
+        
+        binding = session.io_binding()
+        for name, value in feeds.items():
+            binding.bind_cpu_input(name, value)
+        binding.bind_output(session.get_outputs()[0].name)
+        session.run_with_iobinding(binding)
+        return binding.copy_outputs_to_cpu()[0]
+    
+    def _tokenize(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        encoded = self.tokenizer(
+            texts,
+            return_tensors="np",
+            padding=True,
+            truncation=True,
+            max_length=self.text_max_length
+        )
+        return {name: np.asarray(value, dtype=np.int64) for name, value in encoded.items()}
+    
+    def embed_text(self, texts: Union[str, List[str]]) -> np.ndarray:
+        """文本嵌入"""
+        if isinstance(texts, str):
+            texts = [texts]
+        
+        feeds = self._tokenize(texts)
+        output = self._run("text", feeds)
+        
+        if self.model_type == "clip" or output.ndim == 2:
+            # CLIP 特征 / 图内已池化的 sentence-transformers 输出
+            embeddings = output
+        elif self.pooling == "cls":
+            embeddings = output[:, 0]
+        else:
+            # 平均池化（忽略 padding）
+            mask = feeds["attention_mask"][..., None].astype(np.float32)
+            embeddings = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        
+        return self.normalize_vector(embeddings.astype(np.float32, copy=False))
+    
+    def embed_image(self, images: Union[str, Image.Image, List[Union[str, Image.Image]]]) -> np.ndarray:
+        """图片嵌入（路径或已解码的图片）"""
+        if self.model_type != "clip":
+            raise ValueError(f"Model {self.model_name} does not support image embedding")
+        
+        pil_images = self.load_images(images)
+        
+        pixel_values = self.processor(images=pil_images, return_tensors="np")["pixel_values"]
+        output = self._run("image", {"pixel_values": pixel_values.astype(np.float32)})
+        return self.normalize_vector(output.astype(np.float32, copy=False))
+    
+    def embed_batch(self, items: List[Union[str, Image.Image]],
+                   item_type: str = "text", batch_size: int = 32) -> np.ndarray:
+        """批量嵌入"""
+        all_embeddings = []
+        
+        for i in range(0, len(items), batch_size):
+            batch = items[i:i + batch_size]
+            
+            if item_type == "text":
+                embeddings = self.embed_text(batch)
+            elif item_type == "image":
+                embeddings = self.embed_image(batch)
+            else:
+                raise ValueError(f"Unsupported item type: {item_type}")
+            
+            all_embeddings.append(embeddings)
+        
+        return np.vstack(all_embeddings)
@@ -0,0 +1,142 @@
+"""
+嵌入器注册表 - 按模态路由到不同的嵌入模型（向量空间）
+"""
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .base import BaseEmbedder
+from .factory import EmbedderFactory
+
+
+# 单模型模式下的空间名（沿用原集合，不加后缀）
+DEFAULT_SPACE = "default"
+
+# 以文本形式嵌入的模态：音频使用转写文本，走文本模型
+_TEXT_ROUTED = {"audio": "text"}
+
+
+class EmbedderRegistry:
+    """
+    嵌入器注册表
+    
+    每个向量空间对应一个嵌入模型，以及向量库中独立的集合和维度。
+    配置 embedding.models 并开启 multi_model 后:
+    - text: 文档分块、OCR 文字、音频转写文本（如 MiniLM）
+    - image: 图片像素（如 CLIP）
+    - video: 视频帧（未配置时沿用 image）
+    模型相同的模态共享同一空间和同一个嵌入器实例。
+    未开启时所有模态使用 embedding.model_name 对应的 default 空间。
+    """
+    
+    def __init__(self, embedding_config, multi_model: Optional[bool] = None, server_workers: int = 1):
+        """
+        Args:
+            embedding_config: EmbeddingConfig
+            multi_model: 是否按模态使用不同模型，None 时读取配置
+            server_workers: 服务进程数（每个服务进程各自启动一个嵌入工作池）
+        """
+        self.config = embedding_config
+        self.server_workers = max(1, int(server_workers))
+        if multi_model is None:
+            multi_model = getattr(embedding_config, "multi_model", False)
+        self.multi_model = bool(multi_model and embedding_config.models)
+        
+        self._embedders: Dict[str, BaseEmbedder] = {}  # 空间 -> 嵌入器
+        self._models: Dict[str, Dict[str, Any]] = {}  # 空间 -> 模型配置
+        self._routes: Dict[str, str] = {}  # 模态 -> 空间
+        self.load()
+    
+    @staticmethod
+    def space_name(model_name: str) -> str:
+        """由模型名生成空间名（可用作集合名后缀）"""
+        return re.sub(r"[^A-Za-z0-9._-]", "_", model_name.split("/")[-1])
+    
+    def _model_config(self, model: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "provider": model.get("provider", self.config.provider),
+            "model_name": model.get("model_name", self.config.model_name),
+            "dimension": model.get("dimension", self.config.dimension),
+        }
+    
+    def provider_options(self, provider: str) -> Dict[str, Any]:
+        """提供商专属参数（如 embedding.onnx）"""
+        options = dict(getattr(self.config, provider.lower(), None) or {})
+        
+        # 工作池在子进程中创建的后端嵌入器使用后端自己的参数
+        backend = options.get("backend")
+        if backend and backend != provider:
+            options.setdefault("backend_options", self.provider_options(backend))
+            options.setdefault("server_workers", self.server_workers)
+        return options
+    
+    def load(self) -> None:
+        """按配置创建嵌入器"""
+        if not self.multi_model:
+            self._models[DEFAULT_SPACE] = self._model_config({})
+            self._routes = {}
+        else:
+            models = dict(self.config.models)
+            models.setdefault("text", {})
+            if "video" not in models and "image" in models:
+                models["video"] = models["image"]
+            
+            for modality, model in models.items():
+                if modality in _TEXT_ROUTED:
+                    continue
+                model = self._model_config(model or {})
+                space = self.space_name(model["model_name"])
+                self._models.setdefault(space, model)
+                self._routes[modality] = space
+        
+        for space, model in self._models.items():
+            self._embedders[space] = EmbedderFactory.create_embedder(
+                provider=model["provider"],
+                model_name=model["model_name"],
+                device=self.config.device,
+                **self.provider_options(model["provider"])
+            )
+            print(f"Embedder initialized: {model['model_name']} (space: {space})")
+    
+    def space_for(self, modality: str) -> str:
+        """获取模态对应的空间名"""
+        if not self.multi_model:
+            return DEFAULT_SPACE
+        modality = _TEXT_ROUTED.get(modality, modality)
+        return self._routes.get(modality, self._routes["text"])
+    
+    def embedder_for(self, modality: str) -> BaseEmbedder:
+        """获取模态对应的嵌入器"""
+        return self._embedders[self.space_for(modality)]
+    
+    def get(self, space: str) -> BaseEmbedder:
+        """按空间名获取嵌入器"""
+        return self._embedders[space]
+    
+    def set_embedder(self, space: str, embedder: BaseEmbedder) -> None:
+        """替换某个空间的嵌入器"""
+        self._embedders[space] = embedder
+        self._models[space] = {
+            "provider": self._models.get(space, {}).get("provider", self.config.provider),
+            "model_name": embedder.model_name,
+            "dimension": embedder.get_dimension(),
+        }
+    
+    @property
+    def spaces(self) -> List[str]:
+        """所有空间名"""
+        return list(self._embedders)
+    
+    def model_info(self, space: str) -> Dict[str, Any]:
+        """空间的模型配置"""
+        return dict(self._models[space])
+    
+    def close(self) -> None:
+        """释放所有嵌入器"""
+        for embedder in self._embedders.values():
+            embedder.close()
+    
+    def items(self) -> Iterator[Tuple[str, BaseEmbedder]]:
+        return iter(list(self._embedders.items()))
+    
+    def __len__(self) -> int:
+        return len(self._embedders)
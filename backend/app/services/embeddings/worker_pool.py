@@ -0,0 +1,388 @@
+"""
+多进程嵌入工作池 - 模型常驻在多个绑核的工作进程中，结果通过共享内存返回
+"""
+import itertools
+import math
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional, Tuple, Union
+import numpy as np
+from PIL import Image
+
+from ...core import metrics
+from .base import BaseEmbedder
+
+
+def _available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    连接父进程创建的共享内存块，不登记到 resource_tracker
+    
+    共享内存块都由父进程创建和释放；Python 3.13 之前连接也会登记，
+    导致父进程 unlink 后 resource_tracker 重复清理并告警。
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _pack_images(images: List[Any]) -> Tuple[List[Any], Optional[shared_memory.SharedMemory]]:
+    """
+    把已解码图片的像素复制到一个共享内存块，图片替换为 (偏移, 宽, 高)；图片路径原样保留，
+    由工作进程读盘解码
+    """
+    pixels = [
+        np.asarray(image if image.mode == "RGB" else image.convert("RGB"), dtype=np.uint8)
+        for image in images if isinstance(image, Image.Image)
+    ]
+    if not pixels:
+        return images, None
+    
+    shm = shared_memory.SharedMemory(create=True, size=sum(array.nbytes for array in pixels))
+    packed, offset, arrays = [], 0, iter(pixels)
+    for image in images:
+        if not isinstance(image, Image.Image):
+            packed.append(image)
+            continue
+        array = next(arrays)
+        np.ndarray(array.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)[...] = array
+        packed.append((offset, array.shape[1], array.shape[0]))
+        offset += array.nbytes
+    return packed, shm
+
+
+def _unpack_images(items: List[Any], shm_name: str) -> List[Any]:
+    """从共享内存还原 _pack_images 打包的图片（复制出像素，不持有共享内存）"""
+    shm = _attach(shm_name)
+    try:
+        images = []
+        for item in items:
+            if isinstance(item, tuple):
+                offset, width, height = item
+                pixels = np.ndarray((height, width, 3), dtype=np.uint8, buffer=shm.buf, offset=offset)
+                item = Image.fromarray(pixels.copy(), "RGB")
+            images.append(item)
+        return images
+    finally:
+        shm.close()
+
+
+def _worker_main(worker_id: int, cores: List[int], pin: bool, backend: str, model_name: str,
+                 device: str, options: Dict[str, Any], requests, results) -> None:
+    """
+    工作进程入口
+    
+    绑定 CPU 核心（pin 为 False 时只按核心数限制线程）并限制推理线程数后加载模型，循环处理请求队列:
+    请求 (request_id, kind, items, 结果共享内存名, 像素共享内存名)，
+    取到请求后先回报 (worker_id, request_id)，便于父进程在本进程退出时让该请求失败；
+    结果写入父进程预先分配的共享内存块，只把 (request_id, shape) 放回结果队列。
+    """
+    if cores:
+        if pin and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        # 必须在导入 torch / onnxruntime 之前设置
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ[var] = str(len(cores))
+        if backend == "onnx" and not options.get("intra_op_threads"):
+            options["intra_op_threads"] = len(cores)
+    
+    try:
+        from .factory import EmbedderFactory
+        embedder = EmbedderFactory.create_embedder(
+            provider=backend, model_name=model_name, device=device, **options
+        )
+    except Exception as e:
+        results.put(("ready", worker_id, 0, f"{type(e).__name__}: {e}"))
+        return
+    results.put(("ready", worker_id, embedder.get_dimension(), None))
+    
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        
+        request_id, kind, items, shm_name, pixels_name = message
+        results.put(("taken", worker_id, request_id))
+        try:
+            if kind == "text":
+                vectors = embedder.embed_text(items)
+            else:
+                if pixels_name:
+                    items = _unpack_images(items, pixels_name)
+                vectors = embedder.embed_image(items)
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            
+            shm = _attach(shm_name)
+            try:
+                if vectors.nbytes > shm.size:
+                    raise ValueError(f"Result of {vectors.nbytes} bytes exceeds buffer of {shm.size} bytes")
+                np.ndarray(vectors.shape, dtype=np.float32, buffer=shm.buf)[...] = vectors
+            finally:
+                shm.close()
+            results.put(("result", request_id, vectors.shape, None))
+        except Exception as e:
+            results.put(("result", request_id, None, f"{type(e).__name__}: {e}"))
+
+
+class WorkerPoolEmbedder(BaseEmbedder):
+    """
+    多进程嵌入器客户端
+    
+    启动 workers 个工作进程，每个进程绑定 cores_per_worker 个核心并持有一份模型。
+    一次调用的输入按工作进程数切分后并发计算，多个请求线程共享同一个工作池。
+    已解码图片的像素和结果缓冲区都放在本进程按请求分配的共享内存中，
+    请求完成、失败或工作池关闭后释放，队列中只传递元信息。
+    工作进程意外退出时，其正在处理的请求立即失败，并重新启动该工作进程。
+    每个服务进程（uvicorn worker）各有一个工作池，默认进程数按服务进程数均分可用核心。
+    """
+    
+    def __init__(self, model_name: str, device: str = "cpu", **kwargs):
+        """
+        Args:
+            model_name: 模型名称
+            device: 设备
+            backend: 工作进程内使用的嵌入器提供商（huggingface / onnx）
+            backend_options: 传给工作进程内嵌入器的参数
+            workers: 工作进程数，默认为 可用核心数 / (cores_per_worker * server_workers)
+            cores_per_worker: 每个工作进程绑定的核心数
+            server_workers: 服务进程数（performance.workers），各服务进程的工作池共享可用核心
+            min_batch: 切分输入时每个子批次的最小条数
+            timeout: 单次请求超时（秒）
+        """
+        super().__init__(model_name, device, **kwargs)
+        self.backend = kwargs.get("backend", "huggingface")
+        self.backend_options = dict(kwargs.get("backend_options") or {})
+        self.cores_per_worker = max(1, int(kwargs.get("cores_per_worker", 2)))
+        self.server_workers = max(1, int(kwargs.get("server_workers", 1)))
+        cores = _available_cores()
+        self.num_workers = int(kwargs.get("workers") or max(
+            1, len(cores) // (self.cores_per_worker * self.server_workers)
+        ))
+        self.min_batch = max(1, int(kwargs.get("min_batch", 8)))
+        self.timeout = float(kwargs.get("timeout", 120))
+        
+        self._context = mp.get_context("spawn")
+        self._processes: List[mp.Process] = []
+        self._worker_cores: List[List[int]] = []
+        # 多个服务进程的工作池互不知道对方绑定了哪些核心，只有一个服务进程时才绑核
+        self._pin = self.server_workers == 1
+        self._assigned: Dict[int, int] = {}  # worker_id -> 正在处理的 request_id
+        self._closing = False
+        self._pending: Dict[int, Tuple[Future, List[shared_memory.SharedMemory]]] = {}
+        self._pending_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._ready_count = 0
+        self._startup_error: Optional[str] = None
+        self.load_model()
+    
+    def load_model(self) -> None:
+        """启动工作进程并等待模型加载完成"""
+        self._requests = self._context.Queue()
+        self._results = self._context.Queue()
+        
+        cores = _available_cores()
+        for worker_id in range(self.num_workers):
+            start = worker_id * self.cores_per_worker
+            self._worker_cores.append(cores[start:start + self.cores_per_worker] if start < len(cores) else [])
+            self._processes.append(self._start_worker(worker_id))
+        
+        self._dispatcher = threading.Thread(
+            target=self._dispatch_results, name="embedding-pool-results", daemon=True
+        )
+        self._dispatcher.start()
+        
+        if not self._ready.wait(self.timeout * 5):
+            self.close()
+            raise TimeoutError(f"Embedding workers did not start within {self.timeout * 5:.0f}s")
+        if self._startup_error:
+            self.close()
+            raise RuntimeError(f"Embedding worker failed to load {self.model_name}: {self._startup_error}")
+        
+        print(f"Embedding worker pool started: {self.num_workers} x {self.backend} "
+              f"({self.cores_per_worker} cores each), model {self.model_name}")
+    
+    def _start_worker(self, worker_id: int) -> mp.Process:
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, self._worker_cores[worker_id], self._pin, self.backend, self.model_name,
+                  self.device, self.backend_options, self._requests, self._results),
+            name=f"embedding-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        return process
+    
+    def _dispatch_results(self) -> None:
+        """读取结果队列，把共享内存中的结果交给等待的请求；定期检查工作进程是否存活"""
+        last_check = time.monotonic()
+        while True:
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                message = ()
+            if message is None:
+                break
+            
+            if time.monotonic() - last_check >= 1.0:
+                last_check = time.monotonic()
+                self._check_workers()
+            
+            if not message:
+                continue
+            
+            if message[0] == "ready":
+                _, worker_id, dimension, error = message
+                if error:
+                    self._startup_error = error
+                    self._ready.set()
+                    continue
+                self.dimension = dimension
+                self._ready_count += 1
+                if self._ready_count == self.num_workers:
+                    self._ready.set()
+                continue
+            
+            if message[0] == "taken":
+                _, worker_id, request_id = message
+                self._assigned[worker_id] = request_id
+                continue
+            
+            _, request_id, shape, error = message
+            self._finish(request_id, shape, error)
+    
+    def _finish(self, request_id: int, shape: Optional[Tuple[int, ...]], error: Optional[str]) -> None:
+        with self._pending_lock:
+            pending = self._pending.pop(request_id, None)
+            depth = len(self._pending)
+        metrics.set_gauge("inference_queue_depth", depth, pool="embedding")
+        if pending is None:
+            return
+        
+        future, buffers = pending
+        try:
+            if error is None:
+                vectors = np.ndarray(shape, dtype=np.float32, buffer=buffers[0].buf).copy()
+        finally:
+            self._release(buffers)
+        if error is None:
+            future.set_result(vectors)
+        else:
+            future.set_exception(RuntimeError(error))
+    
+    def _check_workers(self) -> None:
+        """工作进程意外退出时让其正在处理的请求失败，并重新启动"""
+        if self._closing:
+            return
+        for worker_id, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            
+            exitcode = process.exitcode
+            error = f"Embedding worker {worker_id} exited with code {exitcode}"
+            print(f"{error}, restarting")
+            if not self._ready.is_set():
+                # 启动阶段退出（如加载模型时内存不足）不重试
+                self._startup_error = error
+                self._ready.set()
+                return
+            
+            request_id = self._assigned.pop(worker_id, None)
+            if request_id is not None:
+                self._finish(request_id, None, error)
+            self._processes[worker_id] = self._start_worker(worker_id)
+    
+    @staticmethod
+    def _release(buffers: List[shared_memory.SharedMemory]) -> None:
+        for shm in buffers:
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+    
+    def _submit(self, kind: str, items: List[Any]) -> np.ndarray:
+        """按工作进程数切分输入并发提交，按原顺序拼接结果"""
+        if not self._processes:
+            raise RuntimeError("Embedding worker pool is closed")
+        if not items:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        
+        size = max(self.min_batch, math.ceil(len(items) / self.num_workers))
+        futures = []
+        for start in range(0, len(items), size):
+            chunk = items[start:start + size]
+            request_id = next(self._request_ids)
+            future = Future()
+            pixels = None
+            if kind == "image":
+                chunk, pixels = _pack_images(chunk)
+            buffers = [shared_memory.SharedMemory(create=True, size=max(len(chunk) * self.dimension * 4, 1))]
+            if pixels is not None:
+                buffers.append(pixels)
+            with self._pending_lock:
+                self._pending[request_id] = (future, buffers)
+                depth = len(self._pending)
+            metrics.set_gauge("inference_queue_depth", depth, pool="embedding")
+            self._requests.put((request_id, kind, chunk, buffers[0].name, pixels.name if pixels else None))
+            futures.append((request_id, future))
+        
+        try:
+            return np.vstack([future.result(timeout=self.timeout) for _, future in futures])
+        except Exception:
+            # 超时或失败后不再等待其余子批次，释放它们的共享内存（工作进程写入时会报错并被忽略）
+            for request_id, future in futures:
+                if not future.done():
+                    self._finish(request_id, None, "Embedding request abandoned")
+            raise
+    
+    def embed_text(self, texts: Union[str, List[str]]) -> np.ndarray:
+        """文本嵌入"""
+        if isinstance(texts, str):
+            texts = [texts]
+        return self._submit("text", list(texts))
+    
+    def embed_image(self, images: Union[str, Image.Image, List[Union[str, Image.Image]]]) -> np.ndarray:
+        """图片嵌入（已解码图片的像素经共享内存传给工作进程，图片路径由工作进程读盘）"""
+        if isinstance(images, (str, Image.Image)):
+            images = [images]
+        return self._submit("image", list(images))
+    
+    def close(self) -> None:
+        """停止工作进程"""
+        self._closing = True
+        for _ in self._processes:
+            self._requests.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        
+        if self._dispatcher is not None:
+            self._results.put(None)
+            self._dispatcher.join(timeout=5)
+            self._dispatcher = None
+        
+        with self._pending_lock:
+            for future, buffers in self._pending.values():
+                self._release(buffers)
+                future.set_exception(RuntimeError("Embedding worker pool closed"))
+            self._pending.clear()
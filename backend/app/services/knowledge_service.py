@@ -1,18 +1,34 @@
 """
 知识检索核心服务
 """
+import json
+import logging
 import uuid
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 import numpy as np
 
+from ..core import metrics, tracing
 from ..core.config import Settings
 from ..models.schemas import FileType, ProcessingStatus
-from .embeddings.factory import EmbedderFactory
+from .embeddings.registry import EmbedderRegistry, DEFAULT_SPACE
 from .storage.factory import VectorDBFactory
+from .storage.metadata_catalog import MetadataCatalog
+from .storage.thumbnail_store import ThumbnailStore
 from .processors.factory import ProcessorFactory
-from .retrieval import HybridRetriever, MultiPathRetriever
+from .processors.cache import file_content_hash
+from .processors.image_processor import HAS_OCR, get_ocr_reader
+from .processors.audio_processor import HAS_WHISPER, load_whisper_model, shutdown_transcription_pools
+from .processors.video_processor import VideoProcessor
+from .retrieval import HybridRetriever, MultiPathRetriever, QueryExpander, MetadataIndex, TokenizerFactory
+from .reindex import ReindexJob
+
+
+# 慢查询日志（每条记录一行 JSON）
+slow_query_logger = logging.getLogger(__name__ + ".slow_query")
 
 
 class VectorRetrieverAdapter:
@@ -20,36 +36,54 @@ class VectorRetrieverAdapter:
     
     def __init__(self, service):
         self.service = service
-        self.doc_id_to_index = {}  # file_id -> index 映射
+        self._last_query: Tuple[Optional[Tuple[str, ...]], Any, Dict[str, np.ndarray]] = (None, None, {})
     
-    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+    def search(self, query: str, top_k: int = 10,
+               file_ids: Optional[Set[str]] = None) -> List[Tuple[int, float]]:
         """
         搜索接口适配
         返回: List[Tuple[doc_index, score]]
+        
+        doc_index 为文档在 HybridRetriever.documents 中的下标，
+        同一文件的多个向量只保留最高分。
+        """
+        return self.search_batch([query], top_k, file_ids)[0]
+    
+    def scores_bounded(self) -> bool:
         """
-        # 生成查询向量
-        q_vector = self.service.embedder.embed_text(query)
-        if len(q_vector.shape) > 1:
-            q_vector = q_vector.flatten()
+        返回结果的最后一名分数是否为未取到文件的分数上界
         
-        # 向量检索
-        results = self.service.vector_db.search(
-            query_vector=q_vector,
-            top_k=top_k,
-            filter=None
-        )
+        多个向量空间按 RRF 名次融合后保留各自的原始相似度，再按原始相似度排序，
+        此时加深后可能出现比最后一名分数更高的新文件。
+        """
+        return len(self.service.embedders.spaces) <= 1
+    
+    def search_batch(self, queries: List[str], top_k: int = 10,
+                     file_ids: Optional[Set[str]] = None) -> List[List[Tuple[int, float]]]:
+        """批量搜索：每个向量空间一次批量嵌入、一次批量检索"""
+        # 混合检索加深候选时复用同一批查询的嵌入
+        last_queries, embedders, query_vectors = self._last_query
+        hit = last_queries == tuple(queries) and embedders is self.service.embedders
+        metrics.record_cache("query_embedding", hit)
+        if not hit:
+            embedders = self.service.embedders
+            query_vectors = self.service._embed_queries(queries)
+            self._last_query = (tuple(queries), embedders, query_vectors)
+        
+        batch_results = self.service._search_spaces_batch(query_vectors, top_k, candidate_file_ids=file_ids)
         
         # 转换为 (doc_index, score) 格式
-        indexed_results = []
-        for vector_id, similarity, metadata in results:
-            file_id = metadata.get('file_id')
-            # 为每个文档分配一个索引
-            if file_id not in self.doc_id_to_index:
-                self.doc_id_to_index[file_id] = len(self.doc_id_to_index)
-            doc_index = self.doc_id_to_index[file_id]
-            indexed_results.append((doc_index, float(similarity)))
-        
-        return indexed_results
+        file_id_to_index = self.service.hybrid_retriever.file_id_to_index
+        converted = []
+        for results in batch_results:
+            best_scores: Dict[int, float] = {}
+            for vector_id, similarity, metadata in results:
+                doc_index = file_id_to_index.get(metadata.get('file_id'))
+                if doc_index is None:
+                    continue
+                best_scores[doc_index] = max(best_scores.get(doc_index, float('-inf')), float(similarity))
+            converted.append(sorted(best_scores.items(), key=lambda x: -x[1]))
+        return converted
 
 
 class KnowledgeRetrievalService:
@@ -63,9 +97,29 @@ class KnowledgeRetrievalService:
             settings: 配置对象
         """
         self.settings = settings
-        self.embedder = None
-        self.vector_db = None
-        self.file_metadata: Dict[str, Dict[str, Any]] = {}
+        self.embedders: Optional[EmbedderRegistry] = None
+        self.vector_dbs: Dict[str, Any] = {}  # 向量空间 -> 向量库
+        self.index_generation = 0  # 索引代数，每次更换模型重建索引后加一
+        self._index_lock = threading.RLock()  # 写入向量/元数据与切换索引互斥
+        self.reindex_job = None
+        self.file_metadata: Optional[MetadataCatalog] = None
+        
+        # 上传时与 OCR 并发执行图像嵌入
+        self._media_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="media")
+        
+        # 缩略图（图片和视频关键帧）
+        file_processing = settings.file_processing
+        self.thumbnails: Optional[ThumbnailStore] = None
+        if file_processing.thumbnail_dir:
+            self.thumbnails = ThumbnailStore(
+                file_processing.thumbnail_dir,
+                size=(file_processing.image or {}).get("thumbnail_size", 256),
+                quality=file_processing.thumbnail_quality
+            )
+        
+        # 元数据预过滤索引
+        self.metadata_index = MetadataIndex()
+        self._catalog_version = None
         
         # 混合检索相关
         self.hybrid_retriever = None
@@ -73,41 +127,208 @@ class KnowledgeRetrievalService:
         self._hybrid_indexed = False
         
         # 初始化组件
+        self._initialize_metadata_catalog()
         self._initialize_embedder()
         self._initialize_vector_db()
         self._initialize_hybrid_retriever()
+        metrics.register_refresh("index", self._refresh_metrics)
     
-    def _initialize_embedder(self) -> None:
-        """初始化嵌入器"""
+    @property
+    def embedder(self):
+        """文本嵌入器（文档分块、OCR 文字、查询）"""
+        return self.embedders.embedder_for("text") if self.embedders else None
+    
+    @property
+    def vector_db(self):
+        """文本向量空间对应的向量库"""
+        return self.vector_dbs.get(self.embedders.space_for("text")) if self.embedders else None
+    
+    def warm_up(self) -> None:
+        """
+        预热模型（在后台启动阶段调用）
+        
+        按 performance.warmup 配置执行一次嵌入推理并加载 OCR / Whisper 模型，
+        避免首个用户请求承担模型加载时间。
+        """
+        components = getattr(self.settings.performance, 'warmup', [])
+        start_time = time.time()
+        
+        if "embedder" in components and self.embedders is not None:
+            for _, embedder in self.embedders.items():
+                embedder.embed_text(["warm up"])
+        
+        if "ocr" in components:
+            image_config = self.settings.file_processing.image or {}
+            if image_config.get("enable_ocr", True) and HAS_OCR:
+                get_ocr_reader()
+        
+        if "audio" in components and HAS_WHISPER:
+            audio_config = self.settings.file_processing.audio or {}
+            load_whisper_model(audio_config.get("model_size", "base"))
+        
+        print(f"Warm-up finished in {time.time() - start_time:.2f}s ({', '.join(components) or 'none'})")
+    
+    def close(self) -> None:
+        """释放资源（向量库落盘、停止嵌入和转写工作进程、关闭元数据目录）"""
+        if self.embedders is not None:
+            self.embedders.close()
+        for vector_db in self.vector_dbs.values():
+            vector_db.close()
+        if self.file_metadata is not None:
+            self.file_metadata.close()
+        self._media_executor.shutdown(wait=False)
+        shutdown_transcription_pools()
+    
+    def _initialize_metadata_catalog(self) -> None:
+        """初始化文件元数据目录（SQLite 持久化）"""
         try:
-            self.embedder = EmbedderFactory.create_embedder(
-                provider=self.settings.embedding.provider,
-                model_name=self.settings.embedding.model_name,
-                device=self.settings.embedding.device
+            db_type = self.settings.database.type
+            if db_type != "sqlite":
+                raise ValueError(f"Unsupported metadata database type: {db_type}")
+            
+            sqlite_config = self.settings.database.sqlite or {}
+            memory_cache = self.settings.cache.memory or {}
+            self.file_metadata = MetadataCatalog(
+                path=sqlite_config.get("path", "./data/metadata.db"),
+                cache_size=memory_cache.get("max_size", 1000)
             )
-            print(f"Embedder initialized: {self.settings.embedding.model_name}")
+            self._sync_catalog()
+            print(f"Metadata catalog initialized: {self.file_metadata.path} ({len(self.metadata_index)} files)")
         except Exception as e:
-            print(f"Error initializing embedder: {e}")
+            print(f"Error initializing metadata catalog: {e}")
             raise
     
-    def _initialize_vector_db(self) -> None:
-        """初始化向量数据库"""
+    def _sync_catalog(self) -> None:
+        """
+        同步其他 worker 对元数据目录的写入
+        
+        目录版本变化时只读取已完成文件的 file_id，与元数据索引和已建立的混合索引比较，
+        只对新增和删除的文件做增量更新（文件记录创建后索引字段不再变化）。
+        """
+        version = self.file_metadata.data_version()
+        if version == self._catalog_version:
+            return
+        
+        current = self.file_metadata.file_ids(status=ProcessingStatus.COMPLETED)
+        indexed = self.metadata_index.file_ids()
+        missing = current - indexed
+        hybrid_ids = None
+        if self.hybrid_retriever and self._hybrid_indexed:
+            hybrid_ids = set(self.hybrid_retriever.file_id_to_index)
+            missing |= current - hybrid_ids
+        added = {record["file_id"]: record for record in self.file_metadata.records_by_ids(missing)}
+        
+        for file_id in indexed - current:
+            self.metadata_index.remove(file_id)
+        for file_id in current - indexed:
+            record = added.get(file_id)
+            if record is not None:
+                self._index_metadata(record)
+        
+        if hybrid_ids is not None:
+            for file_id in hybrid_ids - current:
+                self.hybrid_retriever.remove_document(file_id)
+            documents = [self._hybrid_document(added[id]) for id in current - hybrid_ids if id in added]
+            if documents:
+                self.hybrid_retriever.add_documents(documents)
+        
+        self._catalog_version = version
+        
+        # 其他 worker 完成了重建索引切换
+        active = self.file_metadata.get_state("active_index")
+        if self.embedders is not None and active and active["generation"] != self.index_generation:
+            self._load_active_index(active)
+    
+    def _index_metadata(self, record: Dict[str, Any]) -> None:
+        """把文件记录加入元数据索引（旧记录的向量未按空间分组）"""
+        vector_spaces = record.get("vector_spaces")
+        if not vector_spaces and record.get("vector_ids"):
+            vector_spaces = {MetadataIndex.LEGACY_SPACE: record["vector_ids"]}
+        self.metadata_index.add(
+            record["file_id"],
+            record.get("file_type", "unknown"),
+            record.get("filename", ""),
+            record.get("upload_time", 0.0),
+            record.get("tags", []),
+            vector_spaces
+        )
+    
+    @staticmethod
+    def _compute_content_hash(file_path: str) -> str:
+        """计算文件内容的 SHA-256 哈希（与处理结果缓存共用，同一文件只读一遍）"""
+        return file_content_hash(file_path)
+    
+    def _initialize_embedder(self) -> None:
+        """初始化嵌入器（按模态路由到各向量空间）"""
         try:
-            provider = self.settings.vector_db.provider
-            config = getattr(self.settings.vector_db, provider, {})
-            
-            if config is None:
-                config = {}
+            # 重建索引切换过模型时，以持久化的当前索引为准
+            active = self.file_metadata.get_state("active_index")
+            if active:
+                self.index_generation = active["generation"]
+                self.settings.embedding = self.settings.embedding.model_copy(update=active["embedding"])
+                print(f"Using index generation {self.index_generation}: {self.settings.embedding.model_name}")
             
-            self.vector_db = VectorDBFactory.create_database(
+            self.embedders = self._create_embedders(self.settings.embedding)
+        except Exception as e:
+            print(f"Error initializing embedder: {e}")
+            raise
+    
+    @staticmethod
+    def _space_db_config(config: Dict[str, Any], space: str, generation: int = 0) -> Dict[str, Any]:
+        """向量空间使用独立的集合（default 空间、第 0 代沿用原集合）"""
+        suffix = "" if space == DEFAULT_SPACE else f"_{space}"
+        if generation:
+            suffix += f"_g{generation}"
+        if not suffix:
+            return dict(config)
+        
+        config = dict(config)
+        config["collection_name"] = f"{config.get('collection_name', 'knowledge_base')}{suffix}"
+        if "index_dir" in config:
+            index_dir = Path(config["index_dir"])
+            if space != DEFAULT_SPACE:
+                index_dir = index_dir / space
+            config["index_dir"] = f"{index_dir}_g{generation}" if generation else str(index_dir)
+        return config
+    
+    def _create_embedders(self, embedding_config) -> EmbedderRegistry:
+        """创建嵌入器注册表（工作池按服务进程数分配核心）"""
+        server_workers = 1 if self.settings.service.debug else self.settings.performance.workers
+        return EmbedderRegistry(embedding_config, server_workers=server_workers)
+    
+    def _create_vector_dbs(self, embedders: EmbedderRegistry, generation: int) -> Dict[str, Any]:
+        """为每个向量空间创建向量库"""
+        provider = self.settings.vector_db.provider
+        config = getattr(self.settings.vector_db, provider, {})
+        
+        if config is None:
+            config = {}
+        
+        return {
+            space: VectorDBFactory.create_database(
                 provider=provider,
-                **config
+                **self._space_db_config(config, space, generation)
             )
-            print(f"Vector database initialized: {provider}")
+            for space in embedders.spaces
+        }
+    
+    def _initialize_vector_db(self) -> None:
+        """初始化向量数据库（每个向量空间一个集合）"""
+        try:
+            self.vector_dbs = self._create_vector_dbs(self.embedders, self.index_generation)
+            print(f"Vector database initialized: {self.settings.vector_db.provider} ({', '.join(self.vector_dbs)})")
         except Exception as e:
             print(f"Error initializing vector database: {e}")
             raise
     
+    def _vector_spaces(self, file_info: Dict[str, Any]) -> Dict[str, List[str]]:
+        """文件的向量ID按空间分组（旧记录没有分组，视为文本空间）"""
+        vector_spaces = file_info.get("vector_spaces")
+        if vector_spaces:
+            return vector_spaces
+        vector_ids = file_info.get("vector_ids", [])
+        return {self.embedders.space_for("text"): vector_ids} if vector_ids else {}
+    
     def _initialize_hybrid_retriever(self) -> None:
         """初始化混合检索器"""
         try:
@@ -117,16 +338,24 @@ class KnowledgeRetrievalService:
                 alpha = getattr(self.settings.retrieval, 'hybrid_alpha', 0.5)
                 # 创建向量检索适配器
                 vector_adapter = VectorRetrieverAdapter(self)
+                retrieval_config = self.settings.retrieval
                 self.hybrid_retriever = HybridRetriever(
                     vector_retriever=vector_adapter,
-                    alpha=alpha
+                    alpha=alpha,
+                    depth_factor=retrieval_config.fusion_depth_factor,
+                    min_depth=retrieval_config.fusion_min_depth,
+                    max_depth=retrieval_config.fusion_max_depth,
+                    tokenizer=TokenizerFactory.create_tokenizer(**retrieval_config.tokenizer)
                 )
-                print(f"Hybrid retriever initialized (alpha={alpha})")
+                print(f"Hybrid retriever initialized (alpha={alpha}, tokenizer={retrieval_config.tokenizer.get('type', 'bigram')})")
                 
                 # 检查是否启用多路召回
                 enable_multi_path = getattr(self.settings.retrieval, 'enable_multi_path', False)
                 if enable_multi_path:
-                    self.multi_path_retriever = MultiPathRetriever(self.hybrid_retriever)
+                    self.multi_path_retriever = MultiPathRetriever(
+                        self.hybrid_retriever,
+                        query_expander=QueryExpander(**retrieval_config.query_expansion)
+                    )
                     print("Multi-path retriever initialized")
         except Exception as e:
             print(f"Error initializing hybrid retriever: {e}")
@@ -136,14 +365,16 @@ class KnowledgeRetrievalService:
             self.hybrid_retriever = None
             self.multi_path_retriever = None
     
-    async def upload_file(self, file_path: str, filename: str) -> Dict[str, Any]:
+    async def upload_file(self, file_path: str, filename: str,
+                          tags: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         上传并处理文件
         
         Args:
             file_path: 文件路径
             filename: 文件名
-            
+            tags: 自定义标签
+        
         Returns:
             处理结果
         """
@@ -151,6 +382,9 @@ class KnowledgeRetrievalService:
         
         # 生成文件 ID
         file_id = str(uuid.uuid4())
+        upload_time = time.time()
+        tags = [t.strip() for t in (tags or []) if t and t.strip()]
+        file_type = "unknown"
         
         try:
             # 获取文件类型
@@ -159,21 +393,12 @@ class KnowledgeRetrievalService:
             if file_type == "unknown":
                 raise ValueError(f"Unsupported file type: {filename}")
             
-            # 创建处理器
-            processor_config = getattr(self.settings.file_processing, file_type, {})
-            if processor_config is None:
-                processor_config = {}
-                
-            processor = ProcessorFactory.create_processor(
-                file_path=file_path,
-                **processor_config
-            )
+            content_hash = self._compute_content_hash(file_path)
             
-            # 处理文件
-            result = processor.process(file_path)
-            
-            # 生成嵌入
-            embeddings = await self._generate_embeddings(result, file_type)
+            # 处理文件并生成嵌入（待嵌入内容保存下来，更换模型时无需重新处理文件即可重新嵌入）
+            result, inputs, embedders, embeddings = self._process_and_embed(file_path, file_type)
+            vector_ids = [f"{file_id}_{i}" for i in range(len(inputs))]
+            thumbnail = self._create_thumbnails(result, inputs, file_type, content_hash)
             
             # 存储到向量数据库
             metadata = {
@@ -181,31 +406,78 @@ class KnowledgeRetrievalService:
                 "filename": filename,
                 "file_type": file_type,
                 "file_path": file_path,
+                "upload_time": upload_time,
+                "tags": ",".join(tags),
                 **result.get("metadata", {})
             }
+            if thumbnail:
+                metadata["thumbnail"] = thumbnail
             
-            vector_ids = self.vector_db.insert(
-                vectors=embeddings,
-                metadatas=[metadata] * len(embeddings),
-                ids=[f"{file_id}_{i}" for i in range(len(embeddings))]
-            )
+            # 待嵌入内容先于文件记录写入，重建索引发现该文件时即可迁移
+            self.file_metadata.put_chunks(file_id, [
+                {"vector_id": vector_id, **item} for vector_id, item in zip(vector_ids, inputs)
+            ])
             
-            # 保存元数据
-            processing_time = time.time() - start_time
+            with self._index_lock:
+                while True:
+                    # 嵌入期间若切换了索引，用新模型重新嵌入
+                    self._sync_catalog()
+                    while embedders is not self.embedders:
+                        embedders = self.embedders
+                        self._index_lock.release()
+                        try:
+                            embeddings = self._embed_inputs(inputs, embedders)
+                        finally:
+                            self._index_lock.acquire()
+                    
+                    with metrics.ingest_stage("insert"):
+                        vector_spaces = {}
+                        for space, (positions, space_embeddings) in embeddings.items():
+                            vector_spaces[space] = self.vector_dbs[space].insert(
+                                vectors=space_embeddings,
+                                metadatas=[self._vector_metadata(metadata, inputs[i]) for i in positions],
+                                ids=[vector_ids[i] for i in positions]
+                            )
+                        
+                        # 保存元数据（索引代数未被其他 worker 切换时才提交）
+                        processing_time = time.time() - start_time
+                        
+                        committed = self.file_metadata.put_if_generation(file_id, {
+                            "file_id": file_id,
+                            "filename": filename,
+                            "file_type": file_type,
+                            "file_path": file_path,
+                            "content_hash": content_hash,
+                            "upload_time": upload_time,
+                            "tags": tags,
+                            "vector_ids": vector_ids,
+                            "vector_spaces": vector_spaces,
+                            "vector_count": len(vector_ids),
+                            "processing_time": processing_time,
+                            "status": ProcessingStatus.COMPLETED,
+                            "metadata": metadata
+                        }, self.index_generation)
+                    if committed:
+                        break
+                    
+                    # 其他 worker 已切换到新索引：撤销写入旧索引的向量，加载新索引后重新写入
+                    for space, ids in vector_spaces.items():
+                        self.vector_dbs[space].delete(ids)
+                    active = self.file_metadata.get_state("active_index")
+                    if active and active["generation"] != self.index_generation:
+                        self._load_active_index(active)
+                
+                self.metadata_index.add(file_id, file_type, filename, upload_time, tags, vector_spaces)
             
-            self.file_metadata[file_id] = {
-                "file_id": file_id,
-                "filename": filename,
-                "file_type": file_type,
-                "file_path": file_path,
-                "vector_ids": vector_ids,
-                "processing_time": processing_time,
-                "status": ProcessingStatus.COMPLETED,
-                "metadata": metadata
-            }
+            # 混合索引已建立时增量追加，否则在下次检索时重建
+            if self.hybrid_retriever and self._hybrid_indexed:
+                self.hybrid_retriever.add_documents(
+                    [self._hybrid_document(self.file_metadata[file_id])]
+                )
             
-            # 标记混合索引需要更新
-            self._hybrid_indexed = False
+            metrics.observe("ingest_seconds", time.time() - start_time, file_type=file_type)
+            metrics.inc("ingest_files_total", file_type=file_type, status="completed")
+            self._refresh_metrics()
             
             return {
                 "file_id": file_id,
@@ -213,76 +485,237 @@ class KnowledgeRetrievalService:
                 "file_type": file_type,
                 "status": ProcessingStatus.COMPLETED,
                 "processing_time": processing_time,
-                "vector_count": len(embeddings)
+                "vector_count": len(vector_ids)
             }
-            
+        
         except Exception as e:
             # 标记为失败
             self.file_metadata[file_id] = {
                 "file_id": file_id,
                 "filename": filename,
+                "upload_time": upload_time,
                 "status": ProcessingStatus.FAILED,
                 "error": str(e)
             }
+            metrics.inc("ingest_files_total", file_type=file_type, status="failed")
             raise
     
-    async def _generate_embeddings(self, processed_data: Dict[str, Any], 
-                                   file_type: str) -> np.ndarray:
+    def _create_processor(self, file_path: str, file_type: str):
+        """按配置创建对应的处理器"""
+        processor_config = getattr(self.settings.file_processing, file_type, {})
+        if processor_config is None:
+            processor_config = {}
+        
+        # 处理结果缓存目录对所有处理器生效，可被单个类型的配置覆盖
+        processor_config = {"cache_dir": self.settings.file_processing.cache_dir, **processor_config}
+        if file_type == "video":
+            # 音轨转写沿用音频处理配置（采样率、最大时长、VAD）
+            processor_config.setdefault("audio", getattr(self.settings.file_processing, "audio", None) or {})
+        
+        return ProcessorFactory.create_processor(
+            file_path=file_path,
+            **processor_config
+        )
+    
+    def _process_file(self, file_path: str, file_type: str) -> Dict[str, Any]:
+        """使用对应的处理器处理文件"""
+        with metrics.ingest_stage("extract"):
+            return self._create_processor(file_path, file_type).process(file_path)
+    
+    def _process_and_embed(self, file_path: str, file_type: str) -> Tuple[
+            Dict[str, Any], List[Dict[str, Any]], EmbedderRegistry,
+            Dict[str, Tuple[List[int], np.ndarray]]]:
         """
-        生成嵌入向量
+        处理文件并用当前嵌入器生成嵌入
+        
+        图片只解码一次：解码后的图片交给线程池做图像嵌入，同时在当前线程做 OCR，
+        OCR 完成后再嵌入提取的文字。
+        
+        Returns:
+            (处理结果, 待嵌入内容, 使用的嵌入器注册表, 嵌入结果)
+        """
+        embedders = self.embedders
+        if file_type != "image":
+            result = self._process_file(file_path, file_type)
+            inputs = self._embedding_inputs(result, file_type)
+            return result, inputs, embedders, self._embed_inputs(inputs, embedders)
+        
+        processor = self._create_processor(file_path, file_type)
+        with metrics.ingest_stage("extract"):
+            image, metadata, ocr_image = processor.load_image(file_path)
+        pixels = self._media_executor.submit(self._embed_inputs, [
+            {"modality": "image", "kind": "image", "content": file_path, "data": image}
+        ], embedders)
+        
+        with metrics.ingest_stage("extract"):
+            result = processor.process_loaded(file_path, image, metadata, ocr_image)
+        inputs = self._embedding_inputs(result, file_type)
+        text_embeddings = self._embed_inputs(inputs[1:], embedders)
+        
+        # 合并：图像向量在第 0 位，文字向量整体后移一位
+        embeddings = {
+            space: (list(positions), [vectors])
+            for space, (positions, vectors) in pixels.result().items()
+        }
+        for space, (positions, vectors) in text_embeddings.items():
+            space_positions, parts = embeddings.setdefault(space, ([], []))
+            space_positions.extend(i + 1 for i in positions)
+            parts.append(vectors)
+        embeddings = {
+            space: (positions, np.vstack(parts))
+            for space, (positions, parts) in embeddings.items()
+        }
+        return result, inputs, embedders, embeddings
+    
+    def _create_thumbnails(self, processed_data: Dict[str, Any], inputs: List[Dict[str, Any]],
+                           file_type: str, content_hash: str) -> Optional[str]:
+        """
+        生成 WebP 缩略图
+        
+        图片使用已解码（已缩小）的图片；视频为每个关键帧生成封面，写入该帧向量的
+        元数据，第一帧同时作为文件封面。
+        
+        Returns:
+            文件缩略图键，未生成时为 None
+        """
+        if self.thumbnails is None:
+            return None
+        
+        try:
+            if file_type == "image" and processed_data.get("content") is not None:
+                return self.thumbnails.create(processed_data["content"], content_hash)
+            
+            if file_type == "video":
+                poster = None
+                for item in inputs:
+                    if item["kind"] == "image":
+                        key = self.thumbnails.create_from_file(item["content"])
+                        item.setdefault("metadata", {})["thumbnail"] = key
+                        poster = poster or key
+                return poster
+        except Exception as e:
+            print(f"Thumbnail generation failed: {e}")
+        return None
+    
+    @staticmethod
+    def _thumbnail_url(metadata: Dict[str, Any]) -> Optional[str]:
+        key = metadata.get("thumbnail")
+        return ThumbnailStore.url(key) if key else None
+    
+    @staticmethod
+    def _embedding_inputs(processed_data: Dict[str, Any], file_type: str) -> List[Dict[str, Any]]:
+        """
+        整理待嵌入的内容
         
         Args:
             processed_data: 处理后的数据
             file_type: 文件类型
-            
+        
         Returns:
-            嵌入向量数组
+            按向量顺序排列的 {"modality", "kind": text/image, "content"} 列表，
+            第 i 项对应向量ID {file_id}_{i}；可选的 "metadata" 为该向量独有的元数据
+            （如视频帧时间戳），写入时合并到文件元数据之上；可选的 "data" 为
+            内存中已解码的内容（嵌入时代替 content，不持久化）
         """
         if file_type == "image":
-            # 图片嵌入
-            file_path = processed_data["file_path"]
-            image_embedding = self.embedder.embed_image(file_path)
-            
-            # 确保是二维数组
-            if len(image_embedding.shape) == 1:
-                image_embedding = image_embedding.reshape(1, -1)
-            
-            # 如果有 OCR 提取的文字，也生成文字向量
+            # 图片像素（已解码的图片放在 data 中直接嵌入，不再读盘），以及 OCR 提取的文字
+            inputs = [{"modality": "image", "kind": "image", "content": processed_data["file_path"]}]
+            if processed_data.get("content") is not None:
+                inputs[0]["data"] = processed_data["content"]
             text_content = processed_data.get("text_content", "")
             if text_content and text_content.strip():
-                print(f"Generating text embedding for OCR text: {text_content[:50]}...")
-                text_embedding = self.embedder.embed_text([text_content])
-                
-                # 合并图像向量和文字向量
-                embeddings = np.vstack([image_embedding, text_embedding])
-                print(f"Combined embeddings: image + text = {embeddings.shape}")
-            else:
-                embeddings = image_embedding
-                
-        elif file_type == "document":
-            # 文档嵌入（使用文本块）
-            chunks = processed_data.get("chunks", [processed_data["content"]])
-            
-            if not chunks:
-                chunks = [processed_data["content"]]
-            
-            embeddings = self.embedder.embed_text(chunks)
-            
-        elif file_type == "audio":
-            # 音频嵌入（使用转写文本）
+                inputs.append({"modality": "text", "kind": "text", "content": text_content})
+            return inputs
+        
+        if file_type == "document":
+            # 文档使用文本块
+            chunks = processed_data.get("chunks") or [processed_data["content"]]
+            return [{"modality": "text", "kind": "text", "content": chunk} for chunk in chunks]
+        
+        if file_type == "video":
+            # 视频关键帧走 CLIP 等图像模型，音轨转写片段走文本模型，各自带时间戳
+            inputs = [
+                {"modality": "video", "kind": "image", "content": keyframe["path"],
+                 "metadata": {"timestamp": keyframe["timestamp"]}}
+                for keyframe in processed_data.get("keyframes", [])
+            ]
+            inputs.extend(
+                {"modality": "audio", "kind": "text", "content": segment["text"],
+                 "metadata": {"timestamp": segment["start"], "end_time": segment["end"]}}
+                for segment in processed_data.get("segments", [])
+            )
+            if not inputs:
+                file_name = processed_data.get("metadata", {}).get("file_name", "video file")
+                inputs.append({"modality": "text", "kind": "text", "content": file_name})
+            return inputs
+        
+        if file_type == "audio":
+            # 音频每个转写分段一个向量（带时间戳），无分段时使用全文或文件名
+            segments = processed_data.get("segments")
+            if segments:
+                return [
+                    {"modality": "audio", "kind": "text", "content": segment["text"],
+                     "metadata": {"timestamp": segment["start"], "end_time": segment["end"]}}
+                    for segment in segments
+                ]
             text_content = processed_data.get("text_content", "")
-            
             if not text_content or not text_content.strip():
-                # 如果转写为空，使用文件名
                 text_content = processed_data.get("metadata", {}).get("file_name", "audio file")
-            
-            print(f"Generating audio embedding for transcribed text: {text_content[:100]}...")
-            embeddings = self.embedder.embed_text([text_content])
-            
-        else:
-            raise ValueError(f"Unsupported file type for embedding: {file_type}")
+            return [{"modality": "audio", "kind": "text", "content": text_content}]
         
-        return embeddings
+        raise ValueError(f"Unsupported file type for embedding: {file_type}")
+    
+    @staticmethod
+    def _vector_metadata(metadata: Dict[str, Any], item: Dict[str, Any]) -> Dict[str, Any]:
+        """文件元数据合并单个向量的元数据"""
+        if not item.get("metadata"):
+            return metadata
+        return {**metadata, **item["metadata"]}
+    
+    def _embed_inputs(self, inputs: List[Dict[str, Any]],
+                      embedders: EmbedderRegistry) -> Dict[str, Tuple[List[int], np.ndarray]]:
+        """
+        生成嵌入向量
+        
+        Args:
+            inputs: _embedding_inputs 的结果
+            embedders: 使用的嵌入器注册表
+        
+        Returns:
+            向量空间 -> (输入位置列表, 嵌入向量数组)
+        """
+        with metrics.ingest_stage("embed"):
+            return self._embed_groups(inputs, embedders)
+    
+    def _embed_groups(self, inputs: List[Dict[str, Any]],
+                      embedders: EmbedderRegistry) -> Dict[str, Tuple[List[int], np.ndarray]]:
+        """按 (向量空间, 输入类型) 分组批量嵌入"""
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for position, item in enumerate(inputs):
+            space = embedders.space_for(item["modality"])
+            groups.setdefault((space, item["kind"]), []).append(position)
+        
+        batch_size = self.settings.embedding.batch_size
+        embeddings: Dict[str, Tuple[List[int], List[np.ndarray]]] = {}
+        for (space, kind), positions in groups.items():
+            embedder = embedders.get(space)
+            contents = [inputs[i].get("data", inputs[i]["content"]) for i in positions]
+            for start in range(0, len(contents), batch_size):
+                batch = contents[start:start + batch_size]
+                if kind == "image":
+                    vectors = embedder.embed_image(batch)
+                else:
+                    vectors = embedder.embed_text(batch)
+                vectors = np.asarray(vectors, dtype=np.float32).reshape(len(batch), -1)
+                
+                space_positions, parts = embeddings.setdefault(space, ([], []))
+                space_positions.extend(positions[start:start + batch_size])
+                parts.append(vectors)
+        
+        return {
+            space: (positions, np.vstack(parts))
+            for space, (positions, parts) in embeddings.items()
+        }
     
     async def search(self, query: Optional[str] = None, 
                     file_id: Optional[str] = None,
@@ -290,7 +723,8 @@ class KnowledgeRetrievalService:
                     top_k: int = 10,
                     threshold: float = 0.0,
                     filter: Optional[Dict[str, Any]] = None,
-                    use_hybrid: bool = True) -> List[Dict[str, Any]]:
+                    use_hybrid: bool = True,
+                    debug_timing: bool = False) -> List[Dict[str, Any]]:
         """
         搜索相似内容
         
@@ -302,50 +736,110 @@ class KnowledgeRetrievalService:
             threshold: 相似度阈值
             filter: 过滤条件
             use_hybrid: 是否使用混合检索
-            
+            debug_timing: 是否在结果中返回各阶段耗时与候选数量（timing）
+        
         Returns:
             搜索结果列表
         """
+        with tracing.trace_search() as trace:
+            response = await self._search(query, file_id, query_vector, top_k, threshold, filter, use_hybrid)
+        
+        method = response.get("method", "vector")
+        timing = {"path": method, **trace.to_dict()}
+        metrics.observe("search_seconds", timing["total"], method=method)
+        if debug_timing:
+            response["timing"] = timing
+        
+        slow_query = self.settings.monitoring.slow_query or {}
+        if slow_query.get("enabled", True) and timing["total"] >= float(slow_query.get("threshold", 1.0)):
+            self._log_slow_query(timing, query=query, file_id=file_id, query_vector=query_vector,
+                                 top_k=top_k, threshold=threshold, filter=filter, use_hybrid=use_hybrid)
+        return response
+    
+    def _log_slow_query(self, timing: Dict[str, Any], query: Optional[str],
+                        query_vector: Optional[np.ndarray], **params: Any) -> None:
+        """记录慢查询：查询、请求参数、检索配置、耗时分解和检索路径"""
+        retrieval = self.settings.retrieval
+        record = {
+            "event": "slow_query",
+            "query": query,
+            "query_vector_dim": len(query_vector) if query_vector is not None else None,
+            "params": params,
+            "config": {
+                "vector_db": self.settings.vector_db.provider,
+                "embedding_model": self.settings.embedding.model_name,
+                "multi_model": self.settings.embedding.multi_model,
+                "enable_hybrid": retrieval.enable_hybrid,
+                "enable_multi_path": retrieval.enable_multi_path,
+                "hybrid_alpha": retrieval.hybrid_alpha,
+                "fusion_depth": [retrieval.fusion_min_depth, retrieval.fusion_max_depth],
+                "tokenizer": retrieval.tokenizer.get("type"),
+                "indexed_files": len(self.file_metadata),
+            },
+            **timing,
+        }
+        slow_query_logger.warning(json.dumps(record, ensure_ascii=False, default=str))
+    
+    async def _search(self, query: Optional[str], file_id: Optional[str],
+                      query_vector: Optional[np.ndarray], top_k: int, threshold: float,
+                      filter: Optional[Dict[str, Any]], use_hybrid: bool) -> Dict[str, Any]:
         start_time = time.time()
         
+        # 其他 worker 写入后刷新元数据索引
+        self._sync_catalog()
+        
+        # 元数据预过滤：将过滤条件解析为候选文件集合
+        # 包含未索引字段时返回 None，回退到向量库的 where 过滤
+        candidate_file_ids = None
+        if filter:
+            candidate_file_ids = self.metadata_index.resolve(filter)
+            if candidate_file_ids is not None:
+                tracing.count("filter_candidates", len(candidate_file_ids))
+            if candidate_file_ids is not None and not candidate_file_ids:
+                return {
+                    "results": [],
+                    "total": 0,
+                    "query_time": time.time() - start_time
+                }
+        indexed_filter = not filter or candidate_file_ids is not None
+        
         # 尝试使用混合检索（仅当有文本查询时）
-        if use_hybrid and query and self.multi_path_retriever:
-            return await self._hybrid_search(query, top_k, threshold, start_time)
-        elif use_hybrid and query and self.hybrid_retriever:
-            return await self._simple_hybrid_search(query, top_k, threshold, start_time)
+        if use_hybrid and query and indexed_filter and self.multi_path_retriever:
+            return await self._hybrid_search(query, top_k, threshold, start_time, candidate_file_ids)
+        elif use_hybrid and query and indexed_filter and self.hybrid_retriever:
+            return await self._simple_hybrid_search(query, top_k, threshold, start_time, candidate_file_ids)
         
         # 回退到原始向量检索
-        # 生成查询向量
+        # 生成查询向量（向量空间 -> 查询向量）
         if query_vector is not None:
-            q_vector = query_vector
+            # API 传入的是 List[float]，统一为 float32 数组，只检索维度匹配的空间
+            q_vector = np.asarray(query_vector, dtype=np.float32).flatten()
+            query_vectors = {
+                space: q_vector for space, embedder in self.embedders.items()
+                if embedder.get_dimension() == len(q_vector)
+            }
+            if not query_vectors:
+                raise ValueError(f"No embedding space with dimension {len(q_vector)}")
         elif query is not None:
-            q_vector = self.embedder.embed_text(query)
+            query_vectors = self._embed_query(query)
         elif file_id is not None:
-            # 从向量数据库获取文件向量
+            # 从向量数据库获取文件向量（第一个向量所在的空间）
             file_info = self.file_metadata.get(file_id)
             if not file_info:
                 raise ValueError(f"File not found: {file_id}")
             
-            vector_id = file_info["vector_ids"][0]
-            result = self.vector_db.get_by_id(vector_id)
+            space, vector_ids = next(iter(self._vector_spaces(file_info).items()), (None, []))
+            result = self.vector_dbs[space].get_by_id(vector_ids[0]) if vector_ids else None
             
             if result is None:
                 raise ValueError(f"Vector not found for file: {file_id}")
             
-            q_vector, _ = result
+            query_vectors = {space: np.asarray(result[0], dtype=np.float32).flatten()}
         else:
             raise ValueError("Either query, file_id, or query_vector must be provided")
         
-        # 确保查询向量是一维的
-        if len(q_vector.shape) > 1:
-            q_vector = q_vector.flatten()
-        
         # 搜索
-        results = self.vector_db.search(
-            query_vector=q_vector,
-            top_k=top_k,
-            filter=filter
-        )
+        results = self._search_spaces(query_vectors, top_k, filter, candidate_file_ids)
         
         # 格式化结果
         formatted_results = []
@@ -356,7 +850,8 @@ class KnowledgeRetrievalService:
                     "filename": metadata.get("filename"),
                     "file_type": metadata.get("file_type"),
                     "similarity": float(similarity),
-                    "metadata": metadata
+                    "metadata": metadata,
+                    "thumbnail_url": self._thumbnail_url(metadata)
                 })
         
         query_time = time.time() - start_time
@@ -374,37 +869,22 @@ class KnowledgeRetrievalService:
         Args:
             updates: 配置更新
         """
-        # 更新嵌入模型
+        # 更换嵌入模型：后台用新模型重建索引，完成后切换（期间旧模型继续服务）
         if "embedding_model" in updates or "embedding_provider" in updates:
-            provider = updates.get("embedding_provider", self.settings.embedding.provider)
-            model_name = updates.get("embedding_model", self.settings.embedding.model_name)
-            
-            self.embedder = EmbedderFactory.create_embedder(
-                provider=provider,
-                model_name=model_name,
-                device=self.settings.embedding.device
+            self.start_reindex(
+                model_name=updates.get("embedding_model"),
+                provider=updates.get("embedding_provider")
             )
-            
-            # 更新配置
-            if "embedding_provider" in updates:
-                self.settings.embedding.provider = provider
-            if "embedding_model" in updates:
-                self.settings.embedding.model_name = model_name
         
         # 更新向量数据库
         if "vector_db_provider" in updates:
-            provider = updates["vector_db_provider"]
-            config = getattr(self.settings.vector_db, provider, {})
-            
-            if config is None:
-                config = {}
-            
-            self.vector_db = VectorDBFactory.create_database(
-                provider=provider,
-                **config
-            )
-            
-            self.settings.vector_db.provider = provider
+            self.settings.vector_db.provider = updates["vector_db_provider"]
+            with self._index_lock:
+                old_vector_dbs = self.vector_dbs
+                self._initialize_vector_db()
+            # 关闭旧实例，释放后台线程、线程池和 mmap
+            for vector_db in old_vector_dbs.values():
+                vector_db.close()
         
         # 更新检索配置
         if "default_top_k" in updates:
@@ -413,18 +893,156 @@ class KnowledgeRetrievalService:
         if "similarity_threshold" in updates:
             self.settings.retrieval.similarity_threshold = updates["similarity_threshold"]
     
+    # ---- 重建索引 ----
+    
+    def _target_embedding_config(self, model_name: Optional[str] = None,
+                                 provider: Optional[str] = None):
+        """更换模型后的嵌入配置（多模型模式下替换文本模型）"""
+        current = self.settings.embedding
+        update = {k: v for k, v in (("model_name", model_name), ("provider", provider)) if v}
+        
+        if current.multi_model and current.models:
+            models = {modality: dict(model or {}) for modality, model in current.models.items()}
+            models.setdefault("text", {}).update(update)
+            return current.model_copy(update={"models": models})
+        return current.model_copy(update=update)
+    
+    @staticmethod
+    def _embedding_state(embedding_config) -> Dict[str, Any]:
+        """持久化到元数据目录的嵌入配置（供其他 worker 和重启后加载）"""
+        return {
+            "provider": embedding_config.provider,
+            "model_name": embedding_config.model_name,
+            "dimension": embedding_config.dimension,
+            "multi_model": embedding_config.multi_model,
+            "models": embedding_config.models,
+        }
+    
+    def start_reindex(self, model_name: Optional[str] = None, provider: Optional[str] = None,
+                      batch_size: Optional[int] = None) -> ReindexJob:
+        """
+        启动蓝绿重建索引
+        
+        Args:
+            model_name: 新的（文本）嵌入模型，None 表示沿用当前模型
+            provider: 新的嵌入提供商
+            batch_size: 每批迁移的文件数
+        
+        Returns:
+            后台任务
+        """
+        with self._index_lock:
+            if self.reindex_job is not None and self.reindex_job.running:
+                raise RuntimeError("A re-index job is already running")
+            
+            self.reindex_job = ReindexJob(
+                self,
+                self._target_embedding_config(model_name, provider),
+                batch_size=batch_size or self.settings.embedding.batch_size
+            )
+            self.reindex_job.start()
+            return self.reindex_job
+    
+    def _stored_inputs(self, file_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """文件的待嵌入内容；旧记录没有保存时重新处理文件并补存"""
+        file_id = file_info["file_id"]
+        chunks = self.file_metadata.get_chunks(file_id)
+        if chunks:
+            return chunks
+        
+        result = self._process_file(file_info["file_path"], file_info["file_type"])
+        chunks = [
+            {"vector_id": f"{file_id}_{i}", **item}
+            for i, item in enumerate(self._embedding_inputs(result, file_info["file_type"]))
+        ]
+        self.file_metadata.put_chunks(file_id, chunks)
+        return chunks
+    
+    def _prepare_stored_inputs(self, file_infos: List[Dict[str, Any]]) -> None:
+        """批量补存缺少待嵌入内容的图片记录（合并 OCR 检测，比逐个重新处理快）"""
+        missing = [
+            file_info for file_info in file_infos
+            if file_info.get("file_type") == "image" and not self.file_metadata.get_chunks(file_info["file_id"])
+        ]
+        if len(missing) < 2:
+            return
+        
+        processor = self._create_processor(missing[0]["file_path"], "image")
+        results = processor.process_batch([file_info["file_path"] for file_info in missing])
+        for file_info, result in zip(missing, results):
+            if result is None:
+                # 由 _stored_inputs 逐个重试并报告错误
+                continue
+            file_id = file_info["file_id"]
+            self.file_metadata.put_chunks(file_id, [
+                {"vector_id": f"{file_id}_{i}", **item}
+                for i, item in enumerate(self._embedding_inputs(result, "image"))
+            ])
+    
+    def _switch_index(self, embedders: EmbedderRegistry, vector_dbs: Dict[str, Any],
+                      generation: int, vector_spaces: Dict[str, Dict[str, List[str]]]) -> Set[str]:
+        """
+        原子切换到新索引
+        
+        检查迁移是否完整和写入 active_index 在同一个 SQLite 写事务中完成，其他 worker 的上传
+        要么在切换前提交（在此被发现，返回给调用方迁移后重试），要么在切换后提交并写入新索引。
+        旧集合保留在磁盘上，其他 worker 在同步到新代数之前仍可使用。
+        
+        Returns:
+            尚未迁移的已完成文件，非空时未切换
+        """
+        with self._index_lock:
+            uploaded, deleted = self.file_metadata.switch_active_index({
+                "generation": generation,
+                "embedding": self._embedding_state(embedders.config)
+            }, vector_spaces, ProcessingStatus.COMPLETED)
+            if uploaded:
+                return uploaded
+            
+            # 迁移后被删除的文件
+            for file_id in deleted:
+                for space, vector_ids in vector_spaces[file_id].items():
+                    vector_dbs[space].delete(vector_ids)
+            self._replace_index(embedders, vector_dbs, generation)
+            return set()
+    
+    def _load_active_index(self, active: Dict[str, Any]) -> None:
+        """加载其他 worker 切换后的索引"""
+        print(f"Loading index generation {active['generation']} switched by another worker")
+        embedders = self._create_embedders(self.settings.embedding.model_copy(update=active["embedding"]))
+        vector_dbs = self._create_vector_dbs(embedders, active["generation"])
+        with self._index_lock:
+            self._replace_index(embedders, vector_dbs, active["generation"])
+    
+    def _replace_index(self, embedders: EmbedderRegistry, vector_dbs: Dict[str, Any],
+                       generation: int) -> None:
+        old_embedders, old_vector_dbs = self.embedders, self.vector_dbs
+        self.embedders = embedders
+        self.vector_dbs = vector_dbs
+        self.settings.embedding = embedders.config
+        self.index_generation = generation
+        print(f"Switched to index generation {generation}: "
+              f"{', '.join(embedders.model_info(space)['model_name'] for space in embedders.spaces)}")
+        
+        if old_embedders is not None:
+            old_embedders.close()
+        for vector_db in old_vector_dbs.values():
+            vector_db.close()
+        
+        # 切换后所有文件的向量分组都已更新
+        self.metadata_index.clear()
+        for record in self.file_metadata.records(status=ProcessingStatus.COMPLETED):
+            self._index_metadata(record)
+        self._refresh_metrics()
+    
     def get_statistics(self) -> Dict[str, Any]:
         """获取统计信息"""
         total_files = len(self.file_metadata)
         
-        files_by_type = {}
-        for file_info in self.file_metadata.values():
-            file_type = file_info.get("file_type", "unknown")
-            files_by_type[file_type] = files_by_type.get(file_type, 0) + 1
+        files_by_type = self.file_metadata.count_by_type()
         
-        # 获取向量总数（使用file_metadata代替，避免ChromaDB count()挂起）
-        # 每个文件可能有多个向量，这里简单估算
-        total_vectors = sum(file_info.get("vector_count", 1) for file_info in self.file_metadata.values())
+        # 获取向量总数（使用元数据目录代替，避免ChromaDB count()挂起）
+        total_vectors = self.file_metadata.total_vectors()
         
         return {
             "total_files": total_files,
@@ -433,54 +1051,90 @@ class KnowledgeRetrievalService:
             "storage_used": 0  # 可以添加实际存储计算
         }
     
+    def _refresh_metrics(self) -> None:
+        """更新索引规模仪表盘（写入后和导出指标前调用，读取元数据目录，多 worker 共享同一份数据）"""
+        if not metrics.enabled():
+            return
+        try:
+            counts = self.file_metadata.count_by_type()
+            # 已没有文件的类型置 0，避免继续导出旧值
+            for file_type in set(ProcessorFactory.file_types()) | set(counts):
+                metrics.set_gauge("index_files", counts.get(file_type, 0), file_type=file_type)
+            metrics.set_gauge("index_vectors", self.file_metadata.total_vectors())
+        except Exception as e:
+            print(f"Metrics refresh failed: {e}")
+    
     def delete_file(self, file_id: str) -> bool:
         """删除文件"""
-        if file_id not in self.file_metadata:
-            return False
+        with self._index_lock:
+            if file_id not in self.file_metadata:
+                return False
+            
+            file_info = self.file_metadata[file_id]
+            
+            # 从各向量空间删除
+            for space, vector_ids in self._vector_spaces(file_info).items():
+                if vector_ids and space in self.vector_dbs:
+                    self.vector_dbs[space].delete(vector_ids)
+            
+            # 删除视频关键帧
+            if file_info.get("file_type") == "video":
+                VideoProcessor.remove_frames(file_info.get("metadata", {}).get("frames_dir"))
+            
+            # 删除元数据
+            del self.file_metadata[file_id]
+            self.metadata_index.remove(file_id)
+            
+            # 删除前其他 worker 已切换索引时，新索引中也有该文件的向量
+            generation = self.index_generation
+            self._sync_catalog()
+            if self.index_generation != generation:
+                for vector_db in self.vector_dbs.values():
+                    vector_db.delete(list(file_info.get("vector_ids", [])))
+        if self.hybrid_retriever:
+            self.hybrid_retriever.remove_document(file_id)
+        self._refresh_metrics()
         
-        file_info = self.file_metadata[file_id]
-        vector_ids = file_info.get("vector_ids", [])
+        return True
+    
+    @staticmethod
+    def _hybrid_document(file_info: Dict[str, Any]) -> Dict[str, Any]:
+        """将文件记录转换为混合检索文档"""
+        metadata = file_info.get('metadata', {})
         
-        # 从向量数据库删除
-        if vector_ids:
-            self.vector_db.delete(vector_ids)
+        # 提取文本内容
+        text_content = metadata.get('content', '')
+        ocr_text = metadata.get('ocr_text', '')
         
-        # 删除元数据
-        del self.file_metadata[file_id]
+        # 合并所有文本用于搜索
+        combined_text = f"{text_content} {ocr_text} {file_info.get('filename', '')}".strip()
         
-        return True
+        return {
+            'file_id': file_info['file_id'],
+            'filename': file_info.get('filename', ''),
+            'file_type': file_info.get('file_type', ''),
+            'text': combined_text,  # 使用合并后的文本
+            'ocr_text': ocr_text,
+            'thumbnail': metadata.get('thumbnail')
+        }
     
     async def _prepare_documents_for_hybrid(self) -> List[Dict[str, Any]]:
         """准备文档数据用于混合检索"""
-        documents = []
-        for fid, file_info in self.file_metadata.items():
-            metadata = file_info.get('metadata', {})
-            
-            # 提取文本内容
-            text_content = metadata.get('content', '')
-            ocr_text = metadata.get('ocr_text', '')
-            
-            # 合并所有文本用于搜索
-            combined_text = f"{text_content} {ocr_text} {file_info.get('filename', '')}".strip()
-            
-            doc = {
-                'file_id': fid,
-                'filename': file_info.get('filename', ''),
-                'file_type': file_info.get('file_type', ''),
-                'text': combined_text,  # 使用合并后的文本
-                'ocr_text': ocr_text
-            }
-            documents.append(doc)
-        return documents
+        return [
+            self._hybrid_document(file_info)
+            for file_info in self.file_metadata.records(status=ProcessingStatus.COMPLETED)
+        ]
     
-    async def _hybrid_search(self, query: str, top_k: int, threshold: float, start_time: float) -> Dict[str, Any]:
+    async def _hybrid_search(self, query: str, top_k: int, threshold: float, start_time: float,
+                             candidate_file_ids: Optional[Set[str]] = None) -> Dict[str, Any]:
         """多路召回混合检索"""
         try:
             # 准备文档数据并建立索引（首次或文档更新时）
             if not self._hybrid_indexed:
                 documents = await self._prepare_documents_for_hybrid()
                 if documents:
-                    self.hybrid_retriever.index(documents)
+                    with metrics.search_stage("index_build"):
+                        self.hybrid_retriever.index(documents)
                     self._hybrid_indexed = True
                     print(f"Hybrid index built with {len(documents)} documents")
             
@@ -488,7 +1142,8 @@ class KnowledgeRetrievalService:
             results = self.multi_path_retriever.search(
                 query, 
                 top_k=top_k,
-                expand_query=True
+                expand_query=True,
+                candidate_ids=candidate_file_ids
             )
             
             # 格式化结果
@@ -502,6 +1157,7 @@ class KnowledgeRetrievalService:
                         'file_type': result['file_type'],
                         'similarity': float(hybrid_score),
                         'metadata': result,
+                        'thumbnail_url': self._thumbnail_url(result),
                         'method': 'multi_path_hybrid'
                     })
             
@@ -516,21 +1172,25 @@ class KnowledgeRetrievalService:
         except Exception as e:
             print(f"Hybrid search error: {e}, falling back to vector search")
             # 出错时回退到向量检索
-            return await self._vector_search(query, top_k, threshold, start_time)
+            return await self._vector_search(query, top_k, threshold, start_time, candidate_file_ids)
     
-    async def _simple_hybrid_search(self, query: str, top_k: int, threshold: float, start_time: float) -> Dict[str, Any]:
+    async def _simple_hybrid_search(self, query: str, top_k: int, threshold: float, start_time: float,
+                                    candidate_file_ids: Optional[Set[str]] = None) -> Dict[str, Any]:
         """简单混合检索（无查询扩展）"""
         try:
             # 准备文档数据并建立索引
             if not self._hybrid_indexed:
                 documents = await self._prepare_documents_for_hybrid()
                 if documents:
-                    self.hybrid_retriever.index(documents)
+                    with metrics.search_stage("index_build"):
+                        self.hybrid_retriever.index(documents)
                     self._hybrid_indexed = True
                     print(f"Hybrid index built with {len(documents)} documents")
             
             # 混合检索
-            results = self.hybrid_retriever.search(query, top_k=top_k, use_rrf=True)
+            results = self.hybrid_retriever.search(
+                query, top_k=top_k, use_rrf=True, candidate_ids=candidate_file_ids
+            )
             
             # 格式化结果
             formatted_results = []
@@ -543,6 +1203,7 @@ class KnowledgeRetrievalService:
                         'file_type': result['file_type'],
                         'similarity': float(hybrid_score),
                         'metadata': result,
+                        'thumbnail_url': self._thumbnail_url(result),
                         'method': 'hybrid'
                     })
             
@@ -556,20 +1217,13 @@ class KnowledgeRetrievalService:
             }
         except Exception as e:
             print(f"Hybrid search error: {e}, falling back to vector search")
-            return await self._vector_search(query, top_k, threshold, start_time)
+            return await self._vector_search(query, top_k, threshold, start_time, candidate_file_ids)
     
-    async def _vector_search(self, query: str, top_k: int, threshold: float, start_time: float) -> Dict[str, Any]:
+    async def _vector_search(self, query: str, top_k: int, threshold: float, start_time: float,
+                             candidate_file_ids: Optional[Set[str]] = None) -> Dict[str, Any]:
         """纯向量检索（回退方案）"""
-        q_vector = self.embedder.embed_text(query)
-        
-        if len(q_vector.shape) > 1:
-            q_vector = q_vector.flatten()
-        
-        results = self.vector_db.search(
-            query_vector=q_vector,
-            top_k=top_k,
-            filter=None
-        )
+        query_vectors = self._embed_query(query)
+        results = self._search_spaces(query_vectors, top_k, candidate_file_ids=candidate_file_ids)
         
         formatted_results = []
         for vector_id, similarity, metadata in results:
@@ -580,6 +1234,7 @@ class KnowledgeRetrievalService:
                     'file_type': metadata.get('file_type'),
                     'similarity': float(similarity),
                     'metadata': metadata,
+                    'thumbnail_url': self._thumbnail_url(metadata),
                     'method': 'vector'
                 })
         
@@ -591,3 +1246,150 @@ class KnowledgeRetrievalService:
             'query_time': query_time,
             'method': 'vector'
         }
+    
+    def _embed_query(self, query: str) -> Dict[str, np.ndarray]:
+        """用每个向量空间的模型嵌入查询文本"""
+        return {space: vectors[0] for space, vectors in self._embed_queries([query]).items()}
+    
+    def _embed_queries(self, queries: List[str]) -> Dict[str, np.ndarray]:
+        """用每个向量空间的模型批量嵌入查询文本（每个空间一次调用）"""
+        with metrics.search_stage("embed_query"):
+            return {
+                space: np.asarray(embedder.embed_text(list(queries)), dtype=np.float32).reshape(len(queries), -1)
+                for space, embedder in self.embedders.items()
+            }
+    
+    def _search_spaces(self, query_vectors: Dict[str, np.ndarray], top_k: int,
+                       filter: Optional[Dict[str, Any]] = None,
+                       candidate_file_ids: Optional[Set[str]] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """
+        在各向量空间分别检索并融合
+        
+        Args:
+            query_vectors: 向量空间 -> 查询向量
+            top_k: 返回结果数量
+            filter: 向量库 where 过滤条件（未经元数据索引解析时使用）
+            candidate_file_ids: 元数据预过滤得到的候选 file_id 集合
+        
+        Returns:
+            结果列表 [(id, score, metadata), ...]
+        """
+        query_matrices = {space: q_vector.reshape(1, -1) for space, q_vector in query_vectors.items()}
+        return self._search_spaces_batch(query_matrices, top_k, filter, candidate_file_ids)[0]
+    
+    def _search_spaces_batch(self, query_vectors: Dict[str, np.ndarray], top_k: int,
+                             filter: Optional[Dict[str, Any]] = None,
+                             candidate_file_ids: Optional[Set[str]] = None
+                             ) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        """
+        多个查询在各向量空间分别批量检索并按查询融合
+        
+        Args:
+            query_vectors: 向量空间 -> 查询向量矩阵 (n, dim)
+        
+        Returns:
+            每个查询的结果列表
+        """
+        per_space = []
+        with metrics.search_stage("vector_search"):
+            for space, q_vectors in query_vectors.items():
+                if candidate_file_ids is not None:
+                    results = self._filtered_vector_search_batch(q_vectors, top_k, candidate_file_ids, space)
+                else:
+                    results = self.vector_dbs[space].search_batch(
+                        query_vectors=q_vectors,
+                        top_k=top_k,
+                        filter=filter
+                    )
+                per_space.append(results)
+                tracing.count("vector_hits", sum(len(query_results) for query_results in results))
+        
+        num_queries = len(next(iter(query_vectors.values()))) if query_vectors else 0
+        return [
+            self._fuse_spaces([results[q] for results in per_space], top_k)
+            for q in range(num_queries)
+        ]
+    
+    @staticmethod
+    def _fuse_spaces(per_space: List[List[Tuple[str, float, Dict[str, Any]]]], top_k: int,
+                     k: int = 60) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """
+        融合多个向量空间的结果
+        
+        不同模型的相似度分布不可直接比较，按 RRF 排名融合排序，
+        结果中保留各自空间的原始相似度（阈值过滤仍基于原始相似度）。
+        """
+        if len(per_space) == 1:
+            return per_space[0][:top_k]
+        
+        fused: Dict[str, List[Any]] = {}
+        for results in per_space:
+            for rank, result in enumerate(results, start=1):
+                entry = fused.setdefault(result[0], [0.0, result])
+                entry[0] += 1.0 / (k + rank)
+        
+        ordered = sorted(fused.values(), key=lambda entry: -entry[0])
+        return [result for _, result in ordered[:top_k]]
+    
+    def _filtered_vector_search(self, q_vector: np.ndarray, top_k: int,
+                                candidate_file_ids: Set[str],
+                                space: Optional[str] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """
+        带预过滤的向量检索
+        
+        根据候选集合的选择率决定执行方式:
+        - 候选向量较少（或选择率低）: 在候选子集上精确扫描
+        - 否则: ANN 检索并放大召回数量后做后过滤，召回不足时再回退到精确扫描
+        
+        Args:
+            q_vector: 查询向量
+            top_k: 返回结果数量
+            candidate_file_ids: 候选 file_id 集合
+            space: 向量空间，默认为文本空间
+        
+        Returns:
+            结果列表 [(id, score, metadata), ...]
+        """
+        q_vectors = np.asarray(q_vector, dtype=np.float32).reshape(1, -1)
+        return self._filtered_vector_search_batch(q_vectors, top_k, candidate_file_ids, space)[0]
+    
+    def _filtered_vector_search_batch(self, q_vectors: np.ndarray, top_k: int,
+                                      candidate_file_ids: Set[str],
+                                      space: Optional[str] = None
+                                      ) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        """多个查询共用同一候选集的预过滤向量检索（候选向量只收集、读取一次）"""
+        if space is None:
+            space = self.embedders.space_for("text")
+        vector_db = self.vector_dbs[space]
+        
+        # 向量ID和向量总数取自元数据索引（随目录增量同步），不逐个查询元数据目录
+        legacy = space == self.embedders.space_for("text")
+        candidate_vector_ids = self.metadata_index.vector_ids(candidate_file_ids, space, legacy)
+        
+        if not candidate_vector_ids:
+            return [[] for _ in range(len(q_vectors))]
+        
+        total_vectors = self.metadata_index.vector_count(space, legacy)
+        selectivity = len(candidate_vector_ids) / max(total_vectors, 1)
+        retrieval = self.settings.retrieval
+        
+        if (len(candidate_vector_ids) <= retrieval.exact_scan_max_candidates
+                or selectivity <= retrieval.prefilter_selectivity):
+            return vector_db.search_subset_batch(q_vectors, candidate_vector_ids, top_k)
+        
+        # 后过滤: 按选择率放大 ANN 召回数量
+        fetch_k = min(total_vectors, int(np.ceil(top_k / selectivity * 1.5)))
+        batch_results = []
+        exact_rows = []
+        for row, results in enumerate(vector_db.search_batch(q_vectors, top_k=fetch_k, filter=None)):
+            filtered = [r for r in results if r[2].get("file_id") in candidate_file_ids]
+            if len(filtered) < min(top_k, len(candidate_vector_ids)):
+                exact_rows.append(row)
+            batch_results.append(filtered[:top_k])
+        
+        # 召回不足的查询回退到精确扫描
+        if exact_rows:
+            exact = vector_db.search_subset_batch(q_vectors[exact_rows], candidate_vector_ids, top_k)
+            for row, results in zip(exact_rows, exact):
+                batch_results[row] = results
+        return batch_results
@@ -1,26 +1,214 @@
 """
-音频处理器 - 使用Whisper进行语音转文字
+音频处理器 - 使用Whisper进行语音转文字（能量 VAD 切分、多进程并行转写）
 """
+import importlib.util
+import multiprocessing as mp
 import os
-from typing import Dict, Any, Union
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, Union
 from pathlib import Path
+import numpy as np
 
+from ...core import metrics
 from .base import BaseProcessor
 
-# Whisper支持检测
-try:
-    import whisper
-    HAS_WHISPER = True
-except ImportError:
-    HAS_WHISPER = False
+# Whisper支持检测（只检查是否安装，首次转写时再导入 whisper/torch）
+HAS_WHISPER = importlib.util.find_spec("whisper") is not None
+if not HAS_WHISPER:
     print("Warning: whisper not installed. Audio processing will be disabled.")
     print("Install with: pip install openai-whisper")
 
+# Whisper 模型按大小缓存，进程内共享
+_whisper_models: Dict[str, Any] = {}
+_whisper_lock = threading.Lock()
+
+
+def load_whisper_model(model_size: str = "base"):
+    """
+    获取（必要时加载）共享的 Whisper 模型
+    
+    Args:
+        model_size: Whisper模型大小
+    
+    Returns:
+        Whisper 模型
+    """
+    with _whisper_lock:
+        model = _whisper_models.get(model_size)
+        if model is None:
+            import whisper
+            print(f"Loading Whisper model '{model_size}'... (first time may download ~150MB)")
+            model = whisper.load_model(model_size)
+            _whisper_models[model_size] = model
+            print(f"Whisper model '{model_size}' loaded successfully")
+        return model
+
+
+# 转写进程池按 (进程数, 模型大小) 缓存，进程内的 Whisper 模型常驻
+_transcription_pools: Dict[Tuple[int, str], ProcessPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+
+def load_audio(file_path: Union[str, Path], sample_rate: int = 16000,
+               max_duration: Optional[float] = None) -> np.ndarray:
+    """
+    用 ffmpeg 解码为单声道 float32 波形（音频和视频文件均可）
+    
+    Args:
+        file_path: 文件路径
+        sample_rate: 采样率
+        max_duration: 最多读取的秒数，None 表示不限制
+    
+    Returns:
+        取值范围 [-1, 1] 的波形数组
+    """
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-i", str(file_path)]
+    if max_duration:
+        cmd += ["-t", str(max_duration)]
+    cmd += ["-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-"]
+    try:
+        out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg not found. Please install ffmpeg")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode(errors='ignore')[-200:]}")
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
+
+def split_on_silence(audio: np.ndarray, sample_rate: int = 16000,
+                     threshold_db: float = -40.0, frame_ms: int = 30,
+                     min_silence: float = 0.5, min_speech: float = 0.25,
+                     padding: float = 0.2, chunk_length: float = 30.0) -> List[List[Tuple[int, int]]]:
+    """
+    能量 VAD：按帧 RMS 能量找出语音区间，跳过静音，打包成语音总长不超过 chunk_length 秒的片段
+    
+    相邻语音区间间隔小于 min_silence 时合并，短于 min_speech 的区间丢弃；
+    超长的区间在后半个窗口内能量最低的帧处切开，尽量不切断词语。
+    一个片段由多个语音区间组成，转写时只拼接区间内的采样，区间之间的静音不送入模型。
+    
+    Args:
+        audio: 波形
+        sample_rate: 采样率
+        threshold_db: 语音帧的能量阈值（dBFS）
+        frame_ms: 帧长（毫秒）
+        min_silence: 分割区间所需的最短静音（秒）
+        min_speech: 最短语音区间（秒）
+        padding: 区间两侧保留的余量（秒）
+        chunk_length: 片段最大长度（秒，Whisper 窗口为 30 秒）
+    
+    Returns:
+        片段列表，每个片段为 [(起始采样点, 结束采样点)]
+    """
+    frame = max(1, sample_rate * frame_ms // 1000)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return []
+    
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    energy = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    voiced = np.concatenate(([0], (energy > threshold_db).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(voiced))
+    
+    # 语音区间（帧号），合并短静音、丢弃短区间
+    regions: List[List[int]] = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if regions and (start - regions[-1][1]) * frame < min_silence * sample_rate:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    pad = int(padding * sample_rate / frame)
+    padded: List[List[int]] = []
+    for start, end in regions:
+        if (end - start) * frame < min_speech * sample_rate:
+            continue
+        start, end = max(0, start - pad), min(n_frames, end + pad)
+        if padded and start <= padded[-1][1]:
+            padded[-1][1] = end
+        else:
+            padded.append([start, end])
+    
+    # 超长区间切开后，按语音总长不超过 chunk_length 打包
+    max_frames = max(1, int(chunk_length * sample_rate / frame))
+    chunks: List[List[Tuple[int, int]]] = []
+    length = 0
+    for start, end in padded:
+        while end > start:
+            cut = end
+            if end - start > max_frames:
+                window = energy[start + max_frames // 2:start + max_frames]
+                cut = max(start + 1, start + max_frames // 2 + int(np.argmin(window)))
+            if not chunks or length + cut - start > max_frames:
+                chunks.append([])
+                length = 0
+            chunks[-1].append((start * frame, cut * frame))
+            length += cut - start
+            start = cut
+    
+    return chunks
+
+
+def _original_time(spans: List[Tuple[float, float]], t: float) -> float:
+    """片段内时间 -> 原音频时间（spans 为各语音区间在片段内和原音频中的起始秒数）"""
+    position, start = spans[0]
+    for span_position, span_start in spans:
+        if span_position > t:
+            break
+        position, start = span_position, span_start
+    return start + t - position
+
+
+def _transcribe_chunk(model_size: str, language: str, audio: np.ndarray,
+                      spans: List[Tuple[float, float]]) -> List[Dict[str, Any]]:
+    """转写一个片段，返回带原音频时间戳的分段（可在工作进程中运行）"""
+    result = load_whisper_model(model_size).transcribe(
+        audio,
+        language=language,
+        fp16=False,
+        verbose=None,
+        condition_on_previous_text=False
+    )
+    return [
+        {
+            "start": round(_original_time(spans, float(segment["start"])), 3),
+            "end": round(_original_time(spans, float(segment["end"])), 3),
+            "text": segment["text"].strip()
+        }
+        for segment in result.get("segments", [])
+        if segment["text"].strip()
+    ]
+
+
+def _get_transcription_pool(workers: int, model_size: str) -> ProcessPoolExecutor:
+    with _pool_lock:
+        pool = _transcription_pools.get((workers, model_size))
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+            _transcription_pools[(workers, model_size)] = pool
+            print(f"Transcription pool started: {workers} workers (Whisper '{model_size}')")
+        return pool
+
+
+def shutdown_transcription_pools() -> None:
+    """停止所有转写工作进程"""
+    with _pool_lock:
+        for pool in _transcription_pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _transcription_pools.clear()
+
 
 class AudioProcessor(BaseProcessor):
-    """音频处理器"""
+    """
+    音频处理器
     
-    def __init__(self, model_size: str = "base", language: str = "zh"):
+    解码为 16kHz 波形（只读取前 max_duration 秒），能量 VAD 跳过静音并在停顿处
+    切成不超过 chunk_length 秒的片段，片段数超过 1 且 workers > 1 时分发到
+    常驻 Whisper 模型的进程池并行转写。结果为带时间戳的分段，每段一个向量。
+    """
+    
+    def __init__(self, model_size: str = "base", language: str = "zh", **config):
         """
         初始化音频处理器
         
@@ -31,14 +219,27 @@ class AudioProcessor(BaseProcessor):
                 - small: 较好精度 (~2GB内存)
                 - medium/large: 最高精度，慢 (>5GB内存)
             language: 语言代码 (zh=中文, en=英文)
+            sample_rate: 解码采样率
+            max_duration: 最长转写时长（秒），超出部分忽略
+            vad: 是否用能量 VAD 跳过静音，关闭时按 chunk_length 等长切分
+            vad_threshold_db: 语音帧能量阈值（dBFS）
+            chunk_length: 片段最大长度（秒）
+            workers: 并行转写进程数（每个进程一份模型），1 表示在当前进程转写
         """
         if not HAS_WHISPER:
             raise RuntimeError(
                 "Whisper not installed. Please install: pip install openai-whisper"
             )
+        super().__init__(**config)
         
         self.model_size = model_size
         self.language = language
+        self.sample_rate = int(config.get("sample_rate", 16000))
+        self.max_duration = config.get("max_duration")
+        self.vad = config.get("vad", True)
+        self.vad_threshold_db = float(config.get("vad_threshold_db", -40))
+        self.chunk_length = float(config.get("chunk_length", 30))
+        self.workers = max(1, int(config.get("workers", 1)))
         self.model = None
         
         print(f"Audio processor initialized with model: {model_size}, language: {language}")
@@ -46,9 +247,84 @@ class AudioProcessor(BaseProcessor):
     def _load_model(self):
         """延迟加载模型（首次使用时）"""
         if self.model is None:
-            print(f"Loading Whisper model '{self.model_size}'... (first time may download ~150MB)")
-            self.model = whisper.load_model(self.model_size)
-            print(f"Whisper model '{self.model_size}' loaded successfully")
+            self.model = load_whisper_model(self.model_size)
+    
+    def _chunks(self, audio: np.ndarray) -> List[List[Tuple[int, int]]]:
+        if self.vad:
+            return split_on_silence(
+                audio,
+                sample_rate=self.sample_rate,
+                threshold_db=self.vad_threshold_db,
+                chunk_length=self.chunk_length
+            )
+        step = int(self.chunk_length * self.sample_rate)
+        return [[(start, min(start + step, len(audio)))] for start in range(0, len(audio), step)]
+    
+    def cache_params(self) -> Dict[str, Any]:
+        return {
+            "model_size": self.model_size,
+            "language": self.language,
+            "sample_rate": self.sample_rate,
+            "max_duration": self.max_duration,
+            "vad": self.vad,
+            "vad_threshold_db": self.vad_threshold_db,
+            "chunk_length": self.chunk_length,
+        }
+    
+    def transcribe(self, file_path: Union[str, Path]) -> Dict[str, Any]:
+        """
+        分片并行转写（按文件内容缓存）
+        
+        Args:
+            file_path: 音频或视频文件路径
+        
+        Returns:
+            {"segments": [{"start", "end", "text"}], "duration": 解码时长,
+             "speech_duration": 送入转写的时长, "chunks": 片段数}
+        """
+        def compute():
+            with metrics.ingest_stage("transcribe"):
+                return self._transcribe(file_path)
+        
+        return self.cached(file_path, "transcript", compute)
+    
+    def _transcribe(self, file_path: Union[str, Path]) -> Dict[str, Any]:
+        audio = load_audio(file_path, self.sample_rate, self.max_duration)
+        chunks = self._chunks(audio)
+        jobs = []
+        for spans in chunks:
+            # 只拼接语音区间的采样，记录每个区间在片段内的位置用于还原时间戳
+            positions = np.cumsum([0] + [end - start for start, end in spans[:-1]])
+            jobs.append((
+                np.concatenate([audio[start:end] for start, end in spans]),
+                [(float(position) / self.sample_rate, start / self.sample_rate)
+                 for position, (start, _) in zip(positions, spans)]
+            ))
+        
+        if self.workers > 1 and len(jobs) > 1:
+            pool = _get_transcription_pool(self.workers, self.model_size)
+            futures = []
+            for chunk, spans in jobs:
+                metrics.inc("inference_queue_depth", pool="transcription")
+                future = pool.submit(_transcribe_chunk, self.model_size, self.language, chunk, spans)
+                future.add_done_callback(
+                    lambda _: metrics.inc("inference_queue_depth", -1, pool="transcription")
+                )
+                futures.append(future)
+            results = [future.result() for future in futures]
+        else:
+            self._load_model()
+            results = [
+                _transcribe_chunk(self.model_size, self.language, chunk, spans)
+                for chunk, spans in jobs
+            ]
+        
+        return {
+            "segments": [segment for segments in results for segment in segments],
+            "duration": len(audio) / self.sample_rate,
+            "speech_duration": sum(end - start for spans in chunks for start, end in spans) / self.sample_rate,
+            "chunks": len(chunks)
+        }
     
     def extract_content(self, file_path: Union[str, Path]) -> str:
         """
@@ -56,24 +332,13 @@ class AudioProcessor(BaseProcessor):
         
         Args:
             file_path: 音频文件路径
-            
+        
         Returns:
             转写的文本内容
         """
-        self._load_model()
-        
-        file_path = str(file_path)
-        
         try:
-            result = self.model.transcribe(
-                file_path,
-                language=self.language,
-                fp16=False,
-                verbose=False
-            )
-            
-            return result["text"].strip()
-            
+            segments = self.transcribe(file_path)["segments"]
+            return " ".join(segment["text"] for segment in segments)
         except Exception as e:
             print(f"Error extracting audio content: {e}")
             return ""
@@ -84,53 +349,47 @@ class AudioProcessor(BaseProcessor):
         
         Args:
             file_path: 音频文件路径
-            
+        
         Returns:
             处理结果字典，包含：
             - content: None (音频本身不需要返回)
             - text_content: 转写的文本
-            - language: 检测到的语言
-            - duration: 音频时长（秒）
+            - segments: 带时间戳的转写分段 [{"start", "end", "text"}]
+            - language: 转写语言
+            - duration: 音频时长（秒，受 max_duration 限制）
             - metadata: 其他元数据
         """
-        self._load_model()
-        
         file_path = str(file_path)
         
         try:
             # 使用Whisper转写音频
             print(f"Transcribing audio: {Path(file_path).name}...")
+            start_time = time.time()
             
-            result = self.model.transcribe(
-                file_path,
-                language=self.language,  # 指定语言可以提高速度和准确度
-                fp16=False,  # CPU模式使用FP32
-                verbose=False  # 不打印进度
-            )
-            
-            # 提取转写文本
-            text_content = result["text"].strip()
-            detected_language = result.get("language", self.language)
+            result = self.transcribe(file_path)
+            segments = result["segments"]
+            text_content = " ".join(segment["text"] for segment in segments)
+            duration = result["duration"]
             
-            # 计算时长
-            segments = result.get("segments", [])
-            duration = segments[-1]["end"] if segments else 0
-            
-            print(f"Audio transcribed successfully: {len(text_content)} characters, {duration:.1f}s")
+            print(f"Audio transcribed successfully: {len(text_content)} characters, {duration:.1f}s "
+                  f"({result['chunks']} chunks, {result['speech_duration']:.1f}s speech) "
+                  f"in {time.time() - start_time:.1f}s")
             
             return {
                 "content": None,  # 音频不需要返回原始内容
                 "text_content": text_content,
-                "language": detected_language,
+                "segments": segments,
+                "language": self.language,
                 "duration": duration,
                 "metadata": {
                     "file_name": Path(file_path).name,
                     "file_size": os.path.getsize(file_path),
+                    "duration": duration,
                     "segments_count": len(segments),
                     "model_size": self.model_size
                 }
             }
-            
+        
         except Exception as e:
             print(f"Error processing audio: {e}")
             raise RuntimeError(f"Failed to process audio file: {e}")
@@ -141,7 +400,7 @@ class AudioProcessor(BaseProcessor):
         
         Args:
             file_path: 文件路径
-            
+        
         Returns:
             是否为有效音频文件
         """
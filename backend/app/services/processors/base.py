@@ -3,21 +3,68 @@
 """
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 import numpy as np
 
+from .cache import ArtifactCache, file_content_hash
+
 
 class BaseProcessor(ABC):
     """文件处理器基类"""
     
+    # 处理逻辑变化导致缓存结果不再有效时递增
+    CACHE_VERSION = 1
+    
     def __init__(self, **config):
         """
         初始化处理器
         
         Args:
-            **config: 配置参数
+            **config: 配置参数，cache_dir 指定处理结果缓存目录（为空时不缓存）
         """
         self.config = config
+        cache_dir = config.get("cache_dir")
+        self.cache: Optional[ArtifactCache] = ArtifactCache(cache_dir) if cache_dir else None
+    
+    def cache_params(self) -> Dict[str, Any]:
+        """影响处理结果的参数（作为缓存键的一部分）"""
+        return {}
+    
+    def _cache_key(self, file_path: Union[str, Path]) -> tuple:
+        version = {"processor": type(self).__name__, "version": self.CACHE_VERSION, **self.cache_params()}
+        return file_content_hash(file_path), version
+    
+    def cache_get(self, file_path: Union[str, Path], namespace: str) -> Optional[Any]:
+        """读取缓存的处理结果（按文件内容哈希和 cache_params），未命中或未启用时为 None"""
+        if self.cache is None:
+            return None
+        content_hash, version = self._cache_key(file_path)
+        return self.cache.get(namespace, content_hash, version)
+    
+    def cache_put(self, file_path: Union[str, Path], namespace: str, value: Any) -> None:
+        """写入处理结果缓存（value 需可 JSON 序列化）"""
+        if self.cache is not None:
+            content_hash, version = self._cache_key(file_path)
+            self.cache.put(namespace, content_hash, version, value)
+    
+    def cached(self, file_path: Union[str, Path], namespace: str,
+               compute: Callable[[], Any]) -> Any:
+        """
+        读取缓存的处理结果，未命中时计算并写入
+        
+        Args:
+            file_path: 文件路径
+            namespace: 结果类型
+            compute: 计算结果的函数（返回值需可 JSON 序列化）
+            
+        Returns:
+            处理结果
+        """
+        value = self.cache_get(file_path, namespace)
+        if value is None:
+            value = compute()
+            self.cache_put(file_path, namespace, value)
+        return value
     
     @abstractmethod
     def process(self, file_path: Union[str, Path]) -> Dict[str, Any]:
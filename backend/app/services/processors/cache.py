@@ -0,0 +1,121 @@
+"""
+处理结果缓存 - 按文件内容哈希缓存 OCR 文字、转写分段、文档文本等派生结果
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from ...core import metrics
+
+
+# 文件内容哈希按 (路径, 大小, 修改时间) 记忆，同一次上传中服务与处理器只读一遍文件
+_hash_memo: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_hash_lock = threading.Lock()
+_HASH_MEMO_SIZE = 1024
+
+
+def file_content_hash(file_path: Union[str, Path]) -> str:
+    """
+    计算文件内容的 SHA-256 哈希
+    
+    Args:
+        file_path: 文件路径
+    
+    Returns:
+        十六进制摘要
+    """
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    with _hash_lock:
+        digest = _hash_memo.get(memo_key)
+        if digest is not None:
+            _hash_memo.move_to_end(memo_key)
+            return digest
+    
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(block)
+    digest = sha.hexdigest()
+    
+    with _hash_lock:
+        _hash_memo[memo_key] = digest
+        if len(_hash_memo) > _HASH_MEMO_SIZE:
+            _hash_memo.popitem(last=False)
+    return digest
+
+
+class ArtifactCache:
+    """
+    处理结果磁盘缓存
+    
+    键 = 命名空间 + 文件内容哈希 + 处理器版本参数（模型大小、语言、OCR 语言等），
+    参数变化后自然失效，旧条目不会被误用。每个条目一个 JSON 文件，
+    写入先落临时文件再原子替换，多进程并发读写安全。
+    """
+    
+    def __init__(self, directory: Union[str, Path]):
+        """
+        Args:
+            directory: 缓存目录
+        """
+        self.directory = Path(directory)
+        self.hits = 0
+        self.misses = 0
+    
+    def _path(self, namespace: str, content_hash: str, version: Dict[str, Any]) -> Path:
+        params = json.dumps(version, sort_keys=True, ensure_ascii=False, default=str)
+        key = hashlib.blake2b(
+            f"{namespace}\0{content_hash}\0{params}".encode("utf-8"), digest_size=20
+        ).hexdigest()
+        return self.directory / namespace / key[:2] / f"{key}.json"
+    
+    def get(self, namespace: str, content_hash: str, version: Dict[str, Any]) -> Optional[Any]:
+        """
+        读取缓存
+        
+        Args:
+            namespace: 结果类型（如 ocr / transcript / document）
+            content_hash: 文件内容哈希
+            version: 影响结果的处理参数
+        
+        Returns:
+            缓存的结果，未命中时为 None
+        """
+        path = self._path(namespace, content_hash, version)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            metrics.record_cache(f"processor_{namespace}", False)
+            return None
+        self.hits += 1
+        metrics.record_cache(f"processor_{namespace}", True)
+        return value
+    
+    def put(self, namespace: str, content_hash: str, version: Dict[str, Any], value: Any) -> None:
+        """写入缓存（失败只打印警告，不影响处理）"""
+        path = self._path(namespace, content_hash, version)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(value, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Warning: failed to write processor cache {path.name}: {e}")
+    
+    def clear(self) -> None:
+        """清空缓存"""
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -6,6 +6,7 @@ from typing import Any, Dict, List, Union
 import PyPDF2
 import docx
 
+from ...core import metrics
 from .base import BaseProcessor
 
 
@@ -25,11 +26,12 @@ class DocumentProcessor(BaseProcessor):
         # 获取文件信息
         file_info = self.get_file_info(file_path)
         
-        # 提取文本内容
-        text = self.extract_content(file_path)
+        # 提取文本内容（按文件内容缓存）
+        text = self.cached(file_path, "document", lambda: self.extract_content(file_path))
         
         # 分块
-        chunks = self._chunk_text(text)
+        with metrics.ingest_stage("chunk"):
+            chunks = self._chunk_text(text)
         
         metadata = {
             **file_info,
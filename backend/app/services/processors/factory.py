@@ -1,13 +1,14 @@
 """
 文件处理器工厂
 """
-from typing import Dict
+from typing import Dict, List
 from pathlib import Path
 
 from .base import BaseProcessor
 from .image_processor import ImageProcessor
 from .document_processor import DocumentProcessor
 from .audio_processor import AudioProcessor
+from .video_processor import VideoProcessor
 
 
 class ProcessorFactory:
@@ -32,6 +33,11 @@ class ProcessorFactory:
         ".flac": "audio",
         ".ogg": "audio",
         ".aac": "audio",
+        ".mp4": "video",
+        ".avi": "video",
+        ".mov": "video",
+        ".mkv": "video",
+        ".flv": "video",
     }
     
     # 处理器类型到处理器类的映射
@@ -39,6 +45,7 @@ class ProcessorFactory:
         "image": ImageProcessor,
         "document": DocumentProcessor,
         "audio": AudioProcessor,
+        "video": VideoProcessor,
     }
     
     @classmethod
@@ -91,6 +98,16 @@ class ProcessorFactory:
         extension = Path(file_path).suffix.lower()
         return cls._extension_to_type.get(extension, "unknown")
     
+    @classmethod
+    def file_types(cls) -> List[str]:
+        """
+        获取所有支持的文件类型
+        
+        Returns:
+            文件类型列表
+        """
+        return sorted(set(cls._extension_to_type.values()))
+    
     @classmethod
     def is_supported(cls, file_path: str) -> bool:
         """
@@ -1,104 +1,358 @@
 """
 图片处理器
 """
+import importlib.util
+import threading
 from pathlib import Path
-from typing import Any, Dict, Union
-from PIL import Image
+from typing import Any, Dict, List, Optional, Tuple, Union
+from PIL import Image, ImageFilter
 import numpy as np
 
+from ...core import metrics
 from .base import BaseProcessor
 
-try:
-    import easyocr
-    HAS_OCR = True
-except ImportError:
-    HAS_OCR = False
+# OCR 支持检测（只检查是否安装，easyocr 会连带导入 torch，首次使用时再导入）
+HAS_OCR = importlib.util.find_spec("easyocr") is not None
+if not HAS_OCR:
     print("Warning: easyocr not installed. OCR functionality will be disabled.")
 
+# OCR 模型按语言组合缓存，进程内共享，避免每次上传都重新加载
+_ocr_readers: Dict[Tuple[str, ...], Any] = {}
+_ocr_lock = threading.Lock()
+
+
+def get_ocr_reader(languages: Tuple[str, ...] = ('ch_sim', 'en')):
+    """
+    获取（必要时加载）共享的 OCR 读取器
+    
+    Args:
+        languages: easyocr 语言列表
+    
+    Returns:
+        easyocr.Reader 实例
+    """
+    with _ocr_lock:
+        reader = _ocr_readers.get(languages)
+        if reader is None:
+            import easyocr
+            reader = easyocr.Reader(list(languages), gpu=False)
+            _ocr_readers[languages] = reader
+            print(f"OCR initialized: {', '.join(languages)}")
+        return reader
+
 
 class ImageProcessor(BaseProcessor):
-    """图片处理器"""
+    """
+    图片处理器
+    
+    OCR 分三级，尽早跳过没有文字的图片:
+    1. 边缘密度预检：灰度缩略图上几乎没有高边缘密度的小块时直接跳过
+    2. 只运行文字检测（CRAFT），没有检测框时跳过识别
+    3. 只对检测框做识别（检测结果复用，不再像 readtext 那样重复检测）
+    OCR 输入从解码结果单独缩放到 ocr_max_dimension（不受图像嵌入用的 max_dimension 限制）；
+    批量处理时多张图片合并检测。
+    """
+    
+    # 边缘预检的缩略图尺寸和分块大小（像素）
+    PRECHECK_SIZE = 512
+    PRECHECK_BLOCK = 16
     
     def __init__(self, **config):
         super().__init__(**config)
         self.max_dimension = config.get("max_dimension", 1024)
         self.thumbnail_size = config.get("thumbnail_size", 256)
         self.enable_ocr = config.get("enable_ocr", True)
+        self.ocr_max_dimension = config.get("ocr_max_dimension", 1024)
+        self.ocr_precheck = config.get("ocr_precheck", True)
+        self.edge_threshold = config.get("edge_threshold", 48)
+        self.text_block_density = config.get("text_block_density", 0.12)
+        self.min_text_blocks = config.get("min_text_blocks", 3)
+        self.ocr_batch_size = config.get("ocr_batch_size", 8)
         self.ocr_reader = None
         
         # 初始化 OCR
         if self.enable_ocr and HAS_OCR:
             try:
                 # 支持中英文
-                self.ocr_reader = easyocr.Reader(['ch_sim', 'en'], gpu=False)
-                print("OCR initialized: Chinese + English support")
+                self.ocr_reader = get_ocr_reader(('ch_sim', 'en'))
             except Exception as e:
                 print(f"OCR initialization failed: {e}")
                 self.ocr_reader = None
     
     def process(self, file_path: Union[str, Path]) -> Dict[str, Any]:
         """处理图片文件"""
+        image, metadata, ocr_image = self.load_image(file_path)
+        return self.process_loaded(file_path, image, metadata, ocr_image)
+    
+    def load_image(self, file_path: Union[str, Path]) -> Tuple[Image.Image, Dict[str, Any], Optional[Image.Image]]:
+        """
+        解码图片（只解码一次，供 OCR 和图像嵌入共用）
+        
+        JPEG 使用 draft 模式在解码时按 1/2、1/4、1/8 缩小到不低于所需尺寸
+        （max_dimension 与 ocr_max_dimension 中较大者），超大照片无需先解码出全分辨率像素；
+        随后分别缩放出图像嵌入用的图片（max_dimension 以内）和 OCR 输入（ocr_max_dimension 以内）。
+        
+        Args:
+            file_path: 文件路径
+        
+        Returns:
+            (RGB 图片, 元数据, OCR 输入图片)，未启用 OCR 时 OCR 输入为 None
+        """
         if not self.validate_file(file_path):
             raise ValueError(f"Invalid file: {file_path}")
         
         # 获取文件信息
         file_info = self.get_file_info(file_path)
         
-        # 加载图片
-        image = self.extract_content(file_path)
+        try:
+            image = Image.open(file_path)
+            
+            # 获取图片元数据（原始尺寸）
+            metadata = {
+                **file_info,
+                "width": image.width,
+                "height": image.height,
+                "mode": image.mode,
+                "format": image.format
+            }
+            
+            ocr_dimension = self._ocr_dimension() if self.ocr_reader is not None else self.max_dimension
+            draft_dimension = max(self.max_dimension, ocr_dimension) if ocr_dimension else None
+            if draft_dimension:
+                image.draft("RGB", (draft_dimension, draft_dimension))
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            else:
+                image.load()
+        except Exception as e:
+            raise ValueError(f"Error loading image {file_path}: {e}")
         
-        # 获取图片元数据
-        metadata = {
-            **file_info,
-            "width": image.width,
-            "height": image.height,
-            "mode": image.mode,
-            "format": image.format
-        }
+        ocr_image = None
+        if self.ocr_reader is not None:
+            ocr_image = self._ocr_input(image)
         
         # 调整图片大小（如果需要）
         if max(image.width, image.height) > self.max_dimension:
             image = self._resize_image(image, self.max_dimension)
             metadata["resized"] = True
         
-        # OCR 提取文字
-        extracted_text = ""
-        if self.ocr_reader is not None:
+        return image, metadata, ocr_image
+    
+    def has_text(self, image: Image.Image) -> bool:
+        """
+        边缘密度预检：文字笔画在小块内产生密集的边缘
+        
+        Args:
+            image: 已解码的图片
+        
+        Returns:
+            是否可能含有文字（False 时可以安全跳过 OCR）
+        """
+        gray = image.convert("L")
+        gray.thumbnail((self.PRECHECK_SIZE, self.PRECHECK_SIZE))
+        edges = np.asarray(gray.filter(ImageFilter.FIND_EDGES)) > self.edge_threshold
+        
+        block = self.PRECHECK_BLOCK
+        rows, cols = edges.shape[0] // block, edges.shape[1] // block
+        if rows == 0 or cols == 0:
+            return bool(edges.mean() >= self.text_block_density)
+        
+        density = edges[:rows * block, :cols * block].reshape(rows, block, cols, block).mean(axis=(1, 3))
+        return int((density >= self.text_block_density).sum()) >= self.min_text_blocks
+    
+    def _ocr_dimension(self) -> int:
+        """OCR 输入的最大边长，0 表示不限制"""
+        return int(self.ocr_max_dimension or 0)
+    
+    def _ocr_input(self, image: Image.Image) -> Image.Image:
+        """按 ocr_max_dimension 限制 OCR 输入分辨率"""
+        if self._ocr_dimension() and max(image.width, image.height) > self._ocr_dimension():
+            return self._resize_image(image, self._ocr_dimension())
+        return image
+    
+    def extract_text(self, image: Image.Image) -> Tuple[str, Dict[str, Any]]:
+        """
+        OCR 提取文字
+        
+        Args:
+            image: 已解码的图片
+        
+        Returns:
+            (提取的文字, OCR 相关元数据)
+        """
+        return self.extract_text_batch([image])[0]
+    
+    def extract_text_batch(self, images: List[Image.Image]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        批量 OCR：预检跳过无文字图片，其余按 ocr_batch_size 分组合并检测后逐图识别
+        
+        Args:
+            images: 已解码的图片列表
+        
+        Returns:
+            与输入顺序一致的 (提取的文字, OCR 相关元数据) 列表
+        """
+        if self.ocr_reader is None:
+            return [("", {}) for _ in images]
+        
+        results: List[Tuple[str, Dict[str, Any]]] = [
+            ("", {"ocr_text": "", "ocr_detected": False, "ocr_skipped": True})
+            for _ in images
+        ]
+        candidates = [
+            i for i, image in enumerate(images)
+            if not self.ocr_precheck or self.has_text(image)
+        ]
+        
+        for start in range(0, len(candidates), self.ocr_batch_size):
+            group = candidates[start:start + self.ocr_batch_size]
             try:
-                # 转换为 numpy array 供 OCR 使用
-                image_array = np.array(image)
-                results = self.ocr_reader.readtext(image_array)
-                
-                # 提取所有文字
-                texts = [result[1] for result in results]
-                extracted_text = " ".join(texts)
-                
-                metadata["ocr_text"] = extracted_text
-                metadata["ocr_detected"] = len(texts) > 0
-                
+                texts = self._recognize([self._ocr_input(images[i]) for i in group])
+            except Exception as e:
+                print(f"OCR failed: {e}")
+                for i in group:
+                    results[i] = ("", {"ocr_error": str(e)})
+                continue
+            
+            for i, words in zip(group, texts):
+                extracted_text = " ".join(words)
                 if extracted_text:
                     print(f"OCR extracted text: {extracted_text[:100]}...")
+                results[i] = (extracted_text, {"ocr_text": extracted_text, "ocr_detected": len(words) > 0})
+        
+        return results
+    
+    def _recognize(self, images: List[Image.Image]) -> List[List[str]]:
+        """
+        文字检测 + 识别
+        
+        一组图片贴到同一尺寸的白色画布上（不拉伸）一次完成检测，
+        再只对有检测框的图片运行识别。
+        """
+        height = max(image.height for image in images)
+        width = max(image.width for image in images)
+        canvases = []
+        for image in images:
+            if image.size != (width, height):
+                canvas = Image.new("RGB", (width, height), (255, 255, 255))
+                canvas.paste(image, (0, 0))
+                image = canvas
+            canvases.append(np.asarray(image))
+        
+        if len(canvases) == 1:
+            batch = canvases[0]
+            horizontal_lists, free_lists = self.ocr_reader.detect(batch)
+        else:
+            batch = np.stack(canvases)
+            horizontal_lists, free_lists = self.ocr_reader.detect(batch, reformat=False)
+        
+        texts = []
+        for canvas, horizontal_list, free_list in zip(canvases, horizontal_lists, free_lists):
+            if not horizontal_list and not free_list:
+                texts.append([])
+                continue
+            gray = np.asarray(Image.fromarray(canvas).convert("L"))
+            results = self.ocr_reader.recognize(
+                gray,
+                horizontal_list=horizontal_list,
+                free_list=free_list,
+                batch_size=self.ocr_batch_size
+            )
+            texts.append([result[1] for result in results])
+        return texts
+    
+    def process_loaded(self, file_path: Union[str, Path], image: Image.Image,
+                       metadata: Dict[str, Any], ocr_image: Optional[Image.Image] = None) -> Dict[str, Any]:
+        """
+        处理已解码的图片（OCR）
+        
+        Args:
+            file_path: 文件路径
+            image: load_image 返回的图片
+            metadata: load_image 返回的元数据
+            ocr_image: load_image 返回的 OCR 输入，为 None 时对 image 做 OCR
+        
+        Returns:
+            处理结果字典，content 为解码后的图片（嵌入时直接使用，不再读盘）
+        """
+        ocr_input = ocr_image if ocr_image is not None else image
+        extracted_text, ocr_metadata = self._ocr_files([file_path], [ocr_input])[0]
+        
+        return self._result(file_path, image, metadata, extracted_text, ocr_metadata)
+    
+    def process_batch(self, file_paths: List[Union[str, Path]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        批量处理图片（批量 OCR），用于重建索引等批量任务
+        
+        Args:
+            file_paths: 文件路径列表
+        
+        Returns:
+            与输入顺序一致的处理结果，无法加载的文件为 None
+        """
+        loaded = []
+        for file_path in file_paths:
+            try:
+                loaded.append(self.load_image(file_path))
             except Exception as e:
-                print(f"OCR failed: {e}")
-                metadata["ocr_error"] = str(e)
+                print(f"Error loading image {file_path}: {e}")
+                loaded.append(None)
+        
+        # OCR 使用单独缩放的 OCR 输入
+        valid = [
+            (file_path, item[2] if item[2] is not None else item[0])
+            for file_path, item in zip(file_paths, loaded) if item is not None
+        ]
+        ocr_results = iter(self._ocr_files([path for path, _ in valid], [image for _, image in valid]))
+        return [
+            self._result(file_path, item[0], item[1], *next(ocr_results)) if item is not None else None
+            for file_path, item in zip(file_paths, loaded)
+        ]
+    
+    def cache_params(self) -> Dict[str, Any]:
+        return {
+            "languages": ["ch_sim", "en"],
+            "ocr_dimension": self._ocr_dimension(),
+            "ocr_precheck": self.ocr_precheck,
+            "edge_threshold": self.edge_threshold,
+            "text_block_density": self.text_block_density,
+            "min_text_blocks": self.min_text_blocks,
+        }
+    
+    def _ocr_files(self, file_paths: List[Union[str, Path]],
+                   images: List[Image.Image]) -> List[Tuple[str, Dict[str, Any]]]:
+        """OCR 一组已解码的图片，先查按文件内容缓存的结果，只识别未命中的图片"""
+        if self.ocr_reader is None:
+            return [("", {}) for _ in images]
         
+        results: List[Optional[Tuple[str, Dict[str, Any]]]] = []
+        for file_path in file_paths:
+            cached = self.cache_get(file_path, "ocr")
+            results.append((cached[0], cached[1]) if cached is not None else None)
+        
+        misses = [i for i, result in enumerate(results) if result is None]
+        with metrics.ingest_stage("ocr"):
+            recognized = self.extract_text_batch([images[i] for i in misses]) if misses else []
+        for i, result in zip(misses, recognized):
+            results[i] = result
+            # 识别出错的结果不缓存，下次重试
+            if "ocr_error" not in result[1]:
+                self.cache_put(file_paths[i], "ocr", list(result))
+        return results
+    
+    @staticmethod
+    def _result(file_path: Union[str, Path], image: Image.Image, metadata: Dict[str, Any],
+                extracted_text: str, ocr_metadata: Dict[str, Any]) -> Dict[str, Any]:
         return {
             "content": image,
             "text_content": extracted_text,  # 新增：提取的文字
-            "metadata": metadata,
+            "metadata": {**metadata, **ocr_metadata},
             "file_path": str(file_path)
         }
     
     def extract_content(self, file_path: Union[str, Path]) -> Image.Image:
         """提取图片内容"""
-        try:
-            image = Image.open(file_path)
-            # 转换为 RGB 模式
-            if image.mode != "RGB":
-                image = image.convert("RGB")
-            return image
-        except Exception as e:
-            raise ValueError(f"Error loading image {file_path}: {e}")
+        return self.load_image(file_path)[0]
     
     def _resize_image(self, image: Image.Image, max_dimension: int) -> Image.Image:
         """调整图片大小"""
@@ -0,0 +1,231 @@
+"""
+视频处理器 - 流式解码、直方图场景检测抽取关键帧，可选转写音轨
+"""
+import hashlib
+import heapq
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .base import BaseProcessor
+from .audio_processor import HAS_WHISPER, AudioProcessor
+
+# 视频解码支持检测
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+    print("Warning: opencv not installed. Video processing will be disabled.")
+    print("Install with: pip install opencv-python-headless")
+
+
+class VideoProcessor(BaseProcessor):
+    """
+    视频处理器
+    
+    逐帧流式解码（非采样帧只 grab 不转换），每 frame_interval 帧取一帧
+    计算缩略 HSV 直方图，与上一关键帧的巴氏距离超过 scene_threshold 时视为
+    新场景。静止画面超过 max_scene_length 秒也强制取一帧。
+    关键帧写入 frames_dir 下的 JPEG，按场景变化程度只保留 max_frames 帧
+    （最小堆淘汰），内存占用与视频长度无关。
+    """
+    
+    # 计算直方图前的缩放尺寸
+    HISTOGRAM_SIZE = (64, 36)
+    
+    def __init__(self, **config):
+        super().__init__(**config)
+        if not HAS_CV2:
+            raise RuntimeError(
+                "OpenCV not installed. Please install: pip install opencv-python-headless"
+            )
+        
+        self.frame_interval = max(1, int(config.get("frame_interval", 30)))
+        self.max_frames = max(1, int(config.get("max_frames", 100)))
+        self.scene_threshold = float(config.get("scene_threshold", 0.35))
+        self.max_scene_length = float(config.get("max_scene_length", 60))
+        self.max_dimension = int(config.get("max_dimension", 512))
+        self.jpeg_quality = int(config.get("jpeg_quality", 90))
+        self.frames_dir = Path(config.get("frames_dir", "./data/frames"))
+        self.transcribe_audio = bool(config.get("transcribe_audio", False))
+        self.model_size = config.get("model_size", "base")
+        self.language = config.get("language", "zh")
+    
+    def _output_dir(self, file_path: Path) -> Path:
+        """视频对应的关键帧目录（重新处理时清空）"""
+        digest = hashlib.md5(str(file_path.resolve()).encode("utf-8")).hexdigest()[:12]
+        output_dir = self.frames_dir / f"{file_path.stem}_{digest}"
+        if output_dir.exists():
+            shutil.rmtree(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        return output_dir
+    
+    def _histogram(self, frame):
+        small = cv2.resize(frame, self.HISTOGRAM_SIZE, interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1], None, [16, 8], [0, 180, 0, 256])
+        return cv2.normalize(hist, hist).flatten()
+    
+    def _save_frame(self, frame, path: Path) -> None:
+        height, width = frame.shape[:2]
+        scale = self.max_dimension / max(height, width)
+        if scale < 1:
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)),
+                               interpolation=cv2.INTER_AREA)
+        cv2.imwrite(str(path), frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+    
+    def extract_content(self, file_path: Union[str, Path]) -> List[Dict[str, Any]]:
+        """
+        抽取关键帧
+        
+        Args:
+            file_path: 视频文件路径
+        
+        Returns:
+            按时间排列的关键帧 [{"path", "timestamp", "frame_index", "scene_score"}]
+        """
+        return self._extract_keyframes(Path(file_path))[0]
+    
+    def _extract_keyframes(self, file_path: Path) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        capture = cv2.VideoCapture(str(file_path))
+        if not capture.isOpened():
+            raise RuntimeError(f"Cannot open video: {file_path.name}")
+        
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        info = {
+            "fps": fps,
+            "width": int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        }
+        output_dir = self._output_dir(file_path)
+        
+        # 最小堆 (场景分数, 帧号, 关键帧)，满额后淘汰变化最小的场景
+        kept: List[Tuple[float, int, Dict[str, Any]]] = []
+        last_hist = None
+        last_time = 0.0
+        frame_index = -1
+        
+        try:
+            while True:
+                frame_index += 1
+                if frame_index % self.frame_interval:
+                    if not capture.grab():
+                        break
+                    continue
+                
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                timestamp = frame_index / fps
+                
+                hist = self._histogram(frame)
+                if last_hist is None:
+                    score = float("inf")  # 首帧始终保留
+                else:
+                    score = float(cv2.compareHist(last_hist, hist, cv2.HISTCMP_BHATTACHARYYA))
+                    if score < self.scene_threshold and timestamp - last_time < self.max_scene_length:
+                        continue
+                last_hist = hist
+                last_time = timestamp
+                
+                if len(kept) >= self.max_frames:
+                    if score <= kept[0][0]:
+                        continue
+                    _, _, evicted = heapq.heappop(kept)
+                    os.remove(evicted["path"])
+                
+                path = output_dir / f"frame_{frame_index:08d}.jpg"
+                self._save_frame(frame, path)
+                keyframe = {
+                    "path": str(path),
+                    "timestamp": round(timestamp, 3),
+                    "frame_index": frame_index,
+                    "scene_score": score if score != float("inf") else 1.0
+                }
+                heapq.heappush(kept, (score, frame_index, keyframe))
+        finally:
+            capture.release()
+        
+        info["duration"] = frame_index / fps if frame_index > 0 else 0.0
+        info["frames_dir"] = str(output_dir)
+        keyframes = sorted((item[2] for item in kept), key=lambda k: k["frame_index"])
+        return keyframes, info
+    
+    def _transcribe(self, file_path: Path) -> List[Dict[str, Any]]:
+        """
+        转写音轨（ffmpeg 直接读取视频文件的音频流），无音轨时返回空
+        
+        采样率、最大时长（超出部分不转写）和 VAD 参数取自 audio 配置（file_processing.audio），
+        模型和并行进程数取自视频配置。
+        """
+        if not HAS_WHISPER:
+            print("Warning: whisper not installed, skipping video audio transcription")
+            return []
+        try:
+            audio_config = dict(self.config.get("audio") or {})
+            audio_config.update(
+                model_size=self.model_size,
+                language=self.language,
+                workers=self.config.get("transcribe_workers", 1),
+                cache_dir=self.config.get("cache_dir")
+            )
+            transcriber = AudioProcessor(**audio_config)
+            return transcriber.transcribe(file_path)["segments"]
+        except Exception as e:
+            print(f"Video audio transcription failed: {e}")
+            return []
+    
+    def process(self, file_path: Union[str, Path]) -> Dict[str, Any]:
+        """
+        处理视频文件
+        
+        Args:
+            file_path: 视频文件路径
+        
+        Returns:
+            处理结果字典，包含：
+            - content: None
+            - file_path: 视频路径
+            - keyframes: 关键帧列表（图片路径与时间戳）
+            - segments: 音轨转写片段 [{"start", "end", "text"}]（未开启转写时为空）
+            - text_content: 转写全文
+            - duration: 时长（秒）
+            - metadata: 其他元数据
+        """
+        file_path = Path(file_path)
+        if not self.validate_file(file_path):
+            raise FileNotFoundError(f"Video file not found: {file_path}")
+        
+        keyframes, info = self._extract_keyframes(file_path)
+        segments: List[Dict[str, Any]] = self._transcribe(file_path) if self.transcribe_audio else []
+        text_content = " ".join(segment["text"] for segment in segments)
+        
+        print(f"Video processed: {file_path.name}, {len(keyframes)} keyframes, "
+              f"{info['duration']:.1f}s, {len(segments)} transcript segments")
+        
+        return {
+            "content": None,
+            "file_path": str(file_path),
+            "keyframes": keyframes,
+            "segments": segments,
+            "text_content": text_content,
+            "duration": info["duration"],
+            "metadata": {
+                "file_name": file_path.name,
+                "file_size": file_path.stat().st_size,
+                "duration": info["duration"],
+                "fps": info["fps"],
+                "width": info["width"],
+                "height": info["height"],
+                "keyframe_count": len(keyframes),
+                "frames_dir": info["frames_dir"],
+            }
+        }
+    
+    @staticmethod
+    def remove_frames(frames_dir: Optional[str]) -> None:
+        """删除视频的关键帧目录"""
+        if frames_dir:
+            shutil.rmtree(frames_dir, ignore_errors=True)
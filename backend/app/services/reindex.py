@@ -0,0 +1,222 @@
+"""
+蓝绿重建索引 - 更换嵌入模型时在后台用新模型构建新集合，完成后原子切换
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ..models.schemas import ProcessingStatus
+from .embeddings.registry import EmbedderRegistry
+
+
+class ReindexCancelled(Exception):
+    """重建索引被取消"""
+    pass
+
+
+class ReindexJob:
+    """
+    重建索引任务
+    
+    1. 按目标配置创建新的嵌入器和第 generation+1 代集合（旧模型继续服务查询）
+    2. 从元数据目录保存的分块内容批量嵌入，逐批写入新集合
+    3. 持有服务的索引锁，补齐迁移期间新上传/删除的文件后切换到新索引
+    """
+    
+    # 状态中保留的错误条数
+    MAX_ERRORS = 20
+    
+    def __init__(self, service, embedding_config, batch_size: int = 32):
+        """
+        Args:
+            service: KnowledgeRetrievalService
+            embedding_config: 目标 EmbeddingConfig
+            batch_size: 每批迁移的文件数
+        """
+        self.service = service
+        self.embedding_config = embedding_config
+        self.batch_size = max(1, int(batch_size))
+        self.generation = service.index_generation + 1
+        
+        self.state = "pending"
+        self.total_files = 0
+        self.processed_files = 0
+        self.failed_files = 0
+        self.embedded_vectors = 0
+        self.errors: List[str] = []
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        
+        self._vector_spaces: Dict[str, Dict[str, List[str]]] = {}  # file_id -> 新集合中的向量分组
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def running(self) -> bool:
+        return self.state in ("pending", "running")
+    
+    def start(self) -> None:
+        """在后台线程中运行"""
+        self._thread = threading.Thread(target=self._run, name="reindex", daemon=True)
+        self._thread.start()
+    
+    def cancel(self) -> bool:
+        """请求取消，切换前的任意批次之间生效"""
+        if not self.running:
+            return False
+        self._cancel.set()
+        return True
+    
+    def status(self) -> Dict[str, Any]:
+        """任务进度"""
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "state": self.state,
+            "generation": self.generation,
+            "model_name": self.embedding_config.model_name,
+            "models": self.embedding_config.models if self.embedding_config.multi_model else None,
+            "total_files": self.total_files,
+            "processed_files": self.processed_files,
+            "failed_files": self.failed_files,
+            "embedded_vectors": self.embedded_vectors,
+            "elapsed": elapsed,
+            "throughput": self.embedded_vectors / elapsed if elapsed > 0 else 0.0,
+            "errors": list(self.errors),
+            "error": self.error
+        }
+    
+    def _run(self) -> None:
+        service = self.service
+        embedders = None
+        vector_dbs: Dict[str, Any] = {}
+        self.started_at = time.time()
+        self.state = "running"
+        
+        try:
+            embedders = service._create_embedders(self.embedding_config)
+            vector_dbs = service._create_vector_dbs(embedders, self.generation)
+            # 清掉之前未完成的同代集合
+            for vector_db in vector_dbs.values():
+                vector_db.clear()
+            
+            file_ids = [
+                record["file_id"]
+                for record in service.file_metadata.records(status=ProcessingStatus.COMPLETED)
+            ]
+            self.total_files = len(file_ids)
+            print(f"Re-indexing {self.total_files} files into generation {self.generation}")
+            self._migrate(file_ids, embedders, vector_dbs)
+            
+            # 切换与检查在同一个写事务中完成；迁移期间（含其他 worker）新上传的文件迁移后重试
+            with service._index_lock:
+                while True:
+                    self._check_cancelled()
+                    uploaded = service._switch_index(embedders, vector_dbs, self.generation, self._vector_spaces)
+                    if not uploaded:
+                        break
+                    self.total_files += len(uploaded)
+                    self._migrate(sorted(uploaded), embedders, vector_dbs)
+            
+            self.state = "completed"
+            print(f"Re-index finished: {self.embedded_vectors} vectors in "
+                  f"{time.time() - self.started_at:.1f}s ({self.failed_files} files failed)")
+        except ReindexCancelled:
+            self.state = "cancelled"
+            self._discard(embedders, vector_dbs)
+            print(f"Re-index into generation {self.generation} cancelled")
+        except Exception as e:
+            self.state = "failed"
+            self.error = f"{type(e).__name__}: {e}"
+            self._discard(embedders, vector_dbs)
+            print(f"Re-index failed: {self.error}")
+        finally:
+            self.finished_at = time.time()
+    
+    def _check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise ReindexCancelled()
+    
+    @staticmethod
+    def _discard(embedders: Optional[EmbedderRegistry], vector_dbs: Dict[str, Any]) -> None:
+        """丢弃未切换的新索引"""
+        for vector_db in vector_dbs.values():
+            vector_db.clear()
+            vector_db.close()
+        if embedders is not None:
+            embedders.close()
+    
+    def _fail(self, file_id: str, error: Exception) -> None:
+        self.failed_files += 1
+        self._vector_spaces[file_id] = {}
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append(f"{file_id}: {type(error).__name__}: {error}")
+    
+    def _migrate(self, file_ids: List[str], embedders: EmbedderRegistry,
+                 vector_dbs: Dict[str, Any]) -> None:
+        """按批迁移文件，一批内所有文件的分块合并嵌入"""
+        for start in range(0, len(file_ids), self.batch_size):
+            self._check_cancelled()
+            
+            records = []
+            for file_id in file_ids[start:start + self.batch_size]:
+                record = self.service.file_metadata.get(file_id)
+                if record is None:
+                    # 迁移前已删除
+                    self.total_files -= 1
+                    continue
+                records.append(record)
+            
+            try:
+                self.service._prepare_stored_inputs(records)
+            except Exception as e:
+                print(f"Batch re-processing failed, falling back to per-file: {e}")
+            
+            batch = []
+            for record in records:
+                file_id = record["file_id"]
+                try:
+                    batch.append((record, self.service._stored_inputs(record)))
+                except Exception as e:
+                    self._fail(file_id, e)
+                    self.processed_files += 1
+            
+            try:
+                self._migrate_batch(batch, embedders, vector_dbs)
+            except Exception:
+                # 撤销本批已写入的向量，逐个文件重试以定位失败的文件
+                batch_ids = [chunk["vector_id"] for _, chunks in batch for chunk in chunks]
+                for vector_db in vector_dbs.values():
+                    vector_db.delete(batch_ids)
+                for item in batch:
+                    try:
+                        self._migrate_batch([item], embedders, vector_dbs)
+                    except Exception as e:
+                        self._fail(item[0]["file_id"], e)
+            self.processed_files += len(batch)
+    
+    def _migrate_batch(self, batch: List[tuple], embedders: EmbedderRegistry,
+                       vector_dbs: Dict[str, Any]) -> None:
+        inputs, vector_ids, metadatas, owners = [], [], [], []
+        for record, chunks in batch:
+            for chunk in chunks:
+                inputs.append(chunk)
+                vector_ids.append(chunk["vector_id"])
+                metadatas.append(self.service._vector_metadata(record.get("metadata", {}), chunk))
+                owners.append(record["file_id"])
+        if not inputs:
+            return
+        
+        spaces: Dict[str, Dict[str, List[str]]] = {record["file_id"]: {} for record, _ in batch}
+        for space, (positions, vectors) in self.service._embed_inputs(inputs, embedders).items():
+            vector_dbs[space].insert(
+                vectors=vectors,
+                metadatas=[metadatas[i] for i in positions],
+                ids=[vector_ids[i] for i in positions]
+            )
+            for i in positions:
+                spaces[owners[i]].setdefault(space, []).append(vector_ids[i])
+        
+        self._vector_spaces.update(spaces)
+        self.embedded_vectors += len(inputs)
@@ -7,10 +7,15 @@ from .hybrid_retriever import (
     QueryExpander,
     MultiPathRetriever
 )
+from .metadata_index import MetadataIndex
+from .tokenizers import BaseTokenizer, TokenizerFactory
 
 __all__ = [
     'HybridRetriever',
     'BM25',
     'QueryExpander',
-    'MultiPathRetriever'
+    'MultiPathRetriever',
+    'MetadataIndex',
+    'BaseTokenizer',
+    'TokenizerFactory'
 ]
@@ -1,129 +1,425 @@
 """
 混合检索器 - 结合稠密向量和稀疏向量
 """
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Set, Tuple, Iterable
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from collections import defaultdict
-import re
+from collections import Counter, defaultdict
+
+from ...core import metrics, tracing
+from .synonyms import SynonymAutomaton, load_synonyms
+from .tokenizers import BaseTokenizer, TokenizerFactory
 
 
 class BM25:
-    """BM25 稀疏检索算法"""
+    """
+    BM25 稀疏检索算法
+    
+    每个文档的词频在建索引时计算一次；支持增量追加文档，
+    删除以墓碑标记，IDF 在下次检索前按存活文档重新计算。
     
-    def __init__(self, k1: float = 1.5, b: float = 0.75):
+    倒排表按文档下标有序，每个词记录最大词频和最短文档长度作为得分上界，
+    top-k 检索使用 MaxScore 动态剪枝：上界之和不足以进入 top-k 的低分词
+    （如高频单字）不再遍历倒排表，只在候选文档上查词频。
+    """
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75,
+                 tokenizer: Optional[BaseTokenizer] = None):
         self.k1 = k1
         self.b = b
+        self.tokenizer = tokenizer or TokenizerFactory.create_tokenizer("bigram")
         self.documents = []
         self.doc_lengths = []
+        self.doc_term_freqs: List[Dict[str, int]] = []
         self.avg_doc_length = 0
         self.doc_freqs = {}
         self.idf = {}
         self.doc_count = 0
+        self.deleted: Set[int] = set()
+        self.postings: Dict[str, List[int]] = {}  # 词 -> 文档下标（升序）
+        self.term_max_tf: Dict[str, int] = {}  # 词 -> 最大词频（得分上界）
+        self.term_min_length: Dict[str, int] = {}  # 词 -> 包含该词的最短文档长度（得分上界）
+        self._total_length = 0
+        self._stats_dirty = False
     
     def tokenize(self, text: str) -> List[str]:
-        """简单分词"""
-        # 中文字符分割 + 英文单词分割
-        tokens = []
-        
-        # 提取中文字符
-        chinese = re.findall(r'[\u4e00-\u9fff]+', text)
-        for word in chinese:
-            tokens.extend(list(word))  # 中文按字分
-        
-        # 提取英文单词
-        english = re.findall(r'[a-zA-Z]+', text.lower())
-        tokens.extend(english)
-        
-        return tokens
+        """分词（由可插拔分词器完成，见 tokenizers.py）"""
+        return self.tokenizer.tokenize(text)
     
     def index(self, documents: List[Dict[str, Any]]):
-        """建立索引"""
-        self.documents = documents
-        self.doc_count = len(documents)
+        """建立索引（重建）"""
+        self.documents = []
+        self.doc_lengths = []
+        self.doc_term_freqs = []
+        self.doc_freqs = {}
+        self.idf = {}
+        self.doc_count = 0
+        self.deleted = set()
+        self.postings = {}
+        self.term_max_tf = {}
+        self.term_min_length = {}
+        self._total_length = 0
+        self.add(documents)
+        self._refresh_stats()
+    
+    def add(self, documents: List[Dict[str, Any]]) -> List[int]:
+        """
+        追加文档
         
-        # 统计文档长度和词频
+        Returns:
+            新文档的下标
+        """
+        start = len(self.documents)
         for doc in documents:
             text = doc.get('text', '') + ' ' + doc.get('ocr_text', '')
             tokens = self.tokenize(text)
+            term_freqs = defaultdict(int)
+            for token in tokens:
+                term_freqs[token] += 1
+            
+            self.documents.append(doc)
             self.doc_lengths.append(len(tokens))
+            self.doc_term_freqs.append(dict(term_freqs))
+            self._total_length += len(tokens)
             
-            # 统计文档频率
-            unique_tokens = set(tokens)
-            for token in unique_tokens:
+            # 统计文档频率，追加倒排表并更新得分上界
+            doc_index = len(self.documents) - 1
+            for token, tf in term_freqs.items():
                 self.doc_freqs[token] = self.doc_freqs.get(token, 0) + 1
+                self.postings.setdefault(token, []).append(doc_index)
+                self.term_max_tf[token] = max(self.term_max_tf.get(token, 0), tf)
+                self.term_min_length[token] = min(self.term_min_length.get(token, len(tokens)), len(tokens))
         
-        self.avg_doc_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0
+        self.doc_count += len(documents)
+        self._stats_dirty = True
+        return list(range(start, len(self.documents)))
+    
+    def remove(self, indices: Iterable[int]) -> None:
+        """以墓碑标记删除文档"""
+        for i in indices:
+            if i in self.deleted or not 0 <= i < len(self.documents):
+                continue
+            self.deleted.add(i)
+            self._total_length -= self.doc_lengths[i]
+            for token in self.doc_term_freqs[i]:
+                freq = self.doc_freqs[token] - 1
+                if freq:
+                    self.doc_freqs[token] = freq
+                else:
+                    del self.doc_freqs[token]
+            self.doc_count -= 1
+        self._stats_dirty = True
+    
+    @property
+    def tombstone_ratio(self) -> float:
+        """已删除文档占比"""
+        return len(self.deleted) / len(self.documents) if self.documents else 0.0
+    
+    def _refresh_stats(self) -> None:
+        """按存活文档重新计算平均长度和 IDF"""
+        self.avg_doc_length = self._total_length / self.doc_count if self.doc_count else 0
         
         # 计算 IDF
-        for token, freq in self.doc_freqs.items():
-            self.idf[token] = np.log((self.doc_count - freq + 0.5) / (freq + 0.5) + 1.0)
+        self.idf = {
+            token: np.log((self.doc_count - freq + 0.5) / (freq + 0.5) + 1.0)
+            for token, freq in self.doc_freqs.items()
+        }
+        self._stats_dirty = False
     
-    def score_document(self, query_tokens: List[str], doc_tokens: List[str], doc_length: int) -> float:
-        """计算单个文档的 BM25 分数"""
+    def _tf_weight(self, tf: int, doc_length: int) -> float:
+        """BM25 词频饱和项（随 tf 递增、随文档长度递减）"""
+        numerator = tf * (self.k1 + 1)
+        denominator = tf + self.k1 * (1 - self.b + self.b * doc_length / self.avg_doc_length)
+        return numerator / denominator
+    
+    def _score(self, query_tokens: List[str], term_freqs: Dict[str, int], doc_length: int) -> float:
         score = 0.0
-        token_freqs = defaultdict(int)
-        
-        for token in doc_tokens:
-            token_freqs[token] += 1
         
         for token in query_tokens:
-            if token not in token_freqs:
+            tf = term_freqs.get(token)
+            if not tf:
                 continue
             
-            tf = token_freqs[token]
-            idf = self.idf.get(token, 0)
-            
             # BM25 公式
-            numerator = tf * (self.k1 + 1)
-            denominator = tf + self.k1 * (1 - self.b + self.b * doc_length / self.avg_doc_length)
-            
-            score += idf * numerator / denominator
+            score += self.idf.get(token, 0) * self._tf_weight(tf, doc_length)
         
         return score
     
-    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
-        """搜索文档"""
+    def score_document(self, query_tokens: List[str], doc_tokens: List[str], doc_length: int) -> float:
+        """计算单个文档的 BM25 分数"""
+        token_freqs = defaultdict(int)
+        
+        for token in doc_tokens:
+            token_freqs[token] += 1
+        
+        return self._score(query_tokens, token_freqs, doc_length)
+    
+    def search(self, query: str, top_k: int = 10,
+               candidates: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """
+        搜索文档
+        
+        Args:
+            query: 查询文本
+            top_k: 返回结果数量
+            candidates: 候选文档下标（预过滤结果），为 None 时扫描全部文档
+        """
+        if self._stats_dirty:
+            self._refresh_stats()
+        
         query_tokens = self.tokenize(query)
+        if not query_tokens or not self.doc_count:
+            return []
+        
+        if candidates is not None:
+            candidates = list(candidates)
+            # 候选集比倒排表还小时直接逐个打分
+            postings_size = sum(len(self.postings.get(token, ())) for token in set(query_tokens))
+            if len(candidates) <= postings_size:
+                return self._search_exhaustive(query_tokens, top_k, candidates)
+            candidates = set(candidates)
+        
+        return self._search_pruned(query_tokens, top_k, candidates)
+    
+    def search_batch(self, queries: List[str], top_k: int = 10,
+                     candidates: Optional[Iterable[int]] = None) -> List[List[Tuple[int, float]]]:
+        """
+        一次遍历为多个查询打分（多路召回的扩展查询之间大部分词相同）
+        
+        按词遍历所有查询用到的倒排表各一次，每个 (词, 文档) 的词频项只计算一次，
+        累加到包含该词的每个查询上。
+        """
+        if len(queries) <= 1:
+            return [self.search(query, top_k, candidates) for query in queries]
+        if self._stats_dirty:
+            self._refresh_stats()
+        
+        token_lists = [self.tokenize(query) for query in queries]
+        if not self.doc_count:
+            return [[] for _ in queries]
+        
+        candidate_set = None
+        if candidates is not None:
+            candidates = list(candidates)
+            terms = {token for tokens in token_lists for token in tokens}
+            postings_size = sum(len(self.postings.get(token, ())) for token in terms)
+            if len(candidates) <= postings_size:
+                return [self._search_exhaustive(tokens, top_k, candidates) for tokens in token_lists]
+            candidate_set = set(candidates)
+        
+        # 词 -> [(查询序号, 查询内词频)]
+        term_queries: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for q, tokens in enumerate(token_lists):
+            for token, count in Counter(tokens).items():
+                term_queries[token].append((q, count))
+        
+        accumulators: List[Dict[int, float]] = [defaultdict(float) for _ in queries]
+        for token, users in term_queries.items():
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = self.idf.get(token, 0)
+            for doc in postings:
+                if doc in self.deleted or (candidate_set is not None and doc not in candidate_set):
+                    continue
+                weight = idf * self._tf_weight(self.doc_term_freqs[doc][token], self.doc_lengths[doc])
+                for q, count in users:
+                    accumulators[q][doc] += count * weight
         
+        results = []
+        for tokens, scores in zip(token_lists, accumulators):
+            top = heapq.nlargest(top_k, scores.items(), key=lambda x: x[1])
+            # 按查询词顺序重新计算分数，与单查询检索结果一致
+            rescored = [
+                (doc, self._score(tokens, self.doc_term_freqs[doc], self.doc_lengths[doc]))
+                for doc, _ in top
+            ]
+            rescored.sort(key=lambda x: (-x[1], x[0]))
+            results.append(rescored)
+        return results
+    
+    def _search_exhaustive(self, query_tokens: List[str], top_k: int,
+                           candidates: Iterable[int]) -> List[Tuple[int, float]]:
+        """逐个文档打分"""
         scores = []
-        for i, doc in enumerate(self.documents):
-            text = doc.get('text', '') + ' ' + doc.get('ocr_text', '')
-            doc_tokens = self.tokenize(text)
-            score = self.score_document(query_tokens, doc_tokens, self.doc_lengths[i])
-            scores.append((i, score))
+        for i in candidates:
+            if i in self.deleted:
+                continue
+            score = self._score(query_tokens, self.doc_term_freqs[i], self.doc_lengths[i])
+            if score > 0:
+                scores.append((i, score))
         
         # 排序并返回 top-k
         scores.sort(key=lambda x: -x[1])
         return scores[:top_k]
+    
+    def _search_pruned(self, query_tokens: List[str], top_k: int,
+                       candidates: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """
+        MaxScore 剪枝检索（按文档下标顺序遍历倒排表）
+        
+        查询词按得分上界升序排列，上界前缀和不超过当前第 k 名分数的词为非关键词：
+        只包含这些词的文档不可能进入 top-k，因此只遍历关键词的倒排表，
+        非关键词的词频在候选文档上按上界从高到低补充，剩余上界不足时提前放弃该文档。
+        """
+        terms = []  # (上界, 词, 查询权重)
+        for token, count in Counter(query_tokens).items():
+            if token not in self.postings:
+                continue
+            weight = count * self.idf.get(token, 0)
+            upper = weight * self._tf_weight(self.term_max_tf[token], self.term_min_length[token])
+            terms.append((upper, token, weight))
+        if not terms:
+            return []
+        terms.sort()
+        
+        prefix = list(itertools.accumulate(upper for upper, _, _ in terms))
+        lists = [self.postings[token] for _, token, _ in terms]
+        pointers = [0] * len(terms)
+        heap: List[Tuple[float, int]] = []
+        threshold = 0.0
+        first_essential = 0
+        
+        while True:
+            while first_essential < len(terms) and prefix[first_essential] <= threshold:
+                first_essential += 1
+            if first_essential == len(terms):
+                break
+            
+            # 关键词倒排表中的下一个文档
+            doc = min(
+                (lists[t][pointers[t]] for t in range(first_essential, len(terms))
+                 if pointers[t] < len(lists[t])),
+                default=None
+            )
+            if doc is None:
+                break
+            
+            live = doc not in self.deleted and (candidates is None or doc in candidates)
+            term_freqs = self.doc_term_freqs[doc]
+            doc_length = self.doc_lengths[doc]
+            score = 0.0
+            for t in range(first_essential, len(terms)):
+                if pointers[t] < len(lists[t]) and lists[t][pointers[t]] == doc:
+                    pointers[t] += 1
+                    if live:
+                        score += terms[t][2] * self._tf_weight(term_freqs[terms[t][1]], doc_length)
+            if not live:
+                continue
+            
+            # 非关键词按上界从高到低补充
+            for t in range(first_essential - 1, -1, -1):
+                if score + prefix[t] <= threshold:
+                    break
+                tf = term_freqs.get(terms[t][1])
+                if tf:
+                    score += terms[t][2] * self._tf_weight(tf, doc_length)
+            
+            if len(heap) < top_k:
+                heapq.heappush(heap, (score, doc))
+                if len(heap) == top_k:
+                    threshold = heap[0][0]
+            elif score > threshold:
+                heapq.heapreplace(heap, (score, doc))
+                threshold = heap[0][0]
+        
+        # 按查询词顺序重新计算入选文档的分数，与逐个打分结果一致
+        results = [
+            (doc, self._score(query_tokens, self.doc_term_freqs[doc], self.doc_lengths[doc]))
+            for _, doc in heap
+        ]
+        results.sort(key=lambda x: (-x[1], x[0]))
+        return results
 
 
 class HybridRetriever:
     """混合检索器 - 结合向量检索和 BM25"""
     
-    def __init__(self, vector_retriever, alpha: float = 0.5):
+    def __init__(self, vector_retriever, alpha: float = 0.5,
+                 max_tombstone_ratio: float = 0.2,
+                 depth_factor: float = 3.0, min_depth: int = 20, max_depth: int = 400,
+                 tokenizer: Optional[BaseTokenizer] = None):
         """
         Args:
             vector_retriever: 向量检索器（CLIP）
             alpha: 稠密向量权重 (1-alpha 为 BM25 权重)
+            max_tombstone_ratio: 已删除文档占比超过该值时压缩 BM25 索引
+            depth_factor: 初始融合候选深度 = top_k * depth_factor
+            min_depth: 初始候选深度下限
+            max_depth: 自适应加深的候选深度上限（不小于 top_k）
+            tokenizer: BM25 分词器，默认 CJK 二元组
         """
         self.vector_retriever = vector_retriever
-        self.bm25 = BM25()
+        self.bm25 = BM25(tokenizer=tokenizer)
         self.alpha = alpha
+        self.max_tombstone_ratio = max_tombstone_ratio
+        self.depth_factor = depth_factor
+        self.min_depth = min_depth
+        self.max_depth = max_depth
         self.documents = []
+        self.file_id_to_index: Dict[str, int] = {}
+        # 向量检索与 BM25 并行执行
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-vector")
     
     def index(self, documents: List[Dict[str, Any]]):
         """建立混合索引"""
-        self.documents = documents
-        
-        # 为 BM25 建立索引
+        # 为 BM25 建立索引（两者共享同一文档列表，下标一致）
         self.bm25.index(documents)
+        self.documents = self.bm25.documents
+        self.file_id_to_index = {doc['file_id']: i for i, doc in enumerate(self.documents)}
         print(f"Indexed {len(documents)} documents for hybrid search")
     
+    def add_documents(self, documents: List[Dict[str, Any]]) -> None:
+        """
+        增量追加文档，已存在的 file_id 先删除旧版本
+        
+        Args:
+            documents: 新文档列表
+        """
+        stale = [
+            self.file_id_to_index.pop(doc['file_id'])
+            for doc in documents if doc['file_id'] in self.file_id_to_index
+        ]
+        if stale:
+            self.bm25.remove(stale)
+        
+        for doc, i in zip(documents, self.bm25.add(documents)):
+            self.file_id_to_index[doc['file_id']] = i
+        self._maybe_compact()
+    
+    def remove_document(self, file_id: str) -> bool:
+        """
+        删除文档（墓碑标记，下标保持不变）
+        
+        Returns:
+            文档是否存在
+        """
+        i = self.file_id_to_index.pop(file_id, None)
+        if i is None:
+            return False
+        self.bm25.remove([i])
+        self._maybe_compact()
+        return True
+    
+    def _maybe_compact(self) -> None:
+        """墓碑过多时按存活文档重建索引，回收空间并恢复扫描效率"""
+        if self.bm25.tombstone_ratio > self.max_tombstone_ratio:
+            live = [self.documents[i] for i in sorted(self.file_id_to_index.values())]
+            self.index(live)
+    
     def search(
         self, 
         query: str, 
         top_k: int = 10,
-        use_rrf: bool = False  # 默认使用加权融合
+        use_rrf: bool = False,  # 默认使用加权融合
+        candidate_ids: Optional[Set[str]] = None
     ) -> List[Dict[str, Any]]:
         """
         混合检索
@@ -132,33 +428,161 @@ class HybridRetriever:
             query: 查询文本
             top_k: 返回结果数量
             use_rrf: 是否使用 RRF (Reciprocal Rank Fusion)，默认False使用加权融合
+            candidate_ids: 元数据预过滤得到的候选 file_id 集合，为 None 时不过滤
             
         Returns:
             检索结果列表
         """
-        # 1. 向量检索
-        vector_results = self.vector_retriever.search(query, top_k=50)
-        
-        # 2. BM25 检索
-        bm25_results = self.bm25.search(query, top_k=50)
+        return self.search_batch([query], top_k, use_rrf, candidate_ids)[0]
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 10,
+        use_rrf: bool = False,
+        candidate_ids: Optional[Set[str]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量混合检索（多路召回）
         
-        # 3. 结果融合 - 使用加权融合保留BM25高分
-        if use_rrf:
-            final_scores = self._reciprocal_rank_fusion(vector_results, bm25_results)
-        else:
-            final_scores = self._weighted_fusion(vector_results, bm25_results)
+        重复查询去重；每一轮向量检索（一次批量嵌入 + 一次批量检索）在线程池中执行，
+        同时在当前线程用一次 BM25 遍历为所有查询打分。只有 top-k 尚未稳定的查询进入下一轮加深。
         
-        # 4. 排序并返回 top-k
-        sorted_results = sorted(final_scores.items(), key=lambda x: -x[1])[:top_k]
+        Returns:
+            每个查询的检索结果列表
+        """
+        unique_queries = list(dict.fromkeys(queries))
         
-        # 5. 格式化结果
-        results = []
-        for doc_id, score in sorted_results:
-            doc = self.documents[doc_id].copy()
-            doc['hybrid_score'] = float(score)
-            results.append(doc)
+        candidates = None
+        if candidate_ids is None:
+            corpus_size = len(self.file_id_to_index)
+            if not corpus_size:
+                return [[] for _ in queries]
+        else:
+            candidates = sorted(
+                self.file_id_to_index[fid] for fid in candidate_ids
+                if fid in self.file_id_to_index
+            )
+            if not candidates:
+                return [[] for _ in queries]
+            corpus_size = len(candidates)
+        
+        # 候选深度随 top_k 自适应；融合后的 top-k 无法被更深的候选改变时提前结束，否则加倍深度。
+        # 向量检索的最后一名分数不是上界时（多向量空间）无法判断，直接加深到 max_depth
+        scores_bounded = getattr(self.vector_retriever, 'scores_bounded', None)
+        early_stop = scores_bounded() if scores_bounded is not None else True
+        max_depth = min(max(self.max_depth, top_k), corpus_size)
+        depth = min(max(self.min_depth, math.ceil(top_k * self.depth_factor), top_k), max_depth)
+        fused: List[Dict[int, float]] = [{} for _ in unique_queries]
+        pending = list(range(len(unique_queries)))
+        while pending:
+            batch = [unique_queries[i] for i in pending]
+            
+            # 1. 向量检索（后台线程，沿用当前请求的耗时记录）
+            vector_future = self._executor.submit(
+                contextvars.copy_context().run, self._vector_search_batch, batch, depth, candidate_ids
+            )
+            
+            # 2. BM25 检索
+            with metrics.search_stage("bm25"):
+                bm25_batch = self.bm25.search_batch(batch, top_k=depth, candidates=candidates)
+            vector_batch = vector_future.result()
+            tracing.count("bm25_hits", sum(len(results) for results in bm25_batch))
+            tracing.count("fusion_rounds")
+            
+            unstable = []
+            with metrics.search_stage("fusion"):
+                for i, vector_results, bm25_results in zip(pending, vector_batch, bm25_batch):
+                    # 3. 结果融合 - 使用加权融合保留BM25高分
+                    if use_rrf:
+                        fused[i] = self._reciprocal_rank_fusion(vector_results, bm25_results)
+                    else:
+                        fused[i] = self._weighted_fusion(vector_results, bm25_results)
+                    
+                    if depth < max_depth and (not early_stop or not self._fusion_stable(
+                        fused[i], vector_results, bm25_results, top_k,
+                        bm25_exhausted=len(bm25_results) < depth, use_rrf=use_rrf
+                    )):
+                        unstable.append(i)
+            
+            pending = unstable
+            depth = min(depth * 2, max_depth)
+        tracing.count("fused_candidates", sum(len(scores) for scores in fused))
+        
+        results_by_query = {}
+        for query, final_scores in zip(unique_queries, fused):
+            # 4. 排序并返回 top-k
+            sorted_results = sorted(final_scores.items(), key=lambda x: -x[1])[:top_k]
+            
+            # 5. 格式化结果
+            results = []
+            for doc_id, score in sorted_results:
+                doc = self.documents[doc_id].copy()
+                doc['hybrid_score'] = float(score)
+                results.append(doc)
+            results_by_query[query] = results
+        
+        return [results_by_query[query] for query in queries]
+    
+    def _vector_search_batch(self, queries: List[str], top_k: int,
+                             file_ids: Optional[Set[str]]) -> List[List[Tuple[int, float]]]:
+        """向量检索器支持 search_batch 时批量检索，否则逐条检索"""
+        search_batch = getattr(self.vector_retriever, 'search_batch', None)
+        if search_batch is not None:
+            return search_batch(queries, top_k=top_k, file_ids=file_ids)
+        return [self.vector_retriever.search(query, top_k=top_k, file_ids=file_ids) for query in queries]
+    
+    def _fusion_stable(
+        self,
+        scores: Dict[int, float],
+        vector_results: List[Tuple[int, float]],
+        bm25_results: List[Tuple[int, float]],
+        top_k: int,
+        bm25_exhausted: bool = False,
+        use_rrf: bool = False,
+        k: int = 60
+    ) -> bool:
+        """
+        阈值算法（Threshold Algorithm）停止条件
         
-        return results
+        两路结果都按分数降序，未取到的文档在某一路的贡献不超过该路最后一名
+        （RRF 下不超过下一名次的倒数）；BM25 只返回命中的文档，不足 depth 条时
+        其余文档的 BM25 分数为 0。top-k 以外的文档（含未出现的文档）
+        分数上界都不超过第 k 名的当前分数时，加深候选不会改变 top-k。
+        要求向量检索器返回的最后一名分数是未取到文档的上界（见 scores_bounded）。
+        """
+        bounds = []
+        for results, weight, exhausted in (
+            (vector_results, self.alpha, False),
+            (bm25_results, 1 - self.alpha, bm25_exhausted)
+        ):
+            if exhausted or not results:
+                bounds.append(0.0)
+            elif use_rrf:
+                bounds.append(1.0 / (k + len(results) + 1))
+            else:
+                bounds.append(weight * max(results[-1][1], 0.0))
+        vector_bound, bm25_bound = bounds
+        
+        ranked = sorted(scores.items(), key=lambda x: -x[1])
+        if len(ranked) < top_k:
+            return vector_bound + bm25_bound <= 0.0
+        
+        kth_score = ranked[top_k - 1][1]
+        if vector_bound + bm25_bound > kth_score:
+            return False
+        
+        in_vector = {doc_id for doc_id, _ in vector_results}
+        in_bm25 = {doc_id for doc_id, _ in bm25_results}
+        for doc_id, score in ranked[top_k:]:
+            upper = score
+            if doc_id not in in_vector:
+                upper += vector_bound
+            if doc_id not in in_bm25:
+                upper += bm25_bound
+            if upper > kth_score:
+                return False
+        return True
     
     def _weighted_fusion(
         self, 
@@ -210,50 +634,150 @@ class HybridRetriever:
 
 
 class QueryExpander:
-    """查询扩展器"""
-    
-    def __init__(self):
-        # 同义词词典（可以扩展）
-        self.synonyms = {
-            '小红书': ['RED', '小红书APP', '小红书平台', '种草平台'],
-            '营销': ['推广', '宣传', '运营'],
-            '教程': ['指南', '攻略', '教学'],
-            '方法': ['技巧', '方式', '策略'],
-            # 人名映射（中英文）
-            '李宏毅': ['Hung-yi Lee', 'Lee Hung-yi', 'Hongyi Li', 'Li Hongyi'],
-            '吴恩达': ['Andrew Ng', 'Ng Andrew'],
-            '李飞飞': ['Fei-Fei Li', 'Li Fei-Fei'],
-        }
+    """
+    查询扩展器
+    
+    同义词词典（内置词条 + 词典文件）编译为 Aho-Corasick 自动机，每个查询只做一次线性扫描。
+    词典文件修改后按 reload_interval 自动重新加载；扩展数量受 max_expansions 限制。
+    """
+    
+    # 内置同义词词典
+    DEFAULT_SYNONYMS = {
+        '小红书': ['RED', '小红书APP', '小红书平台', '种草平台'],
+        '营销': ['推广', '宣传', '运营'],
+        '教程': ['指南', '攻略', '教学'],
+        '方法': ['技巧', '方式', '策略'],
+        # 人名映射（中英文）
+        '李宏毅': ['Hung-yi Lee', 'Lee Hung-yi', 'Hongyi Li', 'Li Hongyi'],
+        '吴恩达': ['Andrew Ng', 'Ng Andrew'],
+        '李飞飞': ['Fei-Fei Li', 'Li Fei-Fei'],
+    }
+    
+    def __init__(self, dictionaries: Optional[List[str]] = None, builtin: bool = True,
+                 max_expansions: int = 8, max_synonyms_per_term: int = 5,
+                 reload_interval: float = 30.0):
+        """
+        Args:
+            dictionaries: 同义词词典文件路径（.json 或 Solr 格式文本）
+            builtin: 是否包含内置词条
+            max_expansions: 每个查询最多生成的扩展查询数
+            max_synonyms_per_term: 每个命中词最多使用的同义词数
+            reload_interval: 检查词典文件是否修改的间隔（秒），0 表示不自动重载
+        """
+        self.dictionaries = list(dictionaries or [])
+        self.builtin = builtin
+        self.max_expansions = max_expansions
+        self.max_synonyms_per_term = max_synonyms_per_term
+        self.reload_interval = reload_interval
+        self.synonyms: Dict[str, List[str]] = {}
+        self._added: Dict[str, List[str]] = {}
+        self._automaton = SynonymAutomaton([])
+        self._mtimes: Dict[str, float] = {}
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        self.reload()
+    
+    def _file_mtimes(self) -> Dict[str, float]:
+        mtimes = {}
+        for path in self.dictionaries:
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except OSError:
+                mtimes[path] = 0.0
+        return mtimes
+    
+    def reload(self) -> None:
+        """重新加载词典文件并重建自动机（构建完成后原子替换）"""
+        synonyms: Dict[str, List[str]] = {}
+        if self.builtin:
+            synonyms.update({word: list(syns) for word, syns in self.DEFAULT_SYNONYMS.items()})
+        
+        mtimes = self._file_mtimes()
+        for path in self.dictionaries:
+            if not mtimes[path]:
+                print(f"Warning: synonym dictionary not found: {path}")
+                continue
+            try:
+                for word, syns in load_synonyms(path).items():
+                    entry = synonyms.setdefault(word, [])
+                    entry.extend(syn for syn in syns if syn not in entry)
+            except Exception as e:
+                print(f"Error loading synonym dictionary {path}: {e}")
+        synonyms.update(self._added)
+        
+        automaton = SynonymAutomaton(synonyms)
+        self.synonyms, self._automaton = synonyms, automaton
+        self._mtimes = mtimes
+        self._last_check = time.time()
+        if self.dictionaries:
+            print(f"Synonym dictionaries loaded: {len(synonyms)} entries")
+    
+    def _maybe_reload(self) -> None:
+        """词典文件修改后重新加载"""
+        if not self.dictionaries or not self.reload_interval:
+            return
+        if time.time() - self._last_check < self.reload_interval:
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_check = time.time()
+            if self._file_mtimes() != self._mtimes:
+                self.reload()
+        finally:
+            self._reload_lock.release()
     
     def expand(self, query: str) -> List[str]:
-        """扩展查询"""
-        expanded = [query]
+        """扩展查询（第一个为原始查询）"""
+        self._maybe_reload()
+        automaton = self._automaton
         
-        # 添加同义词
-        for word, syns in self.synonyms.items():
-            if word in query:
-                for syn in syns:
-                    expanded.append(query.replace(word, syn))
+        expanded = [query]
+        seen = {query}
+        
+        # 命中词按位置顺序，每个同义词替换该词在查询中的所有出现
+        spans: Dict[str, List[Tuple[int, int]]] = {}
+        for start, end, word in automaton.find(query):
+            spans.setdefault(word, []).append((start, end))
+        
+        for word, positions in spans.items():
+            for syn in automaton.synonyms[word][:self.max_synonyms_per_term]:
+                if len(expanded) > self.max_expansions:
+                    return expanded
+                parts, last = [], 0
+                for start, end in positions:
+                    parts.append(query[last:start])
+                    parts.append(syn)
+                    last = end
+                parts.append(query[last:])
+                candidate = "".join(parts)
+                if candidate not in seen:
+                    seen.add(candidate)
+                    expanded.append(candidate)
         
         return expanded
     
     def add_synonym(self, word: str, synonyms: List[str]):
-        """添加同义词"""
-        self.synonyms[word] = synonyms
+        """添加同义词（重新加载词典后保留）"""
+        self._added[word] = list(synonyms)
+        self.synonyms = {**self.synonyms, word: list(synonyms)}
+        self._automaton = SynonymAutomaton(self.synonyms)
 
 
 class MultiPathRetriever:
     """多路召回检索器"""
     
-    def __init__(self, hybrid_retriever: HybridRetriever):
+    def __init__(self, hybrid_retriever: HybridRetriever,
+                 query_expander: Optional[QueryExpander] = None):
         self.hybrid_retriever = hybrid_retriever
-        self.query_expander = QueryExpander()
+        self.query_expander = query_expander or QueryExpander()
     
     def search(
         self, 
         query: str, 
         top_k: int = 10,
-        expand_query: bool = True
+        expand_query: bool = True,
+        candidate_ids: Optional[Set[str]] = None
     ) -> List[Dict[str, Any]]:
         """
         多路召回搜索
@@ -262,44 +786,37 @@ class MultiPathRetriever:
             query: 原始查询
             top_k: 最终返回数量
             expand_query: 是否进行查询扩展
+            candidate_ids: 元数据预过滤得到的候选 file_id 集合
         """
-        all_results = {}
-        
-        # 路径1: 原始查询
-        results1 = self.hybrid_retriever.search(query, top_k=top_k * 2)
-        for r in results1:
-            doc_id = r['file_id']
-            all_results[doc_id] = {
-                'result': r,
-                'max_score': r.get('hybrid_score', 0),
-                'score_count': 1
-            }
-        
-        # 路径2: 查询扩展
+        # 原始查询 + 扩展查询作为一批执行（共享嵌入、向量检索和 BM25 遍历）
+        queries = [query]
         if expand_query:
-            expanded_queries = self.query_expander.expand(query)
-            for exp_query in expanded_queries[1:]:  # 跳过原始查询
-                results2 = self.hybrid_retriever.search(exp_query, top_k=top_k)
-                for r in results2:
-                    doc_id = r['file_id']
-                    current_score = r.get('hybrid_score', 0)
-                    
-                    if doc_id not in all_results:
-                        # 新文档
-                        all_results[doc_id] = {
-                            'result': r,
-                            'max_score': current_score,
-                            'score_count': 1
-                        }
-                    else:
-                        # 已存在文档，更新为更高分数
-                        old_score = all_results[doc_id]['max_score']
-                        if current_score > old_score:
-                            # 调试日志：分数提升
-                            print(f"[DEBUG] Score boost for {r.get('filename', doc_id)}: {old_score:.4f} → {current_score:.4f} (query: {exp_query})")
-                            all_results[doc_id]['max_score'] = current_score
-                            all_results[doc_id]['result'] = r  # 使用高分查询的结果
-                        all_results[doc_id]['score_count'] += 1
+            with metrics.search_stage("expansion"):
+                queries.extend(self.query_expander.expand(query)[1:])  # 跳过原始查询
+            tracing.count("expansions", len(queries) - 1)
+        
+        # 按最高分合并，每路取 top_k 即可保证最终 top_k 正确，候选深度由混合检索器自适应
+        batch_results = self.hybrid_retriever.search_batch(queries, top_k=top_k, candidate_ids=candidate_ids)
+        
+        all_results = {}
+        for results in batch_results:
+            for r in results:
+                doc_id = r['file_id']
+                current_score = r.get('hybrid_score', 0)
+                
+                if doc_id not in all_results:
+                    # 新文档
+                    all_results[doc_id] = {
+                        'result': r,
+                        'max_score': current_score,
+                        'score_count': 1
+                    }
+                else:
+                    # 已存在文档，更新为更高分数
+                    if current_score > all_results[doc_id]['max_score']:
+                        all_results[doc_id]['max_score'] = current_score
+                        all_results[doc_id]['result'] = r  # 使用高分查询的结果
+                    all_results[doc_id]['score_count'] += 1
         
         # 去重并返回 top-k，使用最高分数排序
         unique_results = []
@@ -339,9 +856,12 @@ if __name__ == "__main__":
         def __init__(self, docs):
             self.docs = docs
         
-        def search(self, query, top_k=10):
-            # 简单返回所有文档
-            return [(i, 0.8) for i in range(len(self.docs))]
+        def search(self, query, top_k=10, file_ids=None):
+            # 简单返回所有（候选）文档
+            return [
+                (i, 0.8) for i, doc in enumerate(self.docs)
+                if file_ids is None or doc['file_id'] in file_ids
+            ]
     
     # 创建混合检索器
     vector_retriever = MockVectorRetriever(documents)
@@ -0,0 +1,279 @@
+"""
+元数据索引 - 在向量/BM25 检索之前将过滤条件解析为候选文件集合
+"""
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+# 二分查找时用作 file_id 上界的哨兵值
+_MAX_ID = "\uffff"
+
+
+class MetadataIndex:
+    """
+    文件元数据倒排索引
+    
+    - file_type / filename / tags: 值 -> file_id 集合（倒排位图）
+    - upload_time: 按时间排序的数组，范围查询使用二分查找
+    - 每个文件按向量空间分组的向量ID及各空间的向量总数，预过滤检索时无需查询元数据目录
+    
+    过滤语法与 ChromaDB 的 where 条件保持一致，例如:
+        {"file_type": "image"}
+        {"file_type": {"$in": ["image", "document"]}}
+        {"upload_time": {"$gte": 1700000000}}
+        {"tags": {"$contains": "营销"}}
+        {"$and": [{"file_type": "document"}, {"filename": {"$contains": "报告"}}]}
+    """
+    
+    # 可由索引解析的字段
+    INDEXED_FIELDS = ("file_id", "file_type", "filename", "upload_time", "tags")
+    
+    # 旧记录的向量没有按空间分组，查询文本空间时一并返回
+    LEGACY_SPACE = ""
+    
+    def __init__(self):
+        self._all: Set[str] = set()
+        self._file_type: Dict[str, Set[str]] = {}
+        self._filename: Dict[str, Set[str]] = {}
+        self._tags: Dict[str, Set[str]] = {}
+        self._upload_times: List[Tuple[float, str]] = []  # 有序 (time, file_id)
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._vector_counts: Dict[str, int] = {}  # 向量空间 -> 向量数
+    
+    def __len__(self) -> int:
+        return len(self._all)
+    
+    def file_ids(self) -> Set[str]:
+        """已索引的 file_id"""
+        return set(self._all)
+    
+    def add(self, file_id: str, file_type: str, filename: str,
+            upload_time: float, tags: Optional[Iterable[str]] = None,
+            vector_spaces: Optional[Dict[str, List[str]]] = None) -> None:
+        """
+        添加文件到索引（已存在则先移除）
+        
+        Args:
+            file_id: 文件ID
+            file_type: 文件类型
+            filename: 文件名
+            upload_time: 上传时间（Unix 时间戳）
+            tags: 自定义标签
+            vector_spaces: 向量空间 -> 向量ID列表
+        """
+        if file_id in self._all:
+            self.remove(file_id)
+        
+        tags = sorted({t for t in (tags or []) if t})
+        
+        self._all.add(file_id)
+        self._file_type.setdefault(file_type, set()).add(file_id)
+        self._filename.setdefault(filename, set()).add(file_id)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(file_id)
+        insort(self._upload_times, (float(upload_time), file_id))
+        
+        vector_spaces = {space: list(ids) for space, ids in (vector_spaces or {}).items() if ids}
+        for space, ids in vector_spaces.items():
+            self._vector_counts[space] = self._vector_counts.get(space, 0) + len(ids)
+        
+        self._records[file_id] = {
+            "file_type": file_type,
+            "filename": filename,
+            "upload_time": float(upload_time),
+            "tags": tags,
+            "vector_spaces": vector_spaces
+        }
+    
+    def remove(self, file_id: str) -> None:
+        """从索引中移除文件"""
+        record = self._records.pop(file_id, None)
+        if record is None:
+            return
+        
+        self._all.discard(file_id)
+        self._discard(self._file_type, record["file_type"], file_id)
+        self._discard(self._filename, record["filename"], file_id)
+        for tag in record["tags"]:
+            self._discard(self._tags, tag, file_id)
+        for space, ids in record["vector_spaces"].items():
+            self._vector_counts[space] -= len(ids)
+            if not self._vector_counts[space]:
+                del self._vector_counts[space]
+        
+        key = (record["upload_time"], file_id)
+        pos = bisect_left(self._upload_times, key)
+        if pos < len(self._upload_times) and self._upload_times[pos] == key:
+            del self._upload_times[pos]
+    
+    def vector_ids(self, file_ids: Iterable[str], space: str, legacy: bool = False) -> List[str]:
+        """
+        文件在某个向量空间中的向量ID
+        
+        Args:
+            file_ids: 文件ID
+            space: 向量空间
+            legacy: 是否包含未按空间分组的旧记录的向量
+        """
+        spaces = (space, self.LEGACY_SPACE) if legacy else (space,)
+        vector_ids: List[str] = []
+        for file_id in file_ids:
+            record = self._records.get(file_id)
+            if record is None:
+                continue
+            for name in spaces:
+                vector_ids.extend(record["vector_spaces"].get(name, ()))
+        return vector_ids
+    
+    def vector_count(self, space: str, legacy: bool = False) -> int:
+        """向量空间中已索引文件的向量总数（legacy 含义同 vector_ids）"""
+        count = self._vector_counts.get(space, 0)
+        if legacy:
+            count += self._vector_counts.get(self.LEGACY_SPACE, 0)
+        return count
+    
+    def clear(self) -> None:
+        """清空索引"""
+        self.__init__()
+    
+    @staticmethod
+    def _discard(postings: Dict[str, Set[str]], value: str, file_id: str) -> None:
+        ids = postings.get(value)
+        if ids is None:
+            return
+        ids.discard(file_id)
+        if not ids:
+            del postings[value]
+    
+    def can_resolve(self, filter: Dict[str, Any]) -> bool:
+        """判断过滤条件是否只涉及已索引字段"""
+        if not isinstance(filter, dict):
+            return False
+        
+        for key, value in filter.items():
+            if key in ("$and", "$or"):
+                if not isinstance(value, list) or not all(self.can_resolve(c) for c in value):
+                    return False
+            elif key not in self.INDEXED_FIELDS:
+                return False
+        return True
+    
+    def resolve(self, filter: Dict[str, Any]) -> Optional[Set[str]]:
+        """
+        将过滤条件解析为候选 file_id 集合
+        
+        Args:
+            filter: where 风格的过滤条件
+        
+        Returns:
+            候选 file_id 集合；过滤条件包含未索引字段时返回 None
+        """
+        if not filter:
+            return set(self._all)
+        if not self.can_resolve(filter):
+            return None
+        return self._resolve(filter)
+    
+    def _resolve(self, filter: Dict[str, Any]) -> Set[str]:
+        result: Optional[Set[str]] = None
+        
+        for key, value in filter.items():
+            if key == "$and":
+                ids = self._intersect(self._resolve(c) for c in value)
+            elif key == "$or":
+                ids = set()
+                for c in value:
+                    ids |= self._resolve(c)
+            else:
+                ids = self._resolve_field(key, value)
+            
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        
+        return result if result is not None else set(self._all)
+    
+    def _intersect(self, sets: Iterable[Set[str]]) -> Set[str]:
+        # 从最小集合开始求交，减少比较次数
+        sets = sorted(sets, key=len)
+        if not sets:
+            return set(self._all)
+        result = set(sets[0])
+        for s in sets[1:]:
+            result &= s
+            if not result:
+                break
+        return result
+    
+    def _resolve_field(self, field: str, condition: Any) -> Set[str]:
+        # 简写形式 {"field": value} 等价于 {"field": {"$eq": value}}
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        
+        sets = [self._resolve_operator(field, op, operand) for op, operand in condition.items()]
+        return self._intersect(sets)
+    
+    def _resolve_operator(self, field: str, op: str, operand: Any) -> Set[str]:
+        if field == "upload_time":
+            return self._resolve_time(op, operand)
+        
+        if op == "$eq":
+            return self._lookup(field, operand)
+        if op == "$ne":
+            return self._all - self._lookup(field, operand)
+        if op == "$in":
+            ids = set()
+            for v in operand:
+                ids |= self._lookup(field, v)
+            return ids
+        if op == "$nin":
+            ids = set(self._all)
+            for v in operand:
+                ids -= self._lookup(field, v)
+            return ids
+        if op == "$contains":
+            if field == "tags":
+                return self._lookup(field, operand)
+            if field == "filename":
+                operand = str(operand)
+                ids = set()
+                for name, name_ids in self._filename.items():
+                    if operand in name:
+                        ids |= name_ids
+                return ids
+        
+        raise ValueError(f"Unsupported filter operator {op} for field {field}")
+    
+    def _lookup(self, field: str, value: Any) -> Set[str]:
+        if field == "file_id":
+            return {value} if value in self._all else set()
+        postings = {
+            "file_type": self._file_type,
+            "filename": self._filename,
+            "tags": self._tags
+        }[field]
+        return postings.get(value, set())
+    
+    def _resolve_time(self, op: str, operand: Any) -> Set[str]:
+        times = self._upload_times
+        
+        if op in ("$eq", "$ne"):
+            t = float(operand)
+            lo = bisect_left(times, (t, ""))
+            hi = bisect_right(times, (t, _MAX_ID))
+            ids = {fid for _, fid in times[lo:hi]}
+            return ids if op == "$eq" else self._all - ids
+        
+        t = float(operand)
+        if op == "$gt":
+            lo, hi = bisect_right(times, (t, _MAX_ID)), len(times)
+        elif op == "$gte":
+            lo, hi = bisect_left(times, (t, "")), len(times)
+        elif op == "$lt":
+            lo, hi = 0, bisect_left(times, (t, ""))
+        elif op == "$lte":
+            lo, hi = 0, bisect_right(times, (t, _MAX_ID))
+        else:
+            raise ValueError(f"Unsupported filter operator {op} for field upload_time")
+        
+        return {fid for _, fid in times[lo:hi]}
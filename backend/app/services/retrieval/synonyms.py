@@ -0,0 +1,178 @@
+"""
+同义词词典 - 文件加载与 Aho-Corasick 多模式匹配自动机
+"""
+import json
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Tuple, Union
+
+
+def load_synonyms(path: str) -> Dict[str, List[str]]:
+    """
+    加载同义词词典文件
+    
+    支持两种格式:
+    - .json: {"词": ["同义词1", "同义词2"], ...}
+    - 文本（Solr 同义词格式，# 开头为注释）:
+        词 => 同义词1, 同义词2      单向：词扩展为右侧各项
+        词1, 词2, 词3              等价组：组内每个词扩展为其余各词
+    
+    Args:
+        path: 词典文件路径
+    
+    Returns:
+        词 -> 同义词列表
+    """
+    path = Path(path)
+    synonyms: Dict[str, List[str]] = {}
+    
+    def add(word: str, targets: Iterable[str]) -> None:
+        word = word.strip()
+        if not word:
+            return
+        entry = synonyms.setdefault(word, [])
+        for target in targets:
+            target = target.strip()
+            if target and target != word and target not in entry:
+                entry.append(target)
+    
+    if path.suffix.lower() == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            for word, targets in json.load(f).items():
+                add(word, targets)
+        return synonyms
+    
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if "=>" in line:
+                left, right = line.split("=>", 1)
+                targets = right.split(",")
+                for word in left.split(","):
+                    add(word, targets)
+            else:
+                group = [w for w in line.split(",") if w.strip()]
+                for word in group:
+                    add(word, group)
+    return synonyms
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class SynonymAutomaton:
+    """
+    Aho-Corasick 自动机
+    
+    所有词条编译为一个带失败指针的字典树，对查询做一次线性扫描即可找出
+    全部命中（与词条数量无关）。匹配不区分大小写；纯 ASCII 词条要求
+    两侧为单词边界（避免 RED 命中 REDUCE），CJK 词条不做边界检查。
+    仅大小写不同的词条合并为一个（保留最先出现的写法），同义词列表按顺序去重合并。
+    """
+    
+    def __init__(self, words: Union[Mapping[str, Iterable[str]], Iterable[str]]):
+        """
+        Args:
+            words: 词条，或 词 -> 同义词列表
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[int] = [-1]  # 状态结束的词条序号
+        self._output_link: List[int] = [0]  # 失败链上最近的可输出状态
+        self.words: List[str] = []
+        self.synonyms: Dict[str, List[str]] = {}  # 词条 -> 合并后的同义词列表
+        
+        payloads = words if isinstance(words, Mapping) else {}
+        for word in words:
+            if word:
+                self._insert(word, payloads.get(word, ()))
+        self._build()
+    
+    def __len__(self) -> int:
+        return len(self.words)
+    
+    def _insert(self, word: str, synonyms: Iterable[str] = ()) -> None:
+        state = 0
+        for ch in word.lower():
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(-1)
+                self._output_link.append(0)
+            state = next_state
+        if self._output[state] == -1:
+            self._output[state] = len(self.words)
+            self.words.append(word)
+            self.synonyms[word] = []
+        
+        entry = self.synonyms[self.words[self._output[state]]]
+        entry.extend(syn for syn in dict.fromkeys(synonyms) if syn not in entry)
+    
+    def _build(self) -> None:
+        """广度优先计算失败指针和输出链接"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(ch, 0)
+                self._fail[child] = fail
+                self._output_link[child] = fail if self._output[fail] != -1 else self._output_link[fail]
+    
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        查找所有命中
+        
+        Returns:
+            [(起始位置, 结束位置, 词条)]，按结束位置排列
+        """
+        matches = []
+        state = 0
+        lowered = text.lower()
+        for end, ch in enumerate(lowered, start=1):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            
+            hit = state if self._output[state] != -1 else self._output_link[state]
+            while hit:
+                word = self.words[self._output[hit]]
+                start = end - len(word.lower())
+                if self._on_boundary(text, start, end, word):
+                    matches.append((start, end, word))
+                hit = self._output_link[hit]
+        return matches
+    
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        查找互不重叠的命中（最左最长优先）
+        
+        Returns:
+            [(起始位置, 结束位置, 词条)]，按起始位置排列
+        """
+        selected = []
+        last_end = 0
+        for start, end, word in sorted(self.find_all(text), key=lambda m: (m[0], -m[1])):
+            if start >= last_end:
+                selected.append((start, end, word))
+                last_end = end
+        return selected
+    
+    @staticmethod
+    def _on_boundary(text: str, start: int, end: int, word: str) -> bool:
+        if not _is_word_char(word[0]) and not _is_word_char(word[-1]):
+            return True
+        if _is_word_char(word[0]) and start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if _is_word_char(word[-1]) and end < len(text) and _is_word_char(text[end]):
+            return False
+        return True
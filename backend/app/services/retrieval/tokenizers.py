@@ -0,0 +1,215 @@
+"""
+分词器 - BM25 使用的可插拔分词（CJK 二元组 / 词典分词，英文词干与停用词）
+"""
+import hashlib
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from ...core import metrics
+
+# 词典分词支持检测
+try:
+    import jieba
+    HAS_JIEBA = True
+except ImportError:
+    HAS_JIEBA = False
+
+
+# CJK 连续片段（中日韩统一表意文字、扩展 A、假名、谚文）或英文/数字单词，一次扫描
+_TOKEN_PATTERN = re.compile(
+    r'([\u3400-\u4dbf\u4e00-\u9fff\u3040-\u30ff\uac00-\ud7af]+)|([a-z0-9]+)'
+)
+
+ENGLISH_STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have he her his how i if
+in into is it its me my no not of on or our she so such than that the their them then there these
+they this those to too was we were what when where which who why will with would you your
+""".split())
+
+# 中文高频虚词（仅在词典分词下过滤，二元组中它们与相邻字组合仍有区分度）
+CHINESE_STOPWORDS = frozenset("的 了 和 是 在 也 就 都 而 及 与 着 或 一个 没有 我们 你们 他们 这个 那个 以及".split())
+
+
+def stem(word: str) -> str:
+    """
+    轻量英文词干提取（复数、-ing、-ed、-ly 等常见屈折后缀）
+    
+    只做保守的后缀剥离，保证同一词的常见变形映射到同一词干，
+    不追求语言学上的正确词根。
+    """
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("sses", "ches", "shes", "xes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    
+    for suffix in ("ingly", "edly", "ing", "ed", "ly"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            # running -> run, stopped -> stop
+            if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            break
+    return word
+
+
+class BaseTokenizer(ABC):
+    """
+    分词器基类
+    
+    tokenize 结果按文本摘要缓存（有界 LRU），混合索引重建、
+    重复上传的文档和重复查询不再重新分词。
+    """
+    
+    def __init__(self, stopwords: bool = True, stemming: bool = True,
+                 cache_size: int = 10000, **kwargs):
+        """
+        Args:
+            stopwords: 是否过滤英文停用词
+            stemming: 是否对英文单词做词干提取
+            cache_size: 分词结果缓存条数，0 表示不缓存
+        """
+        self.stopwords = stopwords
+        self.stemming = stemming
+        self.cache_size = cache_size
+        self.config = kwargs
+        self._cache: "OrderedDict[bytes, List[str]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+    
+    def tokenize(self, text: str) -> List[str]:
+        """分词（带缓存）"""
+        if not text:
+            return []
+        if not self.cache_size:
+            return self._tokenize(text)
+        
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._cache_lock:
+            tokens = self._cache.get(key)
+            if tokens is not None:
+                self._cache.move_to_end(key)
+        metrics.record_cache("tokenizer", tokens is not None)
+        if tokens is not None:
+            return tokens
+        
+        tokens = self._tokenize(text)
+        with self._cache_lock:
+            self._cache[key] = tokens
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+    
+    def _tokenize(self, text: str) -> List[str]:
+        tokens: List[str] = []
+        for cjk, word in _TOKEN_PATTERN.findall(text.lower()):
+            if cjk:
+                tokens.extend(self.tokenize_cjk(cjk))
+            elif not (self.stopwords and word in ENGLISH_STOPWORDS):
+                tokens.append(stem(word) if self.stemming else word)
+        return tokens
+    
+    @abstractmethod
+    def tokenize_cjk(self, text: str) -> Iterable[str]:
+        """切分一段连续的 CJK 文本"""
+        pass
+
+
+class CharTokenizer(BaseTokenizer):
+    """CJK 按字切分（原有行为，倒排表大、精度低）"""
+    
+    def tokenize_cjk(self, text: str) -> Iterable[str]:
+        return text
+
+
+class BigramTokenizer(BaseTokenizer):
+    """CJK 重叠二元组切分（单字片段保留单字），无需词典"""
+    
+    def __init__(self, unigrams: bool = False, **kwargs):
+        """
+        Args:
+            unigrams: 是否同时输出单字（提高单字查询召回，倒排表变大）
+        """
+        super().__init__(**kwargs)
+        self.unigrams = unigrams
+    
+    def tokenize_cjk(self, text: str) -> Iterable[str]:
+        if len(text) == 1:
+            return [text]
+        bigrams = [text[i:i + 2] for i in range(len(text) - 1)]
+        return list(text) + bigrams if self.unigrams else bigrams
+
+
+class DictionaryTokenizer(BaseTokenizer):
+    """CJK 词典分词（jieba，可加载用户词典）；未安装 jieba 时退化为二元组"""
+    
+    def __init__(self, user_dict: Optional[str] = None, **kwargs):
+        """
+        Args:
+            user_dict: 用户词典路径（jieba 格式：词 [词频] [词性]）
+        """
+        super().__init__(**kwargs)
+        self._fallback: Optional[BigramTokenizer] = None
+        if not HAS_JIEBA:
+            print("Warning: jieba not installed, falling back to bigram tokenizer. "
+                  "Please install: pip install jieba")
+            self._fallback = BigramTokenizer(cache_size=0)
+            return
+        
+        self._segmenter = jieba.Tokenizer()
+        if user_dict:
+            self._segmenter.load_userdict(user_dict)
+    
+    def tokenize_cjk(self, text: str) -> Iterable[str]:
+        if self._fallback is not None:
+            return self._fallback.tokenize_cjk(text)
+        return [
+            word for word in self._segmenter.cut(text, HMM=True)
+            if not (self.stopwords and word in CHINESE_STOPWORDS)
+        ]
+
+
+class TokenizerFactory:
+    """分词器工厂类"""
+    
+    _tokenizers: Dict[str, type] = {
+        "char": CharTokenizer,
+        "bigram": BigramTokenizer,
+        "dictionary": DictionaryTokenizer,
+    }
+    
+    @classmethod
+    def register_tokenizer(cls, name: str, tokenizer_class: type) -> None:
+        """
+        注册新的分词器
+        
+        Args:
+            name: 分词器名称
+            tokenizer_class: 分词器类
+        """
+        cls._tokenizers[name] = tokenizer_class
+    
+    @classmethod
+    def create_tokenizer(cls, type: str = "bigram", **config: Any) -> BaseTokenizer:
+        """
+        创建分词器实例
+        
+        Args:
+            type: 分词器名称
+            **config: 分词器参数
+        
+        Returns:
+            分词器实例
+        """
+        type = type.lower()
+        
+        if type not in cls._tokenizers:
+            raise ValueError(f"Unsupported tokenizer: {type}")
+        
+        return cls._tokenizers[type](**config)
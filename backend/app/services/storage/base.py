@@ -68,6 +68,24 @@ class BaseVectorDB(ABC):
         """
         pass
     
+    def search_batch(self, query_vectors: np.ndarray, top_k: int = 10,
+                     filter: Optional[Dict[str, Any]] = None) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        """
+        批量搜索（默认逐条调用 search，支持批量查询的后端应重写）
+        
+        Args:
+            query_vectors: 查询向量矩阵 (n, dim)
+            top_k: 每个查询返回的结果数量
+            filter: 过滤条件
+            
+        Returns:
+            每个查询的结果列表
+        """
+        return [
+            self.search(query_vector, top_k=top_k, filter=filter)
+            for query_vector in self.as_float32_matrix(query_vectors)
+        ]
+    
     @abstractmethod
     def delete(self, ids: List[str]) -> bool:
         """
@@ -94,6 +112,81 @@ class BaseVectorDB(ABC):
         """
         pass
     
+    def get_by_ids(self, ids: List[str]) -> Tuple[List[str], np.ndarray, List[Dict[str, Any]]]:
+        """
+        批量获取向量
+        
+        Args:
+            ids: 向量ID列表
+            
+        Returns:
+            (存在的ID列表, 向量矩阵, 元数据列表)
+        """
+        found_ids, vectors, metadatas = [], [], []
+        for id in ids:
+            result = self.get_by_id(id)
+            if result is not None:
+                found_ids.append(id)
+                vectors.append(result[0])
+                metadatas.append(result[1])
+        
+        if not vectors:
+            return [], np.empty((0, 0), dtype=np.float32), []
+        return found_ids, self.as_float32_matrix(np.vstack(vectors)), metadatas
+    
+    def search_subset(self, query_vector: np.ndarray, ids: List[str],
+                      top_k: int = 10) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """
+        在指定ID子集上精确检索（预过滤后的暴力扫描）
+        
+        分数与 search 保持一致: 1 - 平方 L2 距离
+        
+        Args:
+            query_vector: 查询向量
+            ids: 候选向量ID列表
+            top_k: 返回结果数量
+            
+        Returns:
+            结果列表 [(id, score, metadata), ...]
+        """
+        return self.search_subset_batch(query_vector, ids, top_k)[0]
+    
+    def search_subset_batch(self, query_vectors: np.ndarray, ids: List[str],
+                            top_k: int = 10) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        """
+        多个查询在同一ID子集上精确检索（候选向量只读取一次）
+        
+        Args:
+            query_vectors: 查询向量矩阵 (n, dim)
+            ids: 候选向量ID列表
+            top_k: 每个查询返回的结果数量
+            
+        Returns:
+            每个查询的结果列表
+        """
+        queries = self.as_float32_matrix(query_vectors)
+        if not ids or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+        
+        found_ids, vectors, metadatas = self.get_by_ids(ids)
+        if not found_ids:
+            return [[] for _ in range(len(queries))]
+        
+        # 1 - |v - q|^2 = 1 - (|v|^2 + |q|^2 - 2 v·q)
+        scores = 1.0 - (
+            np.einsum("ij,ij->i", queries, queries)[:, None]
+            + np.einsum("ij,ij->i", vectors, vectors)[None, :]
+            - 2.0 * (queries @ vectors.T)
+        )
+        
+        k = min(top_k, len(found_ids))
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results.append([(found_ids[i], float(row[i]), metadatas[i]) for i in top])
+        return results
+    
     @abstractmethod
     def count(self) -> int:
         """获取向量总数"""
@@ -107,3 +200,22 @@ class BaseVectorDB(ABC):
     def close(self) -> None:
         """关闭连接"""
         pass
+    
+    @staticmethod
+    def as_float32_matrix(vectors: np.ndarray) -> np.ndarray:
+        """
+        转换为连续的 float32 二维数组
+        
+        已经是 C 连续 float32 的数组不会发生拷贝，后端可直接使用其缓冲区，
+        避免逐个元素装箱为 Python float。
+        
+        Args:
+            vectors: 单个向量或向量数组
+            
+        Returns:
+            形状为 (n, dim) 的 float32 数组
+        """
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        return matrix
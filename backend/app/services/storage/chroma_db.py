@@ -15,6 +15,8 @@ class ChromaVectorDB(BaseVectorDB):
     def __init__(self, **config):
         super().__init__(**config)
         self.persist_directory = config.get("persist_directory", "./data/chroma")
+        # 旧版 ChromaDB (<0.5) 只接受嵌套列表，首次被拒绝后回退到 tolist()
+        self._accepts_ndarray = True
         self.connect()
     
     def connect(self) -> None:
@@ -49,6 +51,8 @@ class ChromaVectorDB(BaseVectorDB):
     def insert(self, vectors: np.ndarray, metadatas: List[Dict[str, Any]], 
               ids: Optional[List[str]] = None) -> List[str]:
         """插入向量"""
+        vectors = self.as_float32_matrix(vectors)
+        
         if self.collection is None:
             self.create_collection(dimension=vectors.shape[1])
         
@@ -57,9 +61,6 @@ class ChromaVectorDB(BaseVectorDB):
             import uuid
             ids = [str(uuid.uuid4()) for _ in range(len(vectors))]
         
-        # 转换向量为列表
-        embeddings = vectors.tolist()
-        
         # 清理 metadata - ChromaDB 不接受 None 值
         cleaned_metadatas = []
         for metadata in metadatas:
@@ -72,9 +73,11 @@ class ChromaVectorDB(BaseVectorDB):
         
         # 插入数据
         try:
-            self.collection.add(
+            self._call_with_embeddings(
+                self.collection.add,
+                "embeddings",
+                vectors,
                 ids=ids,
-                embeddings=embeddings,
                 metadatas=cleaned_metadatas
             )
             return ids
@@ -85,32 +88,40 @@ class ChromaVectorDB(BaseVectorDB):
     def search(self, query_vector: np.ndarray, top_k: int = 10,
               filter: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
         """搜索相似向量"""
+        return self.search_batch(query_vector, top_k=top_k, filter=filter)[0]
+    
+    def search_batch(self, query_vectors: np.ndarray, top_k: int = 10,
+                     filter: Optional[Dict[str, Any]] = None) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        """批量搜索（一次 query 调用传入全部查询向量）"""
+        # 确保查询向量是 (n, dim) 的 float32 数组
+        query_vectors = self.as_float32_matrix(query_vectors)
+        empty = [[] for _ in range(len(query_vectors))]
         if self.collection is None:
-            return []
-        
-        # 确保查询向量是一维的
-        if len(query_vector.shape) == 1:
-            query_vector = query_vector.reshape(1, -1)
+            return empty
         
         try:
-            results = self.collection.query(
-                query_embeddings=query_vector.tolist(),
+            results = self._call_with_embeddings(
+                self.collection.query,
+                "query_embeddings",
+                query_vectors,
                 n_results=top_k,
                 where=filter
             )
             
             # 格式化结果
             formatted_results = []
-            if results['ids'] and len(results['ids']) > 0:
-                for i, id in enumerate(results['ids'][0]):
-                    score = 1.0 - results['distances'][0][i]  # ChromaDB 返回距离，转换为相似度
-                    metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                    formatted_results.append((id, score, metadata))
+            for q, ids in enumerate(results['ids'] or []):
+                # ChromaDB 返回距离，整体转换为相似度
+                scores = 1.0 - np.asarray(results['distances'][q], dtype=np.float32)
+                metadatas = results['metadatas'][q] if results['metadatas'] else [{}] * len(ids)
+                formatted_results.append([
+                    (id, float(scores[i]), metadatas[i]) for i, id in enumerate(ids)
+                ])
             
-            return formatted_results
+            return formatted_results or empty
         except Exception as e:
             print(f"Error searching vectors: {e}")
-            return []
+            return empty
     
     def delete(self, ids: List[str]) -> bool:
         """删除向量"""
@@ -136,7 +147,8 @@ class ChromaVectorDB(BaseVectorDB):
             )
             
             if results['ids']:
-                vector = np.array(results['embeddings'][0])
+                # 新版 ChromaDB 直接返回 ndarray，此时不会发生拷贝
+                vector = np.asarray(results['embeddings'][0], dtype=np.float32)
                 metadata = results['metadatas'][0] if results['metadatas'] else {}
                 return (vector, metadata)
             
@@ -145,6 +157,27 @@ class ChromaVectorDB(BaseVectorDB):
             print(f"Error getting vector by id: {e}")
             return None
     
+    def get_by_ids(self, ids: List[str]) -> Tuple[List[str], np.ndarray, List[Dict[str, Any]]]:
+        """批量获取向量（单次查询）"""
+        if self.collection is None or not ids:
+            return [], np.empty((0, 0), dtype=np.float32), []
+        
+        try:
+            results = self.collection.get(
+                ids=list(ids),
+                include=["embeddings", "metadatas"]
+            )
+            
+            if not results['ids']:
+                return [], np.empty((0, 0), dtype=np.float32), []
+            
+            vectors = self.as_float32_matrix(results['embeddings'])
+            metadatas = results['metadatas'] or [{} for _ in results['ids']]
+            return list(results['ids']), vectors, metadatas
+        except Exception as e:
+            print(f"Error getting vectors by ids: {e}")
+            return [], np.empty((0, 0), dtype=np.float32), []
+    
     def count(self) -> int:
         """获取向量总数"""
         if self.collection is None:
@@ -168,6 +201,25 @@ class ChromaVectorDB(BaseVectorDB):
         except Exception as e:
             print(f"Error clearing collection: {e}")
     
+    def _call_with_embeddings(self, method, arg_name: str, vectors: np.ndarray, **kwargs):
+        """
+        以 ndarray 形式传递向量调用 ChromaDB
+        
+        ChromaDB >= 0.5 接受 numpy 数组，逐行视图不会复制数据；
+        旧版本会拒绝数组参数，此时回退到列表转换并记住该行为。
+        """
+        if self._accepts_ndarray:
+            try:
+                return method(**{arg_name: list(vectors)}, **kwargs)
+            except ValueError as e:
+                # 旧版校验错误: "Expected embeddings to be a list, got ..."
+                if "to be a list" not in str(e):
+                    raise
+                print(f"ChromaDB does not accept ndarray embeddings, falling back to lists: {e}")
+                self._accepts_ndarray = False
+        
+        return method(**{arg_name: vectors.tolist()}, **kwargs)
+    
     def close(self) -> None:
         """关闭连接"""
         # ChromaDB 不需要显式关闭
@@ -5,6 +5,8 @@ from typing import Dict, Any
 
 from .base import BaseVectorDB
 from .chroma_db import ChromaVectorDB
+from .sharded_db import ShardedVectorDB
+from .segment_db import SegmentVectorDB
 
 
 class VectorDBFactory:
@@ -12,6 +14,8 @@ class VectorDBFactory:
     
     _databases: Dict[str, type] = {
         "chroma": ChromaVectorDB,
+        "sharded": ShardedVectorDB,
+        "segment": SegmentVectorDB,
     }
     
     @classmethod
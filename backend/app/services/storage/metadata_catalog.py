@@ -0,0 +1,444 @@
+"""
+文件元数据目录 - 基于 SQLite 的持久化存储
+"""
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    file_type TEXT,
+    file_path TEXT,
+    status TEXT NOT NULL,
+    content_hash TEXT,
+    upload_time REAL,
+    processing_time REAL,
+    vector_count INTEGER NOT NULL DEFAULT 0,
+    vector_ids TEXT NOT NULL DEFAULT '[]',
+    vector_spaces TEXT NOT NULL DEFAULT '{}',
+    tags TEXT NOT NULL DEFAULT '[]',
+    error TEXT,
+    metadata TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_files_file_type ON files(file_type);
+CREATE INDEX IF NOT EXISTS idx_files_status ON files(status);
+CREATE INDEX IF NOT EXISTS idx_files_content_hash ON files(content_hash);
+CREATE TABLE IF NOT EXISTS chunks (
+    vector_id TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    modality TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    content TEXT NOT NULL,
+    metadata TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_file_id ON chunks(file_id, position);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_COLUMNS = (
+    "file_id", "filename", "file_type", "file_path", "status", "content_hash",
+    "upload_time", "processing_time", "vector_count", "vector_ids", "vector_spaces",
+    "tags", "error", "metadata"
+)
+
+# 旧版本数据库缺少的列: 表名 -> {列名: 定义}
+_MIGRATIONS = {
+    "files": {
+        "vector_spaces": "TEXT NOT NULL DEFAULT '{}'",
+    },
+    "chunks": {
+        "metadata": "TEXT NOT NULL DEFAULT '{}'",
+    },
+}
+
+_UPSERT_SQL = (
+    f"INSERT OR REPLACE INTO files ({', '.join(_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in _COLUMNS)})"
+)
+_SELECT_SQL = f"SELECT {', '.join(_COLUMNS)} FROM files"
+
+# 单条 SQL 的参数个数上限（旧版 SQLite 为 999）
+_MAX_SQL_PARAMS = 900
+
+
+class MetadataCatalog(MutableMapping):
+    """
+    文件元数据目录
+    
+    以 file_id 为键的字典接口，数据持久化在 SQLite（WAL 模式）中，
+    多个 worker 进程共享同一数据库文件。前端有一个有界 LRU 缓存，
+    其他连接提交写入后（PRAGMA data_version 变化）缓存自动失效。
+    """
+    
+    def __init__(self, path: str = "./data/metadata.db", cache_size: int = 1000):
+        """
+        初始化元数据目录
+        
+        Args:
+            path: SQLite 数据库文件路径
+            cache_size: 进程内缓存的最大记录数
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._data_version = None
+        self.connect()
+    
+    def connect(self) -> None:
+        """打开数据库连接并初始化表结构"""
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        
+        self._conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            timeout=30,
+            cached_statements=64
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._conn.commit()
+        self._data_version = self._read_data_version()
+    
+    def _migrate(self) -> None:
+        """为旧版本数据库补充新增的列"""
+        for table, columns in _MIGRATIONS.items():
+            existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for column, definition in columns.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
+    def close(self) -> None:
+        """关闭连接"""
+        with self._lock:
+            self._conn.close()
+    
+    # ---- 缓存一致性 ----
+    
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+    
+    def data_version(self) -> int:
+        """
+        返回数据版本号
+        
+        其他连接（其他 worker）提交写入后该值会变化，同时清空本地缓存。
+        """
+        with self._lock:
+            version = self._read_data_version()
+            if version != self._data_version:
+                self._cache.clear()
+                self._data_version = version
+            return version
+    
+    def _cache_put(self, file_id: str, record: Dict[str, Any]) -> None:
+        self._cache[file_id] = record
+        self._cache.move_to_end(file_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    # ---- 行与记录转换 ----
+    
+    @staticmethod
+    def _to_row(file_id: str, record: Dict[str, Any]) -> tuple:
+        status = record.get("status", "")
+        vector_ids = list(record.get("vector_ids", []))
+        return (
+            file_id,
+            record.get("filename", ""),
+            record.get("file_type"),
+            record.get("file_path"),
+            getattr(status, "value", status),
+            record.get("content_hash"),
+            record.get("upload_time"),
+            record.get("processing_time"),
+            record.get("vector_count", len(vector_ids)),
+            json.dumps(vector_ids),
+            json.dumps(record.get("vector_spaces", {})),
+            json.dumps(list(record.get("tags", []) or []), ensure_ascii=False),
+            record.get("error"),
+            json.dumps(record.get("metadata", {}), ensure_ascii=False, default=str)
+        )
+    
+    @staticmethod
+    def _from_row(row: tuple) -> Dict[str, Any]:
+        record = dict(zip(_COLUMNS, row))
+        record["vector_ids"] = json.loads(record["vector_ids"])
+        record["vector_spaces"] = json.loads(record["vector_spaces"])
+        record["tags"] = json.loads(record["tags"])
+        record["metadata"] = json.loads(record["metadata"])
+        # 保持与原内存字典相同的结构：空字段不出现
+        return {k: v for k, v in record.items() if v is not None}
+    
+    # ---- MutableMapping 接口 ----
+    
+    def __getitem__(self, file_id: str) -> Dict[str, Any]:
+        with self._lock:
+            self.data_version()
+            record = self._cache.get(file_id)
+            if record is not None:
+                self._cache.move_to_end(file_id)
+                return record
+            
+            row = self._conn.execute(f"{_SELECT_SQL} WHERE file_id = ?", (file_id,)).fetchone()
+            if row is None:
+                raise KeyError(file_id)
+            
+            record = self._from_row(row)
+            self._cache_put(file_id, record)
+            return record
+    
+    def __setitem__(self, file_id: str, record: Dict[str, Any]) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute(_UPSERT_SQL, self._to_row(file_id, record))
+            self._cache_put(file_id, record)
+    
+    def __delitem__(self, file_id: str) -> None:
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+                self._conn.execute("DELETE FROM chunks WHERE file_id = ?", (file_id,))
+            self._cache.pop(file_id, None)
+            if cursor.rowcount == 0:
+                raise KeyError(file_id)
+    
+    def __contains__(self, file_id: object) -> bool:
+        with self._lock:
+            self.data_version()
+            if file_id in self._cache:
+                return True
+            row = self._conn.execute("SELECT 1 FROM files WHERE file_id = ?", (file_id,)).fetchone()
+            return row is not None
+    
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute("SELECT file_id FROM files")]
+        return iter(ids)
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+    
+    def items(self) -> List[tuple]:
+        """一次查询返回全部 (file_id, record)，避免逐条查询"""
+        return [(record["file_id"], record) for record in self.records()]
+    
+    def values(self) -> List[Dict[str, Any]]:
+        return self.records()
+    
+    # ---- 查询 ----
+    
+    def records(self, file_type: Optional[str] = None,
+                status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        按条件列出记录
+        
+        Args:
+            file_type: 文件类型过滤
+            status: 处理状态过滤
+        
+        Returns:
+            记录列表
+        """
+        clauses, params = [], []
+        if file_type is not None:
+            clauses.append("file_type = ?")
+            params.append(file_type)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(getattr(status, "value", status))
+        
+        sql = _SELECT_SQL
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        
+        with self._lock:
+            return [self._from_row(row) for row in self._conn.execute(sql, params)]
+    
+    def file_ids(self, status: Optional[str] = None) -> Set[str]:
+        """按处理状态列出 file_id（只读主键列，用于与进程内索引做差量同步）"""
+        sql, params = "SELECT file_id FROM files", []
+        if status is not None:
+            sql += " WHERE status = ?"
+            params.append(getattr(status, "value", status))
+        with self._lock:
+            return {row[0] for row in self._conn.execute(sql, params)}
+    
+    def records_by_ids(self, file_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """按 file_id 批量读取记录（不存在的 file_id 忽略）"""
+        file_ids = list(file_ids)
+        records = []
+        with self._lock:
+            for start in range(0, len(file_ids), _MAX_SQL_PARAMS):
+                batch = file_ids[start:start + _MAX_SQL_PARAMS]
+                rows = self._conn.execute(
+                    f"{_SELECT_SQL} WHERE file_id IN ({', '.join('?' for _ in batch)})", batch
+                )
+                records.extend(self._from_row(row) for row in rows)
+        return records
+    
+    def find_by_hash(self, content_hash: str) -> List[Dict[str, Any]]:
+        """根据内容哈希查找记录"""
+        with self._lock:
+            rows = self._conn.execute(f"{_SELECT_SQL} WHERE content_hash = ?", (content_hash,))
+            return [self._from_row(row) for row in rows]
+    
+    def count_by_type(self) -> Dict[str, int]:
+        """按文件类型统计文件数"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT COALESCE(file_type, 'unknown'), COUNT(*) FROM files GROUP BY file_type"
+            )
+            return {file_type: count for file_type, count in rows}
+    
+    def total_vectors(self) -> int:
+        """向量总数"""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(vector_count), 0) FROM files").fetchone()[0]
+    
+    def update_vector_spaces(self, vector_spaces: Dict[str, Dict[str, List[str]]]) -> None:
+        """
+        在一个事务中批量更新文件的向量分组（重建索引切换时使用）
+        
+        Args:
+            vector_spaces: file_id -> {向量空间: [向量ID]}
+        """
+        with self._lock:
+            with self._conn:
+                self._write_vector_spaces(vector_spaces)
+            self._cache.clear()
+    
+    def _write_vector_spaces(self, vector_spaces: Dict[str, Dict[str, List[str]]]) -> None:
+        for file_id, spaces in vector_spaces.items():
+            vector_ids = [id for ids in spaces.values() for id in ids]
+            self._conn.execute(
+                "UPDATE files SET vector_spaces = ?, vector_ids = ?, vector_count = ? WHERE file_id = ?",
+                (json.dumps(spaces), json.dumps(vector_ids), len(vector_ids), file_id)
+            )
+    
+    def _active_generation(self) -> int:
+        row = self._conn.execute("SELECT value FROM state WHERE key = 'active_index'").fetchone()
+        return json.loads(row[0])["generation"] if row else 0
+    
+    def put_if_generation(self, file_id: str, record: Dict[str, Any], generation: int) -> bool:
+        """
+        当前索引代数仍为 generation 时写入记录（与 switch_active_index 在同一写锁下串行）
+        
+        Returns:
+            是否已写入；为 False 时其他 worker 已切换索引，调用方需写入新索引后重试
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                if self._active_generation() != generation:
+                    return False
+                self._conn.execute(_UPSERT_SQL, self._to_row(file_id, record))
+            self._cache_put(file_id, record)
+            return True
+    
+    def switch_active_index(self, active: Dict[str, Any], vector_spaces: Dict[str, Dict[str, List[str]]],
+                            status: str) -> Tuple[Set[str], Set[str]]:
+        """
+        在一个写事务中检查迁移是否完整并切换当前索引（重建索引切换时使用）
+        
+        事务开始后其他 worker 的 put_if_generation 只能在切换之前或之后提交：
+        之前提交的文件在这里被发现，之后提交的文件会写入新索引。
+        
+        Args:
+            active: 新的 active_index 状态（含 generation）
+            vector_spaces: 已迁移文件的 file_id -> {向量空间: [向量ID]}
+            status: 需要迁移的文件的处理状态（已完成）
+        
+        Returns:
+            (未迁移的已完成文件, 已迁移但已删除的文件)；前者非空时不切换
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                current = {
+                    row[0] for row in self._conn.execute(
+                        "SELECT file_id FROM files WHERE status = ?", (getattr(status, "value", status),)
+                    )
+                }
+                uploaded = current - set(vector_spaces)
+                if uploaded:
+                    return uploaded, set()
+                self._write_vector_spaces({id: vector_spaces[id] for id in current})
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO state (key, value) VALUES ('active_index', ?)",
+                    (json.dumps(active, ensure_ascii=False),)
+                )
+            self._cache.clear()
+            return set(), set(vector_spaces) - current
+    
+    # ---- 分块内容 ----
+    
+    def put_chunks(self, file_id: str, chunks: List[Dict[str, Any]]) -> None:
+        """
+        保存文件的待嵌入内容（替换已有内容），用于更换模型后重新嵌入
+        
+        Args:
+            file_id: 文件ID
+            chunks: [{"vector_id", "modality", "kind": text/image, "content", "metadata"}]，
+                按向量顺序；metadata 为可选的单个向量元数据（如视频帧时间戳）
+        """
+        rows = [
+            (c["vector_id"], file_id, position, c["modality"], c["kind"], c["content"],
+             json.dumps(c.get("metadata") or {}, ensure_ascii=False))
+            for position, c in enumerate(chunks)
+        ]
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM chunks WHERE file_id = ?", (file_id,))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chunks "
+                    "(vector_id, file_id, position, modality, kind, content, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+    
+    def get_chunks(self, file_id: str) -> List[Dict[str, Any]]:
+        """按向量顺序返回文件的待嵌入内容"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT vector_id, modality, kind, content, metadata FROM chunks "
+                "WHERE file_id = ? ORDER BY position",
+                (file_id,)
+            )
+            return [
+                {"vector_id": vector_id, "modality": modality, "kind": kind, "content": content,
+                 "metadata": json.loads(metadata)}
+                for vector_id, modality, kind, content, metadata in rows
+            ]
+    
+    # ---- 服务状态 ----
+    
+    def get_state(self, key: str, default: Any = None) -> Any:
+        """读取持久化的服务状态（JSON）"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+    
+    def set_state(self, key: str, value: Any) -> None:
+        """写入持久化的服务状态（JSON）"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False))
+                )
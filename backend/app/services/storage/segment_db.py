@@ -0,0 +1,819 @@
+"""
+段式向量存储 - LSM 风格的不可变索引段 + 内存映射读取
+
+单写多读:
+- 新写入先进入内存段（memtable），达到 flush_size 或 flush_interval 后落盘为不可变段
+- 写入方在文件锁保护下写入新段，并原子替换 manifest（版本号 +1）
+- 删除写入每个段的墓碑位图（tombstone），段文件本身不被修改；删除的 ID 和时间同时
+  记入 manifest，其他写入方的内存段在重新加载和落盘时丢弃删除之前写入的同名向量
+- 后台压缩线程合并小段、清理墓碑，并为大段重建 HNSW 图，不占用查询路径
+- 各 worker 以只读方式 mmap 段文件，检测到版本变化时重新加载
+多个进程共享操作系统页缓存中的同一份向量数据，而不是各自持有一份副本。
+
+目录结构:
+    index_dir/
+        manifest.json          {"version", "dimension", "segments", "obsolete", "deleted"}
+        writer.lock
+        compaction.lock
+        segments/seg_00000001/
+            vectors.npy        float32 (n, dim)
+            norms.npy          float32 (n,)  平方范数
+            ids.json
+            metadatas.json
+            hnsw.bin           可选，HNSW 图（行号为标签）
+            tombstones_<version>.npy   可选，packbits 后的删除位图
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+from .base import BaseVectorDB
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:  # Windows
+    HAS_FCNTL = False
+
+# HNSW 支持检测（chromadb 依赖的 chroma-hnswlib 提供该模块）
+try:
+    import hnswlib
+    HAS_HNSWLIB = True
+except ImportError:
+    HAS_HNSWLIB = False
+
+
+class _Segment:
+    """已加载的只读段"""
+    
+    def __init__(self, path: Path, count: int):
+        self.path = path
+        self.name = path.name
+        self.count = count
+        self.vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        self.norms = np.load(path / "norms.npy", mmap_mode="r")
+        with open(path / "ids.json", "r", encoding="utf-8") as f:
+            self.ids: List[str] = json.load(f)
+        with open(path / "metadatas.json", "r", encoding="utf-8") as f:
+            self.metadatas: List[Dict[str, Any]] = json.load(f)
+        
+        self.ann = None
+        ann_path = path / "hnsw.bin"
+        if HAS_HNSWLIB and ann_path.exists():
+            self.ann = hnswlib.Index(space="l2", dim=self.vectors.shape[1])
+            self.ann.load_index(str(ann_path), max_elements=count)
+        
+        self._tombstones: Dict[str, np.ndarray] = {}
+    
+    def tombstones(self, filename: Optional[str]) -> np.ndarray:
+        """加载墓碑位图（按文件名缓存，文件不可变）"""
+        if filename is None:
+            return np.zeros(self.count, dtype=bool)
+        if filename not in self._tombstones:
+            packed = np.load(self.path / filename)
+            self._tombstones = {filename: np.unpackbits(packed, count=self.count).astype(bool)}
+        return self._tombstones[filename]
+
+
+class _IndexState:
+    """某一版本 manifest 对应的只读视图"""
+    
+    def __init__(self, version: int, dimension: int, segments: List[_Segment],
+                 entries: List[Dict[str, Any]], live: List[np.ndarray],
+                 locations: Dict[str, Tuple[int, int]],
+                 deleted: Optional[Dict[str, float]] = None):
+        self.version = version
+        self.dimension = dimension
+        self.segments = segments
+        self.entries = entries  # manifest 中的段描述
+        self.live = live  # 每段的存活掩码（墓碑 + 新段覆盖旧段）
+        self.dead = [int(s.count - m.sum()) for s, m in zip(segments, live)]
+        self.locations = locations  # id -> (段下标, 行号)
+        self.deleted = deleted or {}  # id -> 删除时间（墙钟）
+
+
+class _MemTable:
+    """内存段：尚未落盘的写入，仅对当前进程可见"""
+    
+    def __init__(self):
+        self.ids: List[str] = []
+        self.vectors: List[np.ndarray] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.inserted: List[float] = []  # 写入时间（墙钟），与其他进程的删除时间比较
+        self.positions: Dict[str, int] = {}
+        self.created = time.monotonic()
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def add(self, vectors, ids: List[str], metadatas: List[Dict[str, Any]],
+            inserted: Optional[List[float]] = None) -> None:
+        if any(id in self.positions for id in ids):
+            self.remove(ids)
+        now = time.time()
+        for i, (vector, id, metadata) in enumerate(zip(vectors, ids, metadatas)):
+            self.positions[id] = len(self.ids)
+            self.ids.append(id)
+            self.vectors.append(vector)
+            self.metadatas.append(metadata)
+            self.inserted.append(inserted[i] if inserted is not None else now)
+    
+    def remove(self, ids: List[str]) -> None:
+        doomed = {id for id in ids if id in self.positions}
+        if doomed:
+            self._keep([i for i, id in enumerate(self.ids) if id not in doomed])
+    
+    def purge(self, deleted: Dict[str, float]) -> None:
+        """丢弃删除时间之前写入的向量（删除可能来自其他进程）"""
+        if not deleted or not any(id in deleted for id in self.ids):
+            return
+        self._keep([
+            i for i, id in enumerate(self.ids)
+            if id not in deleted or deleted[id] <= self.inserted[i]
+        ])
+    
+    def _keep(self, keep: List[int]) -> None:
+        self.ids = [self.ids[i] for i in keep]
+        self.vectors = [self.vectors[i] for i in keep]
+        self.metadatas = [self.metadatas[i] for i in keep]
+        self.inserted = [self.inserted[i] for i in keep]
+        self.positions = {id: i for i, id in enumerate(self.ids)}
+    
+    def matrix(self) -> np.ndarray:
+        return np.vstack(self.vectors).astype(np.float32, copy=False)
+
+
+class SegmentVectorDB(BaseVectorDB):
+    """LSM 风格的不可变段 + mmap 向量存储（单写多读）"""
+    
+    def __init__(self, **config):
+        """
+        Args:
+            index_dir: 索引目录
+            role: writer（可写，默认，多个进程可同时为 writer）或 reader（只读）
+            reload_interval: 检查 manifest 版本的最小间隔（秒）
+            flush_size: 内存段达到该行数时立即落盘
+            flush_interval: 内存段最长驻留时间（秒）
+            max_segments: 段数超过该值时合并最小的段
+            max_tombstone_ratio: 段内删除比例超过该值时重写该段
+            compaction_interval: 后台压缩检查间隔（秒）
+            ann_min_size: 段大小达到该值时构建 HNSW 图
+            ann_ef: HNSW 检索时的 ef 参数
+            gc_grace: 被替换的段保留时间（秒），等待读取方切换到新版本
+        """
+        super().__init__(**config)
+        self.index_dir = Path(config.get("index_dir", "./data/segments"))
+        self.role = config.get("role", "writer")
+        self.reload_interval = float(config.get("reload_interval", 1.0))
+        self.flush_size = int(config.get("flush_size", 1000))
+        self.flush_interval = float(config.get("flush_interval", 5.0))
+        self.max_segments = int(config.get("max_segments", 8))
+        self.max_tombstone_ratio = float(config.get("max_tombstone_ratio", 0.2))
+        self.compaction_interval = float(config.get("compaction_interval", 30.0))
+        self.ann_min_size = int(config.get("ann_min_size", 10000))
+        self.ann_ef = int(config.get("ann_ef", 64))
+        self.gc_grace = float(config.get("gc_grace", 60.0))
+        
+        self._state = _IndexState(0, 0, [], [], [], {})
+        self._manifest_stamp = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._memtable = _MemTable()
+        self._flushing: Optional[_MemTable] = None  # 正在落盘的内存段，落盘完成前仍可检索
+        self._mem_lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._background: Optional[threading.Thread] = None
+        self.connect()
+    
+    # ---- manifest ----
+    
+    @property
+    def manifest_path(self) -> Path:
+        return self.index_dir / "manifest.json"
+    
+    @property
+    def segments_dir(self) -> Path:
+        return self.index_dir / "segments"
+    
+    def connect(self) -> None:
+        """打开索引目录、加载当前版本，写入方启动后台刷盘/压缩线程"""
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        self._refresh(force=True)
+        
+        if self.role == "writer":
+            self._background = threading.Thread(
+                target=self._background_loop,
+                name="segment-maintenance",
+                daemon=True
+            )
+            self._background.start()
+    
+    def _read_manifest(self) -> Dict[str, Any]:
+        if not self.manifest_path.exists():
+            return {"version": 0, "dimension": 0, "segments": [], "obsolete": [], "deleted": {}}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest.setdefault("obsolete", [])
+        manifest.setdefault("deleted", {})
+        return manifest
+    
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        """原子发布新版本 manifest"""
+        tmp_path = self.manifest_path.with_suffix(f".tmp.{os.getpid()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+    
+    def _stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.manifest_path.stat()
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+    
+    def _refresh(self, force: bool = False) -> _IndexState:
+        """
+        manifest 变化时重新加载（版本号升高）
+        
+        检查频率受 reload_interval 限制，查询路径上只有一次 stat 调用。
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < self.reload_interval:
+            return self._state
+        
+        with self._reload_lock:
+            self._last_check = now
+            stamp = self._stamp()
+            if not force and stamp == self._manifest_stamp:
+                return self._state
+            
+            manifest = self._read_manifest()
+            if force or manifest["version"] != self._state.version:
+                self._state = self._load_state(manifest)
+                # 其他进程删除的向量可能还在本进程的内存段中
+                with self._mem_lock:
+                    self._memtable.purge(self._state.deleted)
+            self._manifest_stamp = stamp
+            return self._state
+    
+    def _load_state(self, manifest: Dict[str, Any]) -> _IndexState:
+        # 复用未变化的段，避免重复 mmap 和解析 JSON
+        loaded = {segment.name: segment for segment in self._state.segments}
+        segments = []
+        for entry in manifest["segments"]:
+            segment = loaded.get(entry["name"])
+            if segment is None:
+                segment = _Segment(self.segments_dir / entry["name"], entry["count"])
+            segments.append(segment)
+        
+        live = [
+            ~segment.tombstones(entry.get("tombstones"))
+            for segment, entry in zip(segments, manifest["segments"])
+        ]
+        
+        # 构建ID定位表：同一ID出现在多个段时以最新段为准，旧行视为删除
+        locations: Dict[str, Tuple[int, int]] = {}
+        for seg_index, segment in enumerate(segments):
+            mask = live[seg_index]
+            for row, id in enumerate(segment.ids):
+                if not mask[row]:
+                    continue
+                previous = locations.get(id)
+                if previous is not None:
+                    live[previous[0]][previous[1]] = False
+                locations[id] = (seg_index, row)
+        
+        return _IndexState(
+            manifest["version"], manifest["dimension"], segments,
+            manifest["segments"], live, locations, manifest.get("deleted")
+        )
+    
+    @contextmanager
+    def _file_lock(self, name: str, blocking: bool = True):
+        """跨进程文件锁；非阻塞模式下获取失败时产出 False"""
+        with open(self.index_dir / name, "a+") as lock_file:
+            acquired = True
+            if HAS_FCNTL:
+                flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                try:
+                    fcntl.flock(lock_file, flags)
+                except BlockingIOError:
+                    acquired = False
+            try:
+                yield acquired
+            finally:
+                if HAS_FCNTL and acquired:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    @contextmanager
+    def _writer_lock(self):
+        """跨进程写锁，保证同一时刻只有一个写入方修改 manifest"""
+        self._check_writable()
+        with self._file_lock("writer.lock"):
+            yield self._read_manifest()
+    
+    def _check_writable(self) -> None:
+        if self.role != "writer":
+            raise PermissionError("Segment index opened read-only (role=reader)")
+    
+    def _write_segment(self, name: str, vectors: np.ndarray, ids: List[str],
+                       metadatas: List[Dict[str, Any]]) -> None:
+        """写入不可变段（先写临时目录再重命名），足够大时同时构建 HNSW 图"""
+        tmp_dir = self.segments_dir / f".{name}.tmp.{os.getpid()}"
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+        
+        np.save(tmp_dir / "vectors.npy", vectors)
+        np.save(tmp_dir / "norms.npy", np.einsum("ij,ij->i", vectors, vectors))
+        with open(tmp_dir / "ids.json", "w", encoding="utf-8") as f:
+            json.dump(ids, f, ensure_ascii=False)
+        with open(tmp_dir / "metadatas.json", "w", encoding="utf-8") as f:
+            json.dump(metadatas, f, ensure_ascii=False, default=str)
+        
+        if HAS_HNSWLIB and len(ids) >= self.ann_min_size:
+            ann = hnswlib.Index(space="l2", dim=vectors.shape[1])
+            ann.init_index(max_elements=len(ids), ef_construction=200, M=16)
+            ann.add_items(vectors, np.arange(len(ids)))
+            ann.save_index(str(tmp_dir / "hnsw.bin"))
+        
+        os.replace(tmp_dir, self.segments_dir / name)
+    
+    def _write_tombstones(self, segment: _Segment, dead: np.ndarray, version: int) -> str:
+        filename = f"tombstones_{version:08d}.npy"
+        np.save(segment.path / filename, np.packbits(dead))
+        return filename
+    
+    # ---- 刷盘 / 压缩 / 回收 ----
+    
+    def flush(self) -> None:
+        """将内存段落盘为新的不可变段（落盘期间不阻塞检索）"""
+        with self._flush_lock:
+            with self._mem_lock:
+                if not len(self._memtable):
+                    self._memtable.created = time.monotonic()
+                    return
+                memtable = self._memtable
+                self._flushing = memtable
+                self._memtable = _MemTable()
+            
+            try:
+                with self._writer_lock() as manifest:
+                    # 内存段驻留期间其他进程可能已删除其中的向量
+                    memtable.purge(manifest["deleted"])
+                    if not len(memtable):
+                        return
+                    vectors = memtable.matrix()
+                    if manifest["dimension"] and manifest["dimension"] != vectors.shape[1]:
+                        raise ValueError(
+                            f"Vector dimension {vectors.shape[1]} does not match index dimension {manifest['dimension']}"
+                        )
+                    
+                    version = manifest["version"] + 1
+                    name = f"seg_{version:08d}"
+                    self._write_segment(name, vectors, memtable.ids, memtable.metadatas)
+                    
+                    manifest["version"] = version
+                    manifest["dimension"] = vectors.shape[1]
+                    manifest["segments"].append({"name": name, "count": len(memtable)})
+                    self._write_manifest(manifest)
+                
+                self._refresh(force=True)
+            except Exception:
+                # 落盘失败时放回内存段，等待下次重试
+                with self._mem_lock:
+                    memtable.add(self._memtable.vectors, self._memtable.ids, self._memtable.metadatas,
+                                 self._memtable.inserted)
+                    self._memtable = memtable
+                raise
+            finally:
+                with self._mem_lock:
+                    self._flushing = None
+    
+    def compact(self) -> bool:
+        """
+        合并段并清理墓碑
+        
+        - 删除比例超过 max_tombstone_ratio 的段被重写
+        - 段数超过 max_segments 时合并最小的若干段
+        合并结果在锁外构建，发布前再次读取 manifest 并应用期间新增的删除。
+        
+        Returns:
+            是否执行了合并
+        """
+        self._check_writable()
+        
+        with self._file_lock("compaction.lock", blocking=False) as acquired:
+            if not acquired:
+                return False  # 其他进程正在压缩
+            
+            state = self._refresh(force=True)
+            chosen = self._pick_compaction(state)
+            if not chosen:
+                return False
+            
+            # 1. 锁外构建合并段（段文件不可变，读取安全）
+            ids, vectors, metadatas = [], [], []
+            for i in chosen:
+                segment, mask = state.segments[i], state.live[i]
+                rows = np.flatnonzero(mask)
+                ids.extend(segment.ids[r] for r in rows)
+                vectors.append(np.asarray(segment.vectors[rows]))
+                metadatas.extend(segment.metadatas[r] for r in rows)
+            
+            merged_name = None
+            if ids:
+                merged_name = f"seg_m{time.time_ns()}"
+                self._write_segment(merged_name, np.vstack(vectors), ids, metadatas)
+            
+            # 2. 锁内发布
+            with self._writer_lock() as manifest:
+                entries = {entry["name"]: entry for entry in manifest["segments"]}
+                names = [state.segments[i].name for i in chosen]
+                if any(name not in entries for name in names):
+                    if merged_name is not None:
+                        shutil.rmtree(self.segments_dir / merged_name, ignore_errors=True)
+                    return False
+                
+                # 合并期间新增的删除
+                newly_dead = set()
+                for i, name in zip(chosen, names):
+                    if entries[name].get("tombstones") != state.entries[i].get("tombstones"):
+                        segment = state.segments[i]
+                        before = segment.tombstones(state.entries[i].get("tombstones")).copy()
+                        after = segment.tombstones(entries[name].get("tombstones"))
+                        newly_dead.update(segment.ids[r] for r in np.flatnonzero(after & ~before))
+                
+                version = manifest["version"] + 1
+                merged_entry = None
+                if merged_name is not None:
+                    merged_entry = {"name": merged_name, "count": len(ids)}
+                    if newly_dead:
+                        merged = _Segment(self.segments_dir / merged_name, len(ids))
+                        dead = np.fromiter((id in newly_dead for id in ids), dtype=bool, count=len(ids))
+                        merged_entry["tombstones"] = self._write_tombstones(merged, dead, version)
+                
+                # 合并段放在最新输入段的位置，保持"新段覆盖旧段"的顺序语义
+                last = max(names, key=lambda n: manifest["segments"].index(entries[n]))
+                segments = []
+                for entry in manifest["segments"]:
+                    if entry["name"] == last and merged_entry is not None:
+                        segments.append(merged_entry)
+                    elif entry["name"] not in names:
+                        segments.append(entry)
+                
+                now = time.time()
+                manifest["obsolete"].extend({"path": name, "at": now} for name in names)
+                
+                manifest["version"] = version
+                manifest["segments"] = segments
+                self._write_manifest(manifest)
+        
+        print(f"Compacted {len(chosen)} segments into {len(ids)} vectors")
+        self._refresh(force=True)
+        return True
+    
+    def _pick_compaction(self, state: _IndexState) -> List[int]:
+        chosen = {
+            i for i, segment in enumerate(state.segments)
+            if segment.count and state.dead[i] / segment.count > self.max_tombstone_ratio
+        }
+        
+        remaining = len(state.segments) - len(chosen)
+        if remaining > self.max_segments:
+            by_size = sorted(
+                (i for i in range(len(state.segments)) if i not in chosen),
+                key=lambda i: state.segments[i].count - state.dead[i]
+            )
+            # 合并后剩余段数 = remaining - n + 1 <= max_segments
+            chosen.update(by_size[:remaining - self.max_segments + 1])
+        
+        return sorted(chosen)
+    
+    def collect_garbage(self) -> None:
+        """删除超过宽限期的旧段和旧墓碑文件，清理已不可能存在于任何内存段中的删除记录"""
+        with self._writer_lock() as manifest:
+            now = time.time()
+            expired = [o for o in manifest["obsolete"] if now - o["at"] >= self.gc_grace]
+            # 内存段最长驻留 flush_interval，之后写入的同名向量不受旧删除影响
+            deleted_ttl = self.gc_grace + self.flush_interval
+            deleted = {id: at for id, at in manifest["deleted"].items() if now - at < deleted_ttl}
+            if not expired and len(deleted) == len(manifest["deleted"]):
+                return
+            
+            for item in expired:
+                path = self.segments_dir / item["path"]
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                elif path.exists():
+                    path.unlink()
+            
+            manifest["obsolete"] = [o for o in manifest["obsolete"] if o not in expired]
+            manifest["deleted"] = deleted
+            manifest["version"] += 1
+            self._write_manifest(manifest)
+    
+    def _background_loop(self) -> None:
+        """后台维护：定期刷盘、压缩、回收"""
+        last_compaction = time.monotonic()
+        tick = max(0.1, min(self.flush_interval, self.compaction_interval) / 2)
+        
+        while not self._stop.wait(tick):
+            try:
+                with self._mem_lock:
+                    age = time.monotonic() - self._memtable.created
+                    due = len(self._memtable) and age >= self.flush_interval
+                if due:
+                    self.flush()
+                
+                if time.monotonic() - last_compaction >= self.compaction_interval:
+                    last_compaction = time.monotonic()
+                    self.compact()
+                    self.collect_garbage()
+            except Exception as e:
+                print(f"Segment maintenance error: {e}")
+    
+    # ---- BaseVectorDB 接口 ----
+    
+    def create_collection(self, dimension: int, **kwargs) -> None:
+        """段存储在首次写入时确定维度"""
+        pass
+    
+    def insert(self, vectors: np.ndarray, metadatas: List[Dict[str, Any]],
+              ids: Optional[List[str]] = None) -> List[str]:
+        """写入内存段，达到 flush_size 时落盘"""
+        self._check_writable()
+        vectors = self.as_float32_matrix(vectors)
+        
+        if ids is None:
+            import uuid
+            ids = [str(uuid.uuid4()) for _ in range(len(vectors))]
+        
+        dimension = self._state.dimension
+        if dimension and dimension != vectors.shape[1]:
+            raise ValueError(
+                f"Vector dimension {vectors.shape[1]} does not match index dimension {dimension}"
+            )
+        
+        cleaned_metadatas = [
+            {k: v for k, v in metadata.items() if v is not None}
+            for metadata in metadatas
+        ]
+        
+        with self._mem_lock:
+            self._memtable.add(vectors, ids, cleaned_metadatas)
+            full = len(self._memtable) >= self.flush_size
+        
+        if full:
+            self.flush()
+        return ids
+    
+    def search(self, query_vector: np.ndarray, top_k: int = 10,
+              filter: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """检索内存段和所有磁盘段（分数: 1 - 平方 L2 距离）"""
+        return self.search_batch(query_vector, top_k=top_k, filter=filter)[0]
+    
+    def search_batch(self, query_vectors: np.ndarray, top_k: int = 10,
+                     filter: Optional[Dict[str, Any]] = None) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        """批量检索：每个段对全部查询做一次矩阵乘法 / 一次 HNSW 批量查询"""
+        queries = self.as_float32_matrix(query_vectors)
+        if top_k <= 0:
+            return [[] for _ in range(len(queries))]
+        
+        state = self._refresh()
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+        
+        with self._mem_lock:
+            memtables = [m for m in (self._memtable, self._flushing) if m is not None and len(m)]
+            mem_ids = [id for m in memtables for id in m.ids]
+            mem_metadatas = [md for m in memtables for md in m.metadatas]
+            mem_vectors = np.vstack([m.matrix() for m in memtables]) if memtables else None
+        shadowed = set(mem_ids)
+        
+        candidates: List[List[Tuple[float, str, Dict[str, Any]]]] = [[] for _ in range(len(queries))]
+        
+        # 内存段：规模小，直接精确计算
+        if mem_vectors is not None:
+            scores = 1.0 - (
+                query_norms[:, None]
+                + np.einsum("ij,ij->i", mem_vectors, mem_vectors)[None, :]
+                - 2.0 * (queries @ mem_vectors.T)
+            )
+            rows = [
+                row for row in range(len(mem_ids))
+                if not filter or self._matches(mem_metadatas[row], filter)
+            ]
+            for q, query_scores in enumerate(scores):
+                candidates[q].extend(
+                    (float(query_scores[row]), mem_ids[row], mem_metadatas[row]) for row in rows
+                )
+        
+        for seg_index, segment in enumerate(state.segments):
+            live = state.live[seg_index]
+            if segment.ann is not None and not filter:
+                rows, scores = self._ann_search(segment, queries, top_k + state.dead[seg_index])
+            else:
+                scores = 1.0 - (query_norms[:, None] + segment.norms[None, :] - 2.0 * (queries @ segment.vectors.T))
+                if filter:
+                    live = live & self._filter_mask(segment, filter)
+                scores = np.where(live[None, :], scores, -np.inf)
+                k = min(top_k, segment.count)
+                rows = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, rows, axis=1)
+            
+            for q in range(len(queries)):
+                for row, score in zip(rows[q], scores[q]):
+                    row = int(row)
+                    if not live[row] or not np.isfinite(score) or segment.ids[row] in shadowed:
+                        continue
+                    candidates[q].append((float(score), segment.ids[row], segment.metadatas[row]))
+        
+        results = []
+        for query_candidates in candidates:
+            query_candidates.sort(key=lambda c: -c[0])
+            results.append([(id, score, metadata) for score, id, metadata in query_candidates[:top_k]])
+        return results
+    
+    def _ann_search(self, segment: _Segment, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """HNSW 近似检索（按删除数放大 k，再过滤墓碑），返回每个查询的 (行号, 分数)"""
+        k = min(k, segment.count)
+        segment.ann.set_ef(max(self.ann_ef, k))
+        labels, distances = segment.ann.knn_query(queries, k=k)
+        return labels, 1.0 - distances
+    
+    @classmethod
+    def _matches(cls, metadata: Dict[str, Any], filter: Dict[str, Any]) -> bool:
+        """
+        where 风格过滤（与 MetadataIndex 相同的运算符子集）
+        
+        支持 $and / $or 组合，字段条件支持 $eq / $ne / $in / $nin / $gt / $gte / $lt / $lte / $contains，
+        {"field": value} 等价于 {"field": {"$eq": value}}。
+        """
+        for key, value in filter.items():
+            if key == "$and":
+                if not all(cls._matches(metadata, c) for c in value):
+                    return False
+            elif key == "$or":
+                if not any(cls._matches(metadata, c) for c in value):
+                    return False
+            elif key.startswith("$"):
+                raise ValueError(f"Unsupported filter operator {key}")
+            else:
+                condition = value if isinstance(value, dict) else {"$eq": value}
+                if not all(cls._match_operator(key, metadata.get(key), op, operand)
+                           for op, operand in condition.items()):
+                    return False
+        return True
+    
+    @staticmethod
+    def _match_operator(field: str, value: Any, op: str, operand: Any) -> bool:
+        if op == "$eq":
+            return value == operand
+        if op == "$ne":
+            return value != operand
+        if op == "$in":
+            return value in operand
+        if op == "$nin":
+            return value not in operand
+        if op in ("$gt", "$gte", "$lt", "$lte"):
+            if value is None:
+                return False
+            try:
+                value, operand = float(value), float(operand)
+            except (TypeError, ValueError):
+                return False
+            return {"$gt": value > operand, "$gte": value >= operand,
+                    "$lt": value < operand, "$lte": value <= operand}[op]
+        if op == "$contains":
+            if isinstance(value, list):
+                return operand in value
+            if field == "tags" and isinstance(value, str):
+                # 标签在向量元数据中以逗号拼接保存
+                return str(operand) in value.split(",")
+            return isinstance(value, str) and str(operand) in value
+        raise ValueError(f"Unsupported filter operator {op} for field {field}")
+    
+    @classmethod
+    def _filter_mask(cls, segment: _Segment, filter: Dict[str, Any]) -> np.ndarray:
+        """逐行过滤（可由元数据索引解析的条件已在服务层转为候选集合）"""
+        return np.fromiter(
+            (cls._matches(m, filter) for m in segment.metadatas), dtype=bool, count=segment.count
+        )
+    
+    def delete(self, ids: List[str]) -> bool:
+        """
+        删除向量：本进程内存段直接移除，磁盘段写入新的墓碑位图，
+        删除记录写入 manifest，其他进程内存段中的同名向量在重新加载 / 落盘时丢弃
+        """
+        self._check_writable()
+        
+        # 与落盘串行，保证正在落盘的向量在发布后能被找到并写入墓碑
+        with self._flush_lock:
+            with self._mem_lock:
+                self._memtable.remove(ids)
+            self._delete_from_segments(ids)
+        
+        self._refresh(force=True)
+        return True
+    
+    def _delete_from_segments(self, ids: List[str]) -> None:
+        with self._writer_lock() as manifest:
+            state = self._refresh(force=True)
+            
+            rows_by_segment: Dict[int, List[int]] = {}
+            for id in ids:
+                location = state.locations.get(id)
+                if location is not None:
+                    rows_by_segment.setdefault(location[0], []).append(location[1])
+            
+            version = manifest["version"] + 1
+            entries = {entry["name"]: entry for entry in manifest["segments"]}
+            now = time.time()
+            manifest["deleted"].update({id: now for id in ids})
+            for seg_index, rows in rows_by_segment.items():
+                segment = state.segments[seg_index]
+                entry = entries[segment.name]
+                dead = segment.tombstones(entry.get("tombstones")).copy()
+                dead[rows] = True
+                
+                if entry.get("tombstones"):
+                    manifest["obsolete"].append({"path": f"{segment.name}/{entry['tombstones']}", "at": now})
+                entry["tombstones"] = self._write_tombstones(segment, dead, version)
+            
+            manifest["version"] = version
+            self._write_manifest(manifest)
+    
+    def get_by_id(self, id: str) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+        """根据ID获取向量"""
+        with self._mem_lock:
+            for memtable in (self._memtable, self._flushing):
+                position = memtable.positions.get(id) if memtable is not None else None
+                if position is not None:
+                    return memtable.vectors[position].copy(), memtable.metadatas[position]
+        
+        state = self._refresh()
+        location = state.locations.get(id)
+        if location is None:
+            return None
+        segment = state.segments[location[0]]
+        return np.array(segment.vectors[location[1]]), segment.metadatas[location[1]]
+    
+    def get_by_ids(self, ids: List[str]) -> Tuple[List[str], np.ndarray, List[Dict[str, Any]]]:
+        """批量获取向量"""
+        found_ids, vectors, metadatas = [], [], []
+        for id in ids:
+            result = self.get_by_id(id)
+            if result is not None:
+                found_ids.append(id)
+                vectors.append(result[0])
+                metadatas.append(result[1])
+        
+        if not found_ids:
+            return [], np.empty((0, 0), dtype=np.float32), []
+        return found_ids, self.as_float32_matrix(np.vstack(vectors)), metadatas
+    
+    def count(self) -> int:
+        """获取（未删除的）向量总数"""
+        state = self._refresh()
+        with self._mem_lock:
+            mem_ids = set(self._memtable.ids)
+            if self._flushing is not None:
+                mem_ids.update(self._flushing.ids)
+            return len(state.locations) + sum(1 for id in mem_ids if id not in state.locations)
+    
+    def clear(self) -> None:
+        """清空索引"""
+        with self._mem_lock:
+            self._memtable = _MemTable()
+        
+        with self._writer_lock() as manifest:
+            now = time.time()
+            obsolete = manifest["obsolete"] + [
+                {"path": entry["name"], "at": now} for entry in manifest["segments"]
+            ]
+            self._write_manifest({
+                "version": manifest["version"] + 1,
+                "dimension": 0,
+                "segments": [],
+                "obsolete": obsolete,
+                "deleted": manifest["deleted"]
+            })
+        self._refresh(force=True)
+    
+    def close(self) -> None:
+        """落盘内存段并停止后台线程"""
+        self._stop.set()
+        if self._background is not None:
+            self._background.join(timeout=5)
+            self._background = None
+        if self.role == "writer":
+            self.flush()
@@ -0,0 +1,258 @@
+"""
+分片向量数据库 - 将向量分散到多个后端集合，并行 scatter-gather 检索
+"""
+import heapq
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+from .base import BaseVectorDB
+
+
+class ShardedVectorDB(BaseVectorDB):
+    """
+    分片向量数据库
+    
+    包装 N 个后端实例（每个分片一个集合）:
+    - hash: 按向量ID哈希路由
+    - file_type: 按元数据中的 file_type 路由
+    
+    检索并发发送到所有相关分片，再用堆合并各分片的 top-k。
+    """
+    
+    def __init__(self, **config):
+        """
+        Args:
+            backend: 分片使用的后端提供商（默认 chroma）
+            num_shards: 分片数（hash 模式）
+            partition: 分区方式 hash / file_type
+            partitions: file_type 模式下的类型列表，其余类型进入 default 分片
+            其余参数原样传给每个后端
+        """
+        super().__init__(**config)
+        self.backend = config.get("backend", "chroma")
+        self.partition = config.get("partition", "hash")
+        self.num_shards = int(config.get("num_shards", 4))
+        self.partitions = list(config.get(
+            "partitions", ["image", "document", "audio", "video"]
+        ))
+        self.shards: List[BaseVectorDB] = []
+        self.shard_names: List[str] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.connect()
+    
+    def connect(self) -> None:
+        """为每个分片创建后端实例"""
+        # 延迟导入，避免与工厂模块循环引用
+        from .factory import VectorDBFactory
+        
+        if self.partition == "hash":
+            if self.num_shards < 1:
+                raise ValueError(f"num_shards must be >= 1, got {self.num_shards}")
+            self.shard_names = [f"shard{i}" for i in range(self.num_shards)]
+        elif self.partition == "file_type":
+            self.shard_names = self.partitions + ["default"]
+        else:
+            raise ValueError(f"Unsupported partition strategy: {self.partition}")
+        
+        backend_config = {
+            k: v for k, v in self.config.items()
+            if k not in ("backend", "partition", "num_shards", "partitions", "collection_name")
+        }
+        self.shards = [
+            VectorDBFactory.create_database(
+                provider=self.backend,
+                collection_name=f"{self.collection_name}_{name}",
+                **backend_config
+            )
+            for name in self.shard_names
+        ]
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.shards),
+            thread_name_prefix="vector-shard"
+        )
+        print(f"Sharded vector database: {len(self.shards)} x {self.backend} ({self.partition})")
+    
+    # ---- 路由 ----
+    
+    def _shard_for_id(self, id: str) -> int:
+        return zlib.crc32(id.encode("utf-8")) % len(self.shards)
+    
+    def _shard_for_file_type(self, file_type: Optional[str]) -> int:
+        if file_type in self.partitions:
+            return self.partitions.index(file_type)
+        return len(self.shards) - 1
+    
+    def _route(self, id: str, metadata: Optional[Dict[str, Any]] = None) -> int:
+        if self.partition == "hash":
+            return self._shard_for_id(id)
+        return self._shard_for_file_type((metadata or {}).get("file_type"))
+    
+    def _shards_for_filter(self, filter: Optional[Dict[str, Any]]) -> List[int]:
+        """file_type 分区下，按 file_type 的等值/$in 条件裁剪分片"""
+        all_shards = list(range(len(self.shards)))
+        if self.partition != "file_type" or not filter or "file_type" not in filter:
+            return all_shards
+        
+        condition = filter["file_type"]
+        if isinstance(condition, str):
+            types = [condition]
+        elif isinstance(condition, dict) and set(condition) == {"$eq"}:
+            types = [condition["$eq"]]
+        elif isinstance(condition, dict) and set(condition) == {"$in"}:
+            types = list(condition["$in"])
+        else:
+            return all_shards
+        
+        return sorted({self._shard_for_file_type(t) for t in types})
+    
+    def _group_ids(self, ids: List[str]) -> Dict[int, List[str]]:
+        """按分片分组ID；file_type 分区无法仅凭ID定位，需要发送到所有分片"""
+        if self.partition != "hash":
+            return {i: list(ids) for i in range(len(self.shards))}
+        
+        groups: Dict[int, List[str]] = {}
+        for id in ids:
+            groups.setdefault(self._shard_for_id(id), []).append(id)
+        return groups
+    
+    def _map(self, fn, shard_indices: List[int]) -> List[Any]:
+        """在多个分片上并发执行"""
+        if len(shard_indices) == 1:
+            return [fn(shard_indices[0])]
+        return list(self._executor.map(fn, shard_indices))
+    
+    # ---- BaseVectorDB 接口 ----
+    
+    def create_collection(self, dimension: int, **kwargs) -> None:
+        """在所有分片上创建集合"""
+        for shard in self.shards:
+            shard.create_collection(dimension, **kwargs)
+    
+    def insert(self, vectors: np.ndarray, metadatas: List[Dict[str, Any]],
+              ids: Optional[List[str]] = None) -> List[str]:
+        """按ID（或 file_type）路由插入"""
+        vectors = self.as_float32_matrix(vectors)
+        
+        if ids is None:
+            import uuid
+            ids = [str(uuid.uuid4()) for _ in range(len(vectors))]
+        
+        groups: Dict[int, List[int]] = {}
+        for row, (id, metadata) in enumerate(zip(ids, metadatas)):
+            groups.setdefault(self._route(id, metadata), []).append(row)
+        
+        def insert_shard(shard_index: int) -> None:
+            rows = groups[shard_index]
+            self.shards[shard_index].insert(
+                vectors=vectors[rows],
+                metadatas=[metadatas[r] for r in rows],
+                ids=[ids[r] for r in rows]
+            )
+        
+        self._map(insert_shard, list(groups))
+        return ids
+    
+    def search(self, query_vector: np.ndarray, top_k: int = 10,
+              filter: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """并发检索相关分片并合并 top-k"""
+        query_vector = self.as_float32_matrix(query_vector)
+        
+        def search_shard(shard_index: int) -> List[Tuple[str, float, Dict[str, Any]]]:
+            return self.shards[shard_index].search(query_vector, top_k=top_k, filter=filter)
+        
+        shard_results = self._map(search_shard, self._shards_for_filter(filter))
+        return self._merge(shard_results, top_k)
+    
+    def search_batch(self, query_vectors: np.ndarray, top_k: int = 10,
+                     filter: Optional[Dict[str, Any]] = None) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        """每个分片一次批量检索，再按查询分别合并"""
+        query_vectors = self.as_float32_matrix(query_vectors)
+        
+        def search_shard(shard_index: int) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+            return self.shards[shard_index].search_batch(query_vectors, top_k=top_k, filter=filter)
+        
+        shard_results = self._map(search_shard, self._shards_for_filter(filter))
+        return [
+            self._merge([results[q] for results in shard_results], top_k)
+            for q in range(len(query_vectors))
+        ]
+    
+    def search_subset(self, query_vector: np.ndarray, ids: List[str],
+                      top_k: int = 10) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """在各分片的候选子集上并发精确检索"""
+        groups = self._group_ids(ids)
+        
+        def search_shard(shard_index: int) -> List[Tuple[str, float, Dict[str, Any]]]:
+            return self.shards[shard_index].search_subset(query_vector, groups[shard_index], top_k)
+        
+        return self._merge(self._map(search_shard, list(groups)), top_k)
+    
+    def search_subset_batch(self, query_vectors: np.ndarray, ids: List[str],
+                            top_k: int = 10) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        """多个查询在各分片的候选子集上并发精确检索"""
+        query_vectors = self.as_float32_matrix(query_vectors)
+        groups = self._group_ids(ids)
+        
+        def search_shard(shard_index: int) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+            return self.shards[shard_index].search_subset_batch(query_vectors, groups[shard_index], top_k)
+        
+        shard_results = self._map(search_shard, list(groups)) if groups else []
+        return [
+            self._merge([results[q] for results in shard_results], top_k)
+            for q in range(len(query_vectors))
+        ]
+    
+    @staticmethod
+    def _merge(shard_results: List[List[Tuple[str, float, Dict[str, Any]]]],
+               top_k: int) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """用堆合并各分片（已排序）的结果"""
+        merged = heapq.merge(*shard_results, key=lambda r: -r[1])
+        return [r for _, r in zip(range(top_k), merged)]
+    
+    def delete(self, ids: List[str]) -> bool:
+        """按ID路由删除"""
+        groups = self._group_ids(ids)
+        results = self._map(lambda i: self.shards[i].delete(groups[i]), list(groups))
+        return any(results)
+    
+    def get_by_id(self, id: str) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+        """根据ID获取向量"""
+        for shard_index in self._group_ids([id]):
+            result = self.shards[shard_index].get_by_id(id)
+            if result is not None:
+                return result
+        return None
+    
+    def get_by_ids(self, ids: List[str]) -> Tuple[List[str], np.ndarray, List[Dict[str, Any]]]:
+        """批量获取向量"""
+        groups = self._group_ids(ids)
+        parts = [
+            part for part in self._map(lambda i: self.shards[i].get_by_ids(groups[i]), list(groups))
+            if part[0]
+        ]
+        if not parts:
+            return [], np.empty((0, 0), dtype=np.float32), []
+        
+        found_ids = [id for part in parts for id in part[0]]
+        vectors = np.vstack([part[1] for part in parts])
+        metadatas = [m for part in parts for m in part[2]]
+        return found_ids, vectors, metadatas
+    
+    def count(self) -> int:
+        """获取向量总数"""
+        return sum(shard.count() for shard in self.shards)
+    
+    def clear(self) -> None:
+        """清空所有分片"""
+        for shard in self.shards:
+            shard.clear()
+    
+    def close(self) -> None:
+        """关闭所有分片"""
+        for shard in self.shards:
+            shard.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,92 @@
+"""
+缩略图存储 - 入库时生成 WebP 缩略图，按内容寻址存放
+"""
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional, Union
+from PIL import Image
+
+from ..processors.cache import file_content_hash
+
+
+# 缩略图键：内容摘要的十六进制
+_KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ThumbnailStore:
+    """
+    缩略图存储
+    
+    键由源内容哈希和缩略图尺寸/质量派生，同一内容只生成一次、永不改变，
+    因此可以按 immutable 长期缓存；文件删除时不清理（可能被重复上传的文件共享）。
+    """
+    
+    def __init__(self, directory: Union[str, Path], size: int = 256, quality: int = 80):
+        """
+        Args:
+            directory: 存储目录
+            size: 缩略图最大边长
+            quality: WebP 质量（0-100）
+        """
+        self.directory = Path(directory)
+        self.size = int(size)
+        self.quality = int(quality)
+    
+    def key_for(self, content_hash: str) -> str:
+        """由源内容哈希计算缩略图键"""
+        return hashlib.blake2b(
+            f"{content_hash}:{self.size}:{self.quality}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+    
+    def path(self, key: str) -> Optional[Path]:
+        """缩略图文件路径，键非法时返回 None"""
+        if not _KEY_PATTERN.match(key):
+            return None
+        return self.directory / key[:2] / f"{key}.webp"
+    
+    def create(self, image: Image.Image, content_hash: str) -> str:
+        """
+        生成缩略图（已存在时跳过）
+        
+        Args:
+            image: 已解码的源图片
+            content_hash: 源内容哈希
+        
+        Returns:
+            缩略图键
+        """
+        key = self.key_for(content_hash)
+        path = self.path(key)
+        if path.exists():
+            return key
+        
+        thumbnail = image.copy()
+        if thumbnail.mode not in ("RGB", "RGBA"):
+            thumbnail = thumbnail.convert("RGB")
+        thumbnail.thumbnail((self.size, self.size), Image.Resampling.LANCZOS)
+        
+        # 先写临时文件再原子替换，并发生成同一缩略图时互不影响
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                thumbnail.save(f, format="WEBP", quality=self.quality, method=4)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        return key
+    
+    def create_from_file(self, file_path: Union[str, Path]) -> str:
+        """从图片文件生成缩略图（按文件内容哈希寻址，JPEG 按缩略图尺寸 draft 解码）"""
+        with Image.open(file_path) as image:
+            image.draft("RGB", (self.size, self.size))
+            return self.create(image, file_content_hash(file_path))
+    
+    @staticmethod
+    def url(key: str) -> str:
+        """缩略图访问地址"""
+        return f"/api/v1/thumbnails/{key}.webp"
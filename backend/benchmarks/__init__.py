@@ -0,0 +1,12 @@
+"""
+性能基准 - 离线可复现的检索 / 入库负载测试
+
+使用确定性的假嵌入器（不加载模型）和合成的多语言语料，分别直接调用
+KnowledgeRetrievalService 和通过 FastAPI 应用发起并发上传、检索请求，
+输出各配置（vector / hybrid / multi_path）的吞吐、延迟分位数和内存。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.run --docs 500 --queries 300 --concurrency 8
+    python -m benchmarks.run --output baseline.json
+    python -m benchmarks.run --baseline baseline.json
+"""
@@ -0,0 +1,144 @@
+"""
+合成语料 - 按种子生成可复现的中英混合文档和查询
+"""
+import random
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+
+# 主题 -> (中文词, 英文词)
+TOPICS: Dict[str, Tuple[List[str], List[str]]] = {
+    "机器学习": (
+        ["机器学习", "深度学习", "神经网络", "模型训练", "梯度下降", "特征工程", "数据集", "过拟合", "推理", "向量"],
+        ["machine", "learning", "neural", "network", "training", "gradient", "feature", "dataset", "inference", "embedding"],
+    ),
+    "数据库": (
+        ["数据库", "索引", "事务", "查询优化", "分片", "副本", "存储引擎", "缓存", "主键", "日志"],
+        ["database", "index", "transaction", "query", "shard", "replica", "storage", "cache", "primary", "log"],
+    ),
+    "营销": (
+        ["营销", "小红书", "用户增长", "内容运营", "转化率", "品牌", "投放", "社群", "种草", "直播"],
+        ["marketing", "growth", "content", "conversion", "brand", "campaign", "community", "influencer", "funnel", "retention"],
+    ),
+    "旅行": (
+        ["旅行", "攻略", "酒店", "机票", "签证", "行程", "美食", "景点", "自驾", "民宿"],
+        ["travel", "guide", "hotel", "flight", "visa", "itinerary", "food", "landmark", "roadtrip", "hostel"],
+    ),
+    "健康": (
+        ["健康", "运动", "睡眠", "饮食", "减脂", "跑步", "瑜伽", "营养", "体检", "心率"],
+        ["health", "exercise", "sleep", "diet", "fitness", "running", "yoga", "nutrition", "checkup", "heart"],
+    ),
+}
+
+# 通用填充词
+FILLER_ZH = ["我们", "可以", "通过", "以及", "方法", "问题", "系统", "进行", "需要", "提高", "分析", "实践"]
+FILLER_EN = ["the", "a", "with", "for", "and", "to", "of", "system", "method", "improve", "analysis", "practice"]
+
+# 文档语言 -> 权重
+LANGUAGE_WEIGHTS = {"zh": 0.45, "en": 0.35, "mixed": 0.2}
+
+
+class SyntheticCorpus:
+    """
+    合成语料生成器
+    
+    每篇文档属于一个主题，按语言权重生成中文、英文或中英混合的句子，
+    主题词与通用填充词混合；主题名作为标签，可用于元数据过滤负载。
+    相同种子生成完全相同的语料和查询。
+    """
+    
+    def __init__(self, seed: int = 42, words_per_doc: int = 200, topic_ratio: float = 0.4):
+        """
+        Args:
+            seed: 随机种子
+            words_per_doc: 每篇文档的词数
+            topic_ratio: 主题词占比，其余为填充词
+        """
+        self.seed = seed
+        self.words_per_doc = words_per_doc
+        self.topic_ratio = topic_ratio
+    
+    def _sentence(self, rng: random.Random, topic: str, language: str, length: int) -> str:
+        zh_words, en_words = TOPICS[topic]
+        words = []
+        for _ in range(length):
+            lang = language if language != "mixed" else rng.choice(("zh", "en"))
+            vocabulary = zh_words if lang == "zh" else en_words
+            filler = FILLER_ZH if lang == "zh" else FILLER_EN
+            words.append((lang, rng.choice(vocabulary if rng.random() < self.topic_ratio else filler)))
+        
+        # 中文词之间不加空格，与英文相邻时加空格
+        text = words[0][1]
+        for (prev_lang, _), (lang, word) in zip(words, words[1:]):
+            text += word if prev_lang == lang == "zh" else " " + word
+        return text + ("。" if language == "zh" else ".")
+    
+    def documents(self, count: int) -> List[Dict[str, Any]]:
+        """
+        生成文档
+        
+        Args:
+            count: 文档数
+        
+        Returns:
+            文档列表 [{"filename", "text", "topic", "language", "tags"}]
+        """
+        rng = random.Random(self.seed)
+        topics = list(TOPICS)
+        languages, weights = zip(*LANGUAGE_WEIGHTS.items())
+        documents = []
+        for i in range(count):
+            topic = topics[i % len(topics)]
+            language = rng.choices(languages, weights)[0]
+            sentences, remaining = [], self.words_per_doc
+            while remaining > 0:
+                length = min(remaining, rng.randint(6, 16))
+                sentences.append(self._sentence(rng, topic, language, length))
+                remaining -= length
+            documents.append({
+                "filename": f"bench_{i:06d}_{language}.txt",
+                "text": "\n".join(sentences),
+                "topic": topic,
+                "language": language,
+                "tags": [topic, language],
+            })
+        return documents
+    
+    def queries(self, count: int, filter_ratio: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        生成查询（1-3 个主题词，中文、英文或中英混合）
+        
+        Args:
+            count: 查询数
+            filter_ratio: 带标签过滤的查询占比
+        
+        Returns:
+            查询列表 [{"text", "topic", "filter"}]
+        """
+        rng = random.Random(self.seed + 1)
+        topics = list(TOPICS)
+        queries = []
+        for _ in range(count):
+            topic = rng.choice(topics)
+            zh_words, en_words = TOPICS[topic]
+            language = rng.choice(("zh", "en", "mixed"))
+            words = []
+            for _ in range(rng.randint(1, 3)):
+                lang = language if language != "mixed" else rng.choice(("zh", "en"))
+                words.append(rng.choice(zh_words if lang == "zh" else en_words))
+            query_filter = None
+            if rng.random() < filter_ratio:
+                query_filter = {"tags": {"$contains": topic}}
+            queries.append({"text": " ".join(words), "topic": topic, "filter": query_filter})
+        return queries
+    
+    @staticmethod
+    def write(documents: List[Dict[str, Any]], directory: Path) -> List[Path]:
+        """把文档写成 UTF-8 文本文件"""
+        directory.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for document in documents:
+            path = directory / document["filename"]
+            path.write_text(document["text"], encoding="utf-8")
+            paths.append(path)
+        return paths
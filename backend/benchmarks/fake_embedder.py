@@ -0,0 +1,91 @@
+"""
+假嵌入器 - 字符二元组特征哈希，结果确定、无需下载模型
+"""
+import hashlib
+import time
+from typing import List, Union
+import numpy as np
+from PIL import Image
+
+from app.services.embeddings.base import BaseEmbedder
+from app.services.embeddings.factory import EmbedderFactory
+
+
+# 注册到 EmbedderFactory 的提供商名
+PROVIDER = "fake"
+
+
+class FakeEmbedder(BaseEmbedder):
+    """
+    基准测试用嵌入器
+    
+    文本按字符二元组做带符号特征哈希（词面相近的文本向量相近，检索结果有意义），
+    图片按缩略图像素哈希为随机向量。可设置每批的模拟推理耗时。
+    """
+    
+    DIMENSION = 384
+    LATENCY = 0.0  # 每批模拟推理耗时（秒）
+    
+    def __init__(self, model_name: str = "fake", device: str = "cpu", **kwargs):
+        super().__init__(model_name, device, **kwargs)
+        self.load_model()
+    
+    def load_model(self) -> None:
+        """无模型，只设置维度"""
+        self.model = PROVIDER
+        self.dimension = self.DIMENSION
+    
+    @staticmethod
+    def _hash(token: str) -> int:
+        return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    
+    def _text_vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        text = " ".join(text.lower().split())
+        for i in range(max(len(text) - 1, 1)):
+            h = self._hash(text[i:i + 2])
+            vector[h % self.dimension] += 1.0 if h >> 63 else -1.0
+        return vector
+    
+    def _simulate_latency(self) -> None:
+        if self.LATENCY > 0:
+            time.sleep(self.LATENCY)
+    
+    def embed_text(self, texts: Union[str, List[str]]) -> np.ndarray:
+        """文本嵌入"""
+        if isinstance(texts, str):
+            texts = [texts]
+        self._simulate_latency()
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return self.normalize_vector(np.stack([self._text_vector(text) for text in texts]))
+    
+    def embed_image(self, images: Union[str, Image.Image, List[Union[str, Image.Image]]]) -> np.ndarray:
+        """图片嵌入"""
+        self._simulate_latency()
+        vectors = []
+        for image in self.load_images(images):
+            seed = self._hash(image.resize((16, 16)).tobytes().hex())
+            vectors.append(np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32))
+        if not vectors:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return self.normalize_vector(np.stack(vectors))
+
+
+def register_fake_embedder(dimension: int = 384, latency: float = 0.0) -> str:
+    """
+    注册假嵌入器（embedding.provider 设为返回值即可使用）
+    
+    Args:
+        dimension: 向量维度
+        latency: 每批模拟推理耗时（秒）
+    
+    Returns:
+        提供商名
+    """
+    embedder_class = type("FakeEmbedder", (FakeEmbedder,), {
+        "DIMENSION": int(dimension),
+        "LATENCY": float(latency),
+    })
+    EmbedderFactory.register_embedder(PROVIDER, embedder_class)
+    return PROVIDER
@@ -0,0 +1,333 @@
+"""
+基准测试入口 - 对服务和 FastAPI 应用施加并发上传 / 检索负载，输出吞吐、延迟分位数和内存
+
+每个 (目标, 检索配置) 使用独立的临时目录（向量库、元数据库、上传目录），互不影响。
+并发请求在同一个事件循环中执行，与单个 uvicorn worker 的调度方式一致。
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional
+import numpy as np
+
+from app.core.config import Settings, get_settings
+from .corpus import SyntheticCorpus
+from .fake_embedder import register_fake_embedder
+
+
+# 检索配置 -> retrieval 覆盖项
+MODES: Dict[str, Dict[str, Any]] = {
+    "vector": {"enable_hybrid": False, "enable_multi_path": False},
+    "hybrid": {"enable_hybrid": True, "enable_multi_path": False},
+    "multi_path": {"enable_hybrid": True, "enable_multi_path": True},
+}
+
+TARGETS = ("service", "app")
+
+
+def rss_mb() -> float:
+    """当前进程常驻内存（MB），读不到 /proc 时退化为峰值常驻内存"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def log(message: str) -> None:
+    """进度输出（走 stderr，不受静默影响）"""
+    print(message, file=sys.stderr, flush=True)
+
+
+@contextmanager
+def quiet(enabled: bool) -> Iterator[None]:
+    """屏蔽服务内部的 print 输出"""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        yield
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int) -> Dict[str, Any]:
+    """汇总延迟（毫秒）与吞吐（请求/秒）"""
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) if len(values) else (0.0, 0.0, 0.0)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": round(float(values.mean()), 3) if len(values) else 0.0,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+async def run_concurrent(call: Callable[[Any], Awaitable[Any]], items: Iterable[Any],
+                         concurrency: int) -> Dict[str, Any]:
+    """
+    以固定并发执行 call(item) 并统计延迟
+    
+    Args:
+        call: 异步请求函数
+        items: 请求参数
+        concurrency: 并发数
+    
+    Returns:
+        summarize 的结果
+    """
+    pending = iter(items)
+    latencies: List[float] = []
+    errors = 0
+    
+    async def worker():
+        nonlocal errors
+        for item in pending:
+            start = time.perf_counter()
+            try:
+                await call(item)
+            except Exception as e:
+                errors += 1
+                if errors == 1:
+                    log(f"  request failed: {e}")
+                continue
+            latencies.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def build_settings(base: Settings, workdir: Path, mode: str, args) -> Settings:
+    """在基础配置上替换嵌入器、存储路径和检索配置"""
+    settings = base.model_copy(deep=True)
+    
+    settings.embedding.provider = register_fake_embedder(args.dimension, args.embed_latency)
+    settings.embedding.model_name = f"fake-{args.dimension}"
+    settings.embedding.dimension = args.dimension
+    settings.embedding.multi_model = False
+    
+    settings.vector_db.provider = args.vector_db
+    for provider, key in (("chroma", "persist_directory"), ("sharded", "persist_directory"),
+                          ("segment", "index_dir")):
+        section = dict(getattr(settings.vector_db, provider) or {})
+        section[key] = str(workdir / "vectors")
+        setattr(settings.vector_db, provider, section)
+    settings.database.sqlite = {"path": str(workdir / "metadata.db")}
+    
+    file_processing = settings.file_processing
+    file_processing.upload_dir = str(workdir / "uploads")
+    file_processing.cache_dir = str(workdir / "cache")
+    file_processing.thumbnail_dir = str(workdir / "thumbnails")
+    
+    for key, value in MODES[mode].items():
+        setattr(settings.retrieval, key, value)
+    
+    settings.performance.warmup = ["embedder"]
+    settings.monitoring.prometheus = {"enabled": False}
+    settings.monitoring.slow_query = {"enabled": False}
+    return settings
+
+
+async def measure(call: Callable[[Any], Awaitable[Any]], items: Iterable[Any],
+                  concurrency: int) -> Dict[str, Any]:
+    """执行一个阶段的负载，附加阶段结束时的常驻内存（开启 tracemalloc 时附加 Python 分配峰值）"""
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    result = await run_concurrent(call, items, concurrency)
+    result["rss_mb"] = round(rss_mb(), 1)
+    if tracemalloc.is_tracing():
+        result["py_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+    return result
+
+
+async def bench_service(settings: Settings, documents: List[Dict[str, Any]],
+                        queries: List[Dict[str, Any]], args) -> Dict[str, Dict[str, Any]]:
+    """直接调用 KnowledgeRetrievalService"""
+    from app.services.knowledge_service import KnowledgeRetrievalService
+    
+    paths = SyntheticCorpus.write(documents, Path(settings.file_processing.upload_dir))
+    service = KnowledgeRetrievalService(settings)
+    try:
+        async def upload(i):
+            await service.upload_file(str(paths[i]), documents[i]["filename"], documents[i]["tags"])
+        
+        async def search(query):
+            await service.search(query=query["text"], top_k=args.top_k, filter=query["filter"])
+        
+        results = {"ingest": await measure(upload, range(len(paths)), args.upload_concurrency)}
+        # 预热查询（首次混合检索建立 BM25 索引）不计入
+        await run_concurrent(search, queries[:args.warmup], 1)
+        results["search"] = await measure(search, queries, args.concurrency)
+        return results
+    finally:
+        service.close()
+
+
+async def bench_app(settings: Settings, documents: List[Dict[str, Any]],
+                    queries: List[Dict[str, Any]], args) -> Dict[str, Dict[str, Any]]:
+    """通过 FastAPI 应用（ASGI 传输，不经网络）发起 HTTP 请求"""
+    import httpx
+    from app.api import routes
+    from app.main import create_app
+    
+    app = create_app()
+    app.dependency_overrides[get_settings] = lambda: settings
+    routes.initialize_service(settings)
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            async def upload(document):
+                response = await client.post(
+                    "/api/v1/files/upload",
+                    files={"file": (document["filename"], document["text"].encode("utf-8"), "text/plain")},
+                    data={"tags": ",".join(document["tags"])}
+                )
+                response.raise_for_status()
+            
+            async def search(query):
+                response = await client.post("/api/v1/search", json={
+                    "query": query["text"], "top_k": args.top_k, "filter": query["filter"]
+                })
+                response.raise_for_status()
+            
+            results = {"ingest": await measure(upload, documents, args.upload_concurrency)}
+            await run_concurrent(search, queries[:args.warmup], 1)
+            results["search"] = await measure(search, queries, args.concurrency)
+            return results
+    finally:
+        routes.shutdown_service()
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    """与基线结果对比吞吐和 p95 延迟"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {
+            (row["target"], row["mode"], row["phase"]): row for row in json.load(f)["results"]
+        }
+    
+    print(f"\nCompared with {baseline_path}:")
+    print(f"{'target':<8} {'mode':<11} {'phase':<7} {'throughput':>12} {'p95':>12} {'rss':>10}")
+    for row in results:
+        old = baseline.get((row["target"], row["mode"], row["phase"]))
+        if old is None:
+            continue
+        
+        def change(key, lower_is_better=False):
+            if not old.get(key):
+                return "n/a"
+            delta = (row[key] - old[key]) / old[key] * 100
+            worse = delta > 0 if lower_is_better else delta < 0
+            return f"{delta:+.1f}%" + (" !" if worse else "")
+        
+        print(f"{row['target']:<8} {row['mode']:<11} {row['phase']:<7} "
+              f"{change('throughput'):>12} {change('p95_ms', True):>12} {change('rss_mb', True):>10}")
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    print(f"\n{'target':<8} {'mode':<11} {'phase':<7} {'reqs':>6} {'err':>4} {'req/s':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MB':>8}")
+    for row in results:
+        print(f"{row['target']:<8} {row['mode']:<11} {row['phase']:<7} {row['requests']:>6} "
+              f"{row['errors']:>4} {row['throughput']:>9.1f} {row['p50_ms']:>9.2f} "
+              f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['rss_mb']:>8.1f}")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Knowledge retrieval service benchmark")
+    parser.add_argument("--docs", type=int, default=200, help="合成文档数")
+    parser.add_argument("--words-per-doc", type=int, default=200, help="每篇文档的词数")
+    parser.add_argument("--queries", type=int, default=200, help="计时的检索请求数")
+    parser.add_argument("--warmup", type=int, default=5, help="不计时的预热查询数")
+    parser.add_argument("--concurrency", type=int, default=8, help="检索并发数")
+    parser.add_argument("--upload-concurrency", type=int, default=4, help="上传并发数")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--filter-ratio", type=float, default=0.2, help="带标签过滤的查询占比")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--vector-db", default="chroma", help="向量库提供商（chroma / sharded / segment）")
+    parser.add_argument("--dimension", type=int, default=384, help="假嵌入器维度")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="每批模拟推理耗时（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--config", default="config.yaml", help="基础配置文件")
+    parser.add_argument("--workdir", help="数据目录（默认临时目录，结束后删除）")
+    parser.add_argument("--output", help="结果写入 JSON 文件（可作为之后的基线）")
+    parser.add_argument("--baseline", help="与之前的 JSON 结果对比")
+    parser.add_argument("--tracemalloc", action="store_true", help="统计 Python 分配峰值（显著变慢）")
+    parser.add_argument("--verbose", action="store_true", help="显示服务内部输出")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    args = parse_args(argv)
+    base = Settings.from_yaml(args.config)
+    
+    corpus = SyntheticCorpus(seed=args.seed, words_per_doc=args.words_per_doc)
+    documents = corpus.documents(args.docs)
+    queries = corpus.queries(args.queries, filter_ratio=args.filter_ratio)
+    log(f"Corpus: {len(documents)} documents x {args.words_per_doc} words, {len(queries)} queries")
+    
+    root = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="krs-bench-"))
+    if args.tracemalloc:
+        tracemalloc.start()
+    
+    results = []
+    try:
+        for target in args.targets:
+            for mode in args.modes:
+                workdir = root / f"{target}_{mode}"
+                shutil.rmtree(workdir, ignore_errors=True)
+                settings = build_settings(base, workdir, mode, args)
+                runner = bench_service if target == "service" else bench_app
+                
+                gc.collect()
+                rss_start = rss_mb()
+                log(f"Running {target} / {mode} ...")
+                with quiet(not args.verbose):
+                    phases = asyncio.run(runner(settings, documents, queries, args))
+                for phase, summary in phases.items():
+                    results.append({
+                        "target": target, "mode": mode, "phase": phase,
+                        "rss_start_mb": round(rss_start, 1), **summary
+                    })
+    finally:
+        if args.tracemalloc:
+            tracemalloc.stop()
+        if not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+    
+    print_table(results)
+    if args.baseline:
+        compare(results, args.baseline)
+    if args.output:
+        report = {
+            "params": vars(args),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        log(f"Results written to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+同义词自动机测试
+"""
+from app.services.retrieval.synonyms import SynonymAutomaton
+
+
+def test_case_variant_duplicates_merge_synonyms():
+    automaton = SynonymAutomaton({
+        "AI": ["人工智能", "artificial intelligence"],
+        "ai": ["artificial intelligence", "机器智能"],
+    })
+    
+    assert automaton.words == ["AI"]
+    assert automaton.synonyms["AI"] == ["人工智能", "artificial intelligence", "机器智能"]
+    assert automaton.find("what is ai") == [(8, 10, "AI")]